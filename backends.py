@@ -0,0 +1,255 @@
+# language: python
+"""
+屏幕/输入后端。
+
+GameBot 通过后端完成截图、查询窗口位置、点击和按键:
+- DesktopBackend: 真实桌面, 基于 pygetwindow / pyautogui / pydirectinput
+- SimulatedBackend: 无界面的模拟后端, 画面来自图片文件或脚本化的场景,
+  所有输入事件都带时间戳记录下来, 用于测试和性能测量
+
+所有坐标均为屏幕坐标, 换算成窗口坐标由 GameBot 负责。
+"""
+import logging
+import time
+from typing import NamedTuple
+
+from vision import Box, Frame
+
+
+class Backend:
+    """后端接口, 子类需要实现以下方法"""
+
+    def window_box(self, title):
+        """返回窗口在屏幕上的区域 Box, 找不到窗口时抛出异常"""
+        raise NotImplementedError
+
+    def activate(self, title):
+        raise NotImplementedError
+
+    def is_active(self, title):
+        """窗口是否拥有焦点"""
+        return True
+
+    def resize(self, title, w, h):
+        raise NotImplementedError
+
+    def grab(self, region=None):
+        """截取屏幕区域 (left, top, width, height), region 为 None 时截取整个屏幕,
+        返回 BGR 数组"""
+        raise NotImplementedError
+
+    def click(self, x, y):
+        raise NotImplementedError
+
+    def key_down(self, key):
+        raise NotImplementedError
+
+    def key_up(self, key):
+        raise NotImplementedError
+
+    def press(self, key):
+        self.key_down(key)
+        self.key_up(key)
+
+
+class DesktopBackend(Backend):
+    """真实桌面后端, GUI 相关的库在第一次使用时才导入"""
+
+    def _window(self, title):
+        import pygetwindow as gw
+
+        windows = gw.getWindowsWithTitle(title)
+        if not windows:
+            raise Exception(f"未找到窗口: {title}")
+        return windows[0]
+
+    def window_box(self, title):
+        return Box(*self._window(title).box)
+
+    def activate(self, title):
+        self._window(title).activate()
+
+    def is_active(self, title):
+        return self._window(title).isActive
+
+    def resize(self, title, w, h):
+        self._window(title).resizeTo(w, h)
+
+    def grab(self, region=None):
+        import pyautogui
+
+        image = pyautogui.screenshot(region=tuple(region) if region else None)
+        return Frame.from_pil(image).image
+
+    def click(self, x, y):
+        import pydirectinput as di
+
+        logging.info(f"Clicked at coordinates: ({x}, {y})")
+        di.click(x, y)
+
+    def key_down(self, key):
+        import pydirectinput as di
+
+        di.keyDown(key)
+
+    def key_up(self, key):
+        import pydirectinput as di
+
+        di.keyUp(key)
+
+    def press(self, key):
+        import pydirectinput as di
+
+        di.press(key)
+
+
+class InputEvent(NamedTuple):
+    timestamp: float
+    kind: str
+    args: tuple
+
+
+class Scene:
+    """
+    脚本化的模拟场景: 一张背景上按时间显示/隐藏若干图片。
+
+    scene = Scene((1920, 1080))
+    scene.add("elements/1080/restart.png", 800, 500, start=2, end=5)
+    """
+
+    def __init__(self, size, background=None):
+        import numpy as np
+
+        width, height = size
+        if background is None:
+            # 用固定种子的噪声做背景, 避免模板在纯色背景上误匹配
+            rng = np.random.default_rng(0)
+            background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        self.background = _load_image(background)
+        self.sprites = []
+
+    @property
+    def size(self):
+        return self.background.shape[1], self.background.shape[0]
+
+    def add(self, image, x, y, start=0, end=None):
+        self.sprites.append((_load_image(image), x, y, start, end))
+        return self
+
+    def render(self, t):
+        frame = self.background.copy()
+        for image, x, y, start, end in self.sprites:
+            if t >= start and (end is None or t < end):
+                h, w = image.shape[:2]
+                frame[y : y + h, x : x + w] = image
+        return frame
+
+
+def _load_image(image):
+    import cv2
+    import numpy as np
+
+    if isinstance(image, np.ndarray):
+        return image
+    loaded = cv2.imread(image, cv2.IMREAD_COLOR)
+    if loaded is None:
+        raise FileNotFoundError(f"无法读取图片: {image}")
+    return loaded
+
+
+class SimulatedBackend(Backend):
+    """
+    无界面的模拟后端。
+
+    scene 可以是:
+    - 图片路径或 BGR 数组: 每次截图都返回同一画面
+    - 图片路径/数组的列表: 每次截图依次返回下一张, 到最后一张后保持不变
+    - Scene 或 callable(t): 按启动后经过的时间 t 生成画面
+
+    所有输入都记录在 events 中, 不会真正发送到系统。window_queries 记录
+    查询窗口位置的次数, 用 move() / blur() 模拟窗口被移动或失去焦点。
+    多个实例共用一个后端时, focused 为当前拥有焦点的窗口标题; 还没有
+    激活过任何窗口时 (focused 为 None), 所有窗口都视为拥有焦点。
+    """
+
+    def __init__(self, scene=None, window=(0, 0, 1920, 1080), clock=time.monotonic):
+        self.window = Box(*window)
+        self.clock = clock
+        self.start_time = clock()
+        self.events = []
+        self.captures = 0
+        self.window_queries = 0
+        self.active = True
+        self.focused = None
+        self.set_scene(scene)
+
+    def set_scene(self, scene):
+        if scene is None:
+            scene = Scene((self.window.width, self.window.height))
+        if isinstance(scene, Scene):
+            self._render = scene.render
+        elif callable(scene):
+            self._render = scene
+        elif isinstance(scene, (list, tuple)):
+            frames = [_load_image(image) for image in scene]
+            self._render = lambda t: frames[min(self.captures, len(frames) - 1)]
+        else:
+            image = _load_image(scene)
+            self._render = lambda t: image
+
+    def elapsed(self):
+        return self.clock() - self.start_time
+
+    def _record(self, kind, *args):
+        self.events.append(InputEvent(self.elapsed(), kind, args))
+
+    def window_box(self, title):
+        self.window_queries += 1
+        return self.window
+
+    def activate(self, title):
+        self.active = True
+        self.focused = title
+        self._record("activate", title)
+
+    def is_active(self, title):
+        return self.active and self.focused in (None, title)
+
+    def move(self, left, top):
+        self.window = Box(left, top, self.window.width, self.window.height)
+
+    def blur(self):
+        self.active = False
+
+    def resize(self, title, w, h):
+        self.window = Box(self.window.left, self.window.top, w, h)
+        self._record("resize", w, h)
+
+    def grab(self, region=None):
+        screen = self._render(self.elapsed())
+        self.captures += 1
+        if region is None:
+            return screen
+        left, top, width, height = region
+        x, y = left - self.window.left, top - self.window.top
+        return screen[y : y + height, x : x + width]
+
+    def click(self, x, y):
+        self._record("click", x, y)
+
+    def key_down(self, key):
+        self._record("keydown", key)
+
+    def key_up(self, key):
+        self._record("keyup", key)
+
+    def press(self, key):
+        self._record("press", key)
+
+    def clicks(self):
+        """窗口坐标下的点击列表"""
+        return [
+            (e.args[0] - self.window.left, e.args[1] - self.window.top)
+            for e in self.events
+            if e.kind == "click"
+        ]
@@ -0,0 +1,335 @@
+# language: python
+"""
+性能基准测试。
+
+使用模拟后端, 不需要游戏窗口:
+- match:    每个模板在 1080 / 4k 整帧画面上的匹配耗时
+- tick:     一次完整 find_elements 的耗时 (截图 + 在整个窗口中匹配所有元素,
+            其中一半元素不在画面上)
+- dispatch: level/6.3.it2 中非 sleep 命令的执行速度
+- click:    click_element 从开始查找到点击发出的延迟
+- boxes:    merge_platforms 在背包截图上查找并排序方框的耗时
+- engine:   一帧上匹配所有元素, 逐个匹配与 MatchEngine 线程/进程模式的对比
+- pyramid:  一帧上查找所有模板, 原分辨率完整查找与金字塔查找的耗时和加速比
+
+画面由 elements/<分辨率> 下的模板贴到噪声背景上合成, 也可以用 --frames
+指定录制好的截图。结果输出为 JSON, 并可与保存的基线比较:
+
+    python bench.py --output bench.json --baseline bench_baseline.json
+    python bench.py --update-baseline
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from backends import Scene, SimulatedBackend
+from common import GameBot
+from input_dispatcher import PROFILES, InputDispatcher
+from level_script import compile_script
+from log_pipeline import setup_logging
+from vision import Frame, locate
+
+BASELINE_FILE = "bench_baseline.json"
+LEVEL_SCRIPT = "level/6.3.it2"
+# 每种分辨率对应的窗口大小
+RESOLUTIONS = {"1080": (1920, 1080), "4k": (3840, 2160)}
+# 模拟后端不需要给游戏留反应时间, 去掉输入节奏, 只测量 bot 自身的开销
+NO_DELAY = dict.fromkeys(PROFILES, 0.0)
+
+
+def build_scene(resolution, hidden=()):
+    """
+    把 elements/<resolution> 下的模板横向排开贴到画面上, hidden 中的元素
+    不贴, 用于测量元素不在画面上时的耗时
+    """
+    size = RESOLUTIONS[resolution]
+    scene = Scene(size)
+    bot_elements = os.path.join("elements", resolution)
+    x, y = size[0] // 10, size[1] // 3
+    for path in sorted(glob.glob(os.path.join(bot_elements, "*.png"))):
+        if os.path.splitext(os.path.basename(path))[0] not in hidden:
+            scene.add(path, x, y)
+        x += size[0] // 6
+    return scene
+
+
+def inventory_screenshot(rows=5, cols=8, size=(3840, 2160), box=200, gap=40):
+    """合成一张背包界面: 网格排列的方框, 每个方框里画一个物品图标"""
+    import cv2
+    import numpy as np
+
+    width, height = size
+    rng = np.random.default_rng(0)
+    image = np.full((height, width, 3), 40, dtype=np.uint8)
+    left = (width - cols * (box + gap)) // 2
+    top = (height - rows * (box + gap)) // 2
+    for r in range(rows):
+        for c in range(cols):
+            x, y = left + c * (box + gap), top + r * (box + gap)
+            cv2.rectangle(image, (x, y), (x + box, y + box), (200, 200, 200), 3)
+            color = tuple(int(v) for v in rng.integers(60, 255, 3))
+            cv2.circle(image, (x + box // 2, y + box // 2), box // 4, color, -1)
+            cv2.putText(
+                image, str(r * cols + c), (x + 10, y + box - 15),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2,
+            )  # fmt: skip
+    return image
+
+
+def make_bot(resolution, scene=None):
+    size = RESOLUTIONS[resolution]
+    if scene is None:
+        scene = build_scene(resolution)
+    backend = SimulatedBackend(scene, window=(0, 0, *size))
+    return GameBot(
+        "Infinitode 2", os.path.join("elements", resolution), backend=backend,
+        dispatcher=InputDispatcher(backend, profiles=NO_DELAY),
+    )  # fmt: skip
+
+
+def timeit(func, repeat):
+    """返回 func 的耗时中位数 (毫秒)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_match(args):
+    for resolution in RESOLUTIONS:
+        bot = make_bot(resolution)
+        frame = asyncio.run(bot.capture())
+        for name in sorted(bot.templates.names()):
+            template = bot.templates.get(name).bgr
+            yield (
+                f"match.{resolution}.{name}",
+                timeit(lambda: locate(frame, name, template), args.repeat),
+                "ms",
+            )
+
+
+def bench_tick(args):
+    from stagerunner import StageRunner
+
+    for resolution in RESOLUTIONS:
+        elements = sorted(make_bot(resolution).templates.names())
+        # 一半元素不在画面上, 命中和找不到时的整窗口查找都计入耗时
+        hidden = elements[1::2]
+        runner = StageRunner(make_bot(resolution, build_scene(resolution, hidden)))
+
+        def tick():
+            runner.game.forget_hit()  # 每次都是完整的检测, 不使用上一次学到的区域
+            asyncio.run(runner.find_elements(elements))
+
+        yield f"tick.{resolution}", timeit(tick, args.repeat), "ms"
+
+    if args.frames:
+        frames = sorted(glob.glob(args.frames))
+        runner = StageRunner(make_bot("1080", scene=frames))
+
+        async def replay():
+            for _ in frames:
+                await runner.find_elements(runner.elements)
+
+        total = timeit(lambda: asyncio.run(replay()), 1)
+        yield "tick.recorded", total / len(frames), "ms"
+
+
+def bench_dispatch(args):
+    from stagerunner import StageRunner
+
+    runner = StageRunner(make_bot("1080"))
+    script = compile_script(LEVEL_SCRIPT)
+    steps = [
+        (instruction, step)
+        for instruction, step in script.bind(runner.handlers)
+        if instruction.op != "sleep"
+    ]
+
+    async def dispatch():
+        for instruction, step in steps:
+            await runner.execute(instruction, step)
+
+    elapsed = timeit(lambda: asyncio.run(dispatch()), 1) / 1000
+    yield "dispatch.commands_per_sec", len(steps) / elapsed, "ops/s"
+
+
+def bench_click(args):
+    for resolution in RESOLUTIONS:
+        bot = make_bot(resolution)
+        backend = bot.backend
+
+        def click():
+            start = backend.elapsed()
+            asyncio.run(bot.click_element("restart"))
+            return (backend.events[-1].timestamp - start) * 1000
+
+        samples = [click() for _ in range(args.repeat)]
+        yield f"click.{resolution}", statistics.median(samples), "ms"
+
+
+def bench_boxes(args):
+    import cv2
+
+    from merge_platforms import find_boxes, sort_boxes
+
+    if args.inventory:
+        screenshots = [
+            (os.path.basename(path), cv2.imread(path, cv2.IMREAD_COLOR))
+            for path in sorted(glob.glob(args.inventory))
+        ]
+    else:
+        screenshots = [("synthetic", inventory_screenshot())]
+    for name, screenshot in screenshots:
+        yield (
+            f"boxes.{name}",
+            timeit(lambda: sort_boxes(find_boxes(screenshot)), args.repeat),
+            "ms",
+        )
+
+
+def bench_engine(args):
+    from match_engine import MatchEngine
+
+    for resolution in RESOLUTIONS:
+        bot = make_bot(resolution)
+        frame = asyncio.run(bot.capture())
+        elements = sorted(bot.templates.names())
+
+        def match_all():
+            bot.forget_hit()  # 每次都搜索整个窗口
+            bot.match_frame(frame, elements)
+
+        yield f"engine.{resolution}.serial", timeit(match_all, args.repeat), "ms"
+        for mode in ("thread", "process"):
+            with MatchEngine(mode=mode) as bot.engine:
+                match_all()  # 预热, 启动工作进程
+                yield f"engine.{resolution}.{mode}", timeit(match_all, args.repeat), "ms"
+        bot.engine = None
+
+
+def bench_pyramid(args, levels=2):
+    for resolution in RESOLUTIONS:
+        bot = make_bot(resolution)
+        image = asyncio.run(bot.capture()).image
+        templates = {name: bot.templates.get(name) for name in bot.templates.names()}
+
+        def locate_all(pyramid):
+            # 每次用新的 Frame, 缩小画面的耗时也计算在内; 模板使用预先缩小的副本
+            frame = Frame(image)
+            return {
+                name: locate(
+                    frame, name, t.bgr, pyramid=pyramid, template_pyramid=t.pyramid
+                )
+                for name, t in templates.items()
+            }
+
+        full, fast = locate_all(0), locate_all(levels)
+        for name in templates:
+            if (full[name] and full[name].box) != (fast[name] and fast[name].box):
+                raise AssertionError(f"金字塔查找结果不一致: {name} {full[name]} {fast[name]}")
+        full_ms = timeit(lambda: locate_all(0), args.repeat)
+        fast_ms = timeit(lambda: locate_all(levels), args.repeat)
+        yield f"pyramid.{resolution}.full", full_ms, "ms"
+        yield f"pyramid.{resolution}.pyramid", fast_ms, "ms"
+        yield f"pyramid.{resolution}.speedup", full_ms / fast_ms, "x"
+
+
+BENCHMARKS = {
+    "match": bench_match,
+    "tick": bench_tick,
+    "dispatch": bench_dispatch,
+    "click": bench_click,
+    "boxes": bench_boxes,
+    "engine": bench_engine,
+    "pyramid": bench_pyramid,
+}
+
+
+def run_benchmarks(names, args):
+    results = {}
+    for name in names:
+        for key, value, unit in BENCHMARKS[name](args):
+            results[key] = {"value": round(value, 4), "unit": unit}
+            print(f"{key:40s} {value:12.3f} {unit}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较, 返回退化的指标列表 [(名称, 基线值, 当前值)]。
+
+    ms 类指标超过基线 (1 + threshold) 倍, 或 ops/s、x (加速比) 类指标低于
+    基线 (1 - threshold) 倍时视为退化。基线中没有的指标不参与比较。
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old, new = baseline[key]["value"], result["value"]
+        if result["unit"] in ("ops/s", "x"):
+            regressed = new < old * (1 - threshold)
+        else:
+            regressed = new > old * (1 + threshold)
+        if regressed:
+            regressions.append((key, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="infinitode-flow 性能基准测试")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="逗号分隔的测试项")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--frames", help="录制截图的 glob, 例如 'screenshot/*.png'")
+    parser.add_argument("--inventory", help="背包截图的 glob, 用于 boxes 测试")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的退化比例")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    results = run_benchmarks(args.only.split(","), args)
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        # 只更新本次测量的指标, 其他指标保留原来的基线
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                report["results"] = {**json.load(f)["results"], **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"基线已更新: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"没有基线文件: {args.baseline}")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for key, old, new in regressions:
+        print(f"性能退化: {key} {old} -> {new}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# language: python
+"""
+棋盘模型。
+
+脚本里的 cellsize / boardcenter 定义了一个以棋盘中心为原点的格子坐标系,
+move x y 点击第 (x, y) 格的中心。Board 在创建时就把窗口内所有格子的
+窗口坐标算好放进查找表, move 只需要查表, 并且会拒绝落在窗口外的格子,
+避免点到其他程序上。
+"""
+import math
+
+from vision import Point
+
+
+class Board:
+    """
+    cellsize: 格子大小 (像素)
+    center: 格子 (0, 0) 中心的窗口坐标
+    window: 窗口大小 (width, height)
+    """
+
+    def __init__(self, cellsize, center, window):
+        import numpy as np
+
+        if cellsize <= 0:
+            raise ValueError("cellsize 必须大于 0")
+        self.cellsize = cellsize
+        self.center = Point(*center)
+        self.window = tuple(window)
+        width, height = self.window
+        # 覆盖整个窗口所需的格子范围
+        self.radius = math.ceil(max(width, height) / cellsize) + 1
+        offsets = np.arange(-self.radius, self.radius + 1) * cellsize
+        xs, ys = self.center.x + offsets, self.center.y + offsets
+        # 查找表: 下标为 格子坐标 + radius, 超出窗口的位置为 -1
+        self._xs = np.where((xs >= 0) & (xs < width), xs, -1).tolist()
+        self._ys = np.where((ys >= 0) & (ys < height), ys, -1).tolist()
+
+    def contains(self, x, y):
+        """格子 (x, y) 的中心是否在窗口内"""
+        i, j = x + self.radius, y + self.radius
+        if not (0 <= i < len(self._xs) and 0 <= j < len(self._ys)):
+            return False
+        return self._xs[i] >= 0 and self._ys[j] >= 0
+
+    def to_window(self, x, y):
+        """格子 (x, y) 中心的窗口坐标, 超出窗口时抛出 ValueError"""
+        if not self.contains(x, y):
+            raise ValueError(
+                f"格子 ({x}, {y}) 超出窗口 {self.window}, "
+                f"cellsize={self.cellsize}, boardcenter={tuple(self.center)}"
+            )
+        return Point(self._xs[x + self.radius], self._ys[y + self.radius])
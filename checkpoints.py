@@ -0,0 +1,62 @@
+# language: python
+"""
+脚本检查点记录。
+
+每个关卡脚本只保存最后一个完成的检查点, 写在一个 JSON 文件里,
+bot 重启后也能从这里继续:
+
+    {"level/6.3.it2": {"label": "wave5", "lineno": 120, "digest": "...", "time": ...}}
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+
+class CheckpointStore:
+    def __init__(self, path="checkpoints.json"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(level):
+        return os.path.normpath(level).replace("\\", "/")
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.error(f"读取检查点记录失败: {e}")
+            return {}
+
+    def _write(self, records):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def load(self, level):
+        """返回关卡最后完成的检查点记录, 没有时返回 None"""
+        with self._lock:
+            return self._read().get(self._key(level))
+
+    def save(self, level, label, lineno=0, digest=""):
+        with self._lock:
+            records = self._read()
+            records[self._key(level)] = {
+                "label": label,
+                "lineno": lineno,
+                "digest": digest,
+                "time": time.time(),
+            }
+            self._write(records)
+
+    def clear(self, level):
+        with self._lock:
+            records = self._read()
+            if records.pop(self._key(level), None) is not None:
+                self._write(records)
@@ -0,0 +1,47 @@
+# language: python
+"""
+infinitode-flow 命令行入口。
+
+    python cli.py run level/6.3.it2 --resume
+    python cli.py multi "Infinitode 2 #1=level/6.3.it2" "Infinitode 2 #2=level/6.3.it2"
+    python cli.py merge
+    python cli.py screenshot --interval 5
+    python cli.py bench --only engine
+    python cli.py replay detect sessions/run1
+
+子命令后面的参数原样交给对应模块的 main(), 例如 `python cli.py bench --help`
+显示 bench 的参数。对应的模块在选中子命令后才导入, `python cli.py --help`
+不会加载 OpenCV 和任何 GUI 相关的库。
+"""
+import argparse
+import importlib
+import sys
+
+# 子命令: (模块, 说明), 模块需要提供 main(argv)
+COMMANDS = {
+    "run": ("stagerunner", "运行关卡脚本"),
+    "multi": ("supervisor", "同时运行多个游戏实例"),
+    "merge": ("merge_platforms", "合成背包中的所有物品"),
+    "screenshot": ("screentaker", "画面变化时截图"),
+    "bench": ("bench", "性能基准测试"),
+    "replay": ("session", "回放录制的会话"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="infinitode-flow", description="Infinitode 2 自动化工具")
+    sub = parser.add_subparsers(dest="command", required=True, metavar="命令")
+    for name, (_, help_text) in COMMANDS.items():
+        # 子命令自己的参数 (包括 --help) 由对应模块解析
+        sub.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    args, rest = build_parser().parse_known_args(argv)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    return module.main(rest) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
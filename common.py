@@ -1,44 +1,19 @@
-import os
 import time
 import logging
-import pyautogui
-import pydirectinput as di
 import asyncio
-import pygetwindow as gw
-
-CLICK_DELAY = 0.5
-
-# 配置日志记录
-logging.basicConfig(
-    filename="infinitodebot.log",
-    encoding="utf-8",
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
-
-
-def log_click(point, action):
-    logging.info(f"{action} at coordinates: ({point[0]}, {point[1]})")
-
-
-# Override pyautogui.click to log all clicks
-original_click = di.click
-
-
-def logged_click(*args, **kwargs):
-    if len(args) >= 2:
-        log_click((args[0], args[1]), "Clicked")
-    logging.debug(f"{args, kwargs}")
-
-    original_click(*args, **kwargs)
-    time.sleep(CLICK_DELAY)
-
-
-di.click = logged_click
+import metrics
+from backends import DesktopBackend
+from frame_stream import FrameStream
+from input_dispatcher import InputDispatcher
+from match_engine import MatchRequest, best_match
+from templates import TemplateStore
+from vision import Box, Frame
 
 
 # 激活Infinitode 2窗口
 def activate_window(title):
+    import pygetwindow as gw
+
     try:
         window = gw.getWindowsWithTitle(title)[0]
         if window:
@@ -54,6 +29,8 @@ def activate_window(title):
 
 
 def resize_window(title, w, h):
+    import pygetwindow as gw
+
     try:
         window = gw.getWindowsWithTitle(title)[0]
         if window:
@@ -73,88 +50,301 @@ def resize_window(title, w, h):
 cellsize = 90
 boardcenter = (1920, 1010)
 
+# 脚本和菜单中的点击坐标都按这个窗口高度设计
+BASE_HEIGHT = 1080
+
 
 class GameBot:
-    def __init__(self, title, elements_path="elements"):
+    """
+    regions: {元素名: (left, top, width, height)}, 声明元素固定出现的区域。
+    没有声明区域的元素会记住上一次命中的位置, 下次先在该位置
+    外扩 roi_margin 像素的范围内查找, 找不到再搜索整个窗口。
+
+    elements_path 下的模板会按窗口高度自动缩放, 不需要为每种分辨率
+    单独准备一套图片。scales 用于应对 DPI 或窗口大小的偏差, 例如
+    (0.95, 1.0, 1.05) 会同时尝试三种尺寸并取置信度最高的结果。
+
+    click 的坐标同样按 base_height 高的窗口给出, 点击时乘以
+    窗口高度 / base_height; 检测结果已经是实际像素, 用 click_pixel。
+
+    backend: 截图和输入使用的后端, 默认为真实桌面 DesktopBackend。
+    所有输入都经过 self.input (InputDispatcher) 按顺序发送, profile 参数
+    决定该输入之后要给游戏留多少反应时间, 见 input_dispatcher.PROFILES。
+    每组输入之前调度器会确认窗口拥有焦点; 同一桌面上的多个实例应传入
+    同一个 dispatcher, 见 supervisor.Supervisor。
+
+    pool: 多个 bot 共用的 WorkerPool, 截图和匹配在其中按 name 轮转执行;
+    为 None 时使用 asyncio.to_thread。
+    engine: MatchEngine, 一帧上的所有元素作为一批交给引擎并行匹配;
+    为 None 时在当前线程中逐个匹配。
+    recorder: session.SessionRecorder, 记录每次截图、检测结果和输入事件,
+    用于离线回放。
+    pyramid: 大于 0 时先在缩小 2**pyramid 倍的画面上找候选位置, 再在原分辨率
+    下细查, 置信度的含义不变, 见 vision.match_template_pyramid。
+
+    每次截图都会发布到 self.frames (FrameStream), 需要持续观察画面的任务
+    订阅它, 不必各自截图。
+    """
+
+    def __init__(
+        self,
+        title,
+        elements_path="elements",
+        regions=None,
+        roi_margin=40,
+        scales=(1.0,),
+        backend=None,
+        pool=None,
+        name=None,
+        engine=None,
+        recorder=None,
+        pyramid=0,
+        base_height=BASE_HEIGHT,
+        dispatcher=None,
+    ):
         self.title = title
-        self.window = self._get_window()
+        self.base_height = base_height
+        self.name = name if name is not None else title
+        self.pool = pool
+        self.engine = engine
+        self.recorder = recorder
+        self.pyramid = pyramid
+        self.backend = backend if backend is not None else DesktopBackend()
+        self.input = dispatcher if dispatcher is not None else InputDispatcher(self.backend)
+        self.frames = FrameStream(self.capture)
         self.elements_path = elements_path
+        # 模板预先缩小到金字塔查找需要的级数
+        self.templates = TemplateStore(elements_path, max(2, pyramid)).load()
+        self.regions = {name: Box(*region) for name, region in (regions or {}).items()}
+        self.roi_margin = roi_margin
+        self.scales = tuple(scales)
+        self._last_hits = {}
+        # 缓存的窗口区域, 每次截图时顺便检查一次
+        self._window = None
+
+    @property
+    def window(self):
+        """
+        窗口在屏幕上的区域。查询结果会被缓存, 点击时不再查询系统;
+        每次截图前重新检查, 发现窗口移动或缩放时更新
+        """
+        if self._window is None:
+            self.refresh_window()
+        return self._window
 
-    def _get_window(self):
+    def refresh_window(self):
+        """重新查询窗口区域, 返回窗口区域是否发生了变化"""
         try:
-            window = gw.getWindowsWithTitle(self.title)[0]
-            if window:
-                return window
-            else:
-                raise Exception(f"未找到窗口: {self.title}")
+            box = self.backend.window_box(self.title)
         except Exception as e:
             raise Exception(f"获取窗口失败: {e}")
+        changed = box != self._window
+        if changed and self._window is not None:
+            logging.info(f"窗口位置或大小变化: {tuple(self._window)} -> {tuple(box)}")
+            metrics.inc("window_changes_total")
+        self._window = box
+        return changed
 
-    async def click(self, x, y):
-        if self.window:
-            window_left, window_top = self.window.left, self.window.top
-            click_x, click_y = window_left + x, window_top + y
-            await asyncio.to_thread(di.click, click_x, click_y)
-        else:
-            raise Exception(f"窗口未激活: {self.title}")
+    def invalidate_window(self):
+        """丢弃缓存的窗口区域, 下次使用时重新查询"""
+        self._window = None
+
+    def _record_input(self, kind, *args):
+        if self.recorder is not None:
+            self.recorder.record_input(kind, args)
+
+    @property
+    def scale(self):
+        """设计坐标到窗口像素的缩放比例"""
+        return self.window.height / self.base_height
+
+    def to_window(self, x, y):
+        """把 base_height 下的设计坐标换算成窗口像素坐标"""
+        scale = self.scale
+        return round(x * scale), round(y * scale)
+
+    async def click(self, x, y, profile="click"):
+        """点击设计坐标 (x, y), 按窗口高度缩放"""
+        await self.click_pixel(*self.to_window(x, y), profile=profile)
+
+    async def click_pixel(self, x, y, profile="click"):
+        """点击窗口像素坐标 (x, y), 例如检测结果的中心点"""
+        with metrics.timer("gamebot_op_seconds", op="click"):
+            window = self.window
+            click_x, click_y = window.left + x, window.top + y
+            self._record_input("click", x, y)
+            async with self.exclusive():
+                await self.input.submit("click", click_x, click_y, profile=profile)
+
+    async def key_down(self, key, profile="key"):
+        with metrics.timer("gamebot_op_seconds", op="key"):
+            self._record_input("key_down", key)
+            async with self.exclusive():
+                await self.input.submit("key_down", key, profile=profile)
+
+    async def key_up(self, key, profile="key"):
+        with metrics.timer("gamebot_op_seconds", op="key"):
+            self._record_input("key_up", key)
+            async with self.exclusive():
+                await self.input.submit("key_up", key, profile=profile)
+
+    async def press(self, key, profile="key"):
+        with metrics.timer("gamebot_op_seconds", op="key"):
+            self._record_input("press", key)
+            async with self.exclusive():
+                await self.input.submit("press", key, profile=profile)
+
+    def exclusive(self, priority=0):
+        """独占输入通道, 并在这组输入之前确认本窗口拥有焦点"""
+        return self.input.exclusive(priority, focus=self.title)
 
     def activate(self):
-        self.window.activate()
+        self.backend.activate(self.title)
+        # 窗口被激活时可能被系统移动或恢复
+        self.invalidate_window()
+
+    async def focus(self):
+        """通过输入调度器激活窗口, 不会插在其他实例的一组输入中间"""
+        async with self.exclusive():
+            pass
+        self.invalidate_window()
 
     def resize(self, w, h):
-        self.window.resizeTo(w, h)
+        self.backend.resize(self.title, w, h)
+        self.invalidate_window()
+
+    async def offload(self, func, *args):
+        """在线程中执行耗时的截图或匹配"""
+        if self.pool is not None:
+            return await self.pool.run(self.name, func, *args)
+        return await asyncio.to_thread(func, *args)
+
+    def _grab(self):
+        self.refresh_window()
+        return self.backend.grab(self._window)
+
+    async def capture(self):
+        """截取整个窗口, 返回 Frame"""
+        with metrics.timer("gamebot_op_seconds", op="capture"):
+            image = await self.offload(self._grab)
+        frame = Frame(image)
+        if self.recorder is not None:
+            self.recorder.record_frame(frame)
+        self.frames.publish(frame)
+        return frame
+
+    def set_search_region(self, element, region):
+        """声明元素的查找区域, region 为 None 时取消声明"""
+        if region is None:
+            self.regions.pop(element, None)
+        else:
+            self.regions[element] = Box(*region)
+
+    def forget_hit(self, element=None):
+        """清除记住的命中位置"""
+        if element is None:
+            self._last_hits.clear()
+        else:
+            self._last_hits.pop(element, None)
+
+    def search_region(self, element):
+        """
+        返回 (查找区域, 是否为学习得到的区域), 区域为 None 表示整个窗口
+        """
+        if element in self.regions:
+            return self.regions[element], False
+        last_hit = self._last_hits.get(element)
+        if last_hit is not None:
+            return last_hit.expand(self.roi_margin), True
+        return None, False
+
+    def _match_requests(self, frame, requests):
+        """匹配一批 MatchRequest, 有匹配引擎时交给引擎并行执行"""
+        if self.engine is not None:
+            with metrics.timer("template_match_seconds", element="batch"):
+                return self.engine.match(frame, requests)
+        matches = []
+        for request in requests:
+            with metrics.timer("template_match_seconds", element=request.element):
+                matches.append(best_match(frame, request))
+        return matches
+
+    def match_frame(self, frame, elements, confidence=0.9):
+        """
+        在同一帧画面中匹配多个元素, 返回 {元素名: Match 或 None}
+        """
+        result = dict.fromkeys(elements)
+        requests, learned = [], set()
+        for element in elements:
+            try:
+                # 模板按窗口高度缩放, 多尺度查找时同时尝试几个相邻的尺寸
+                templates = self.templates.variants(element, frame.height, self.scales)
+            except FileNotFoundError:
+                # 模板库在第一次找不到时已经记录了错误
+                continue
+            region, is_learned = self.search_region(element)
+            if is_learned:
+                learned.add(element)
+            bgr = tuple(template.bgr for template in templates)
+            pyramids = tuple(template.pyramid for template in templates)
+            requests.append(
+                MatchRequest(element, bgr, region, confidence, self.pyramid, pyramids)
+            )
+
+        retry = []
+        for request, match in zip(requests, self._match_requests(frame, requests)):
+            result[request.element] = match
+            if match is None and request.element in learned:
+                # 元素不在上次的位置, 退回到整个窗口查找
+                retry.append(request._replace(region=None))
+        for request, match in zip(retry, self._match_requests(frame, retry)):
+            result[request.element] = match
+
+        for element, match in result.items():
+            if match:
+                if element not in self.regions:
+                    self._last_hits[element] = match.box
+                logging.debug(f"找到 {element}: {match.box} ({match.confidence:.3f})")
+            else:
+                logging.debug(f"没有找到 {element}")
+        if self.recorder is not None:
+            self.recorder.record_detection(frame, result)
+        return result
+
+    async def detect(self, elements, confidence=0.9):
+        """
+        只截一次图, 在这一帧中匹配所有元素
+        """
+        with metrics.timer("gamebot_op_seconds", op="detect"):
+            frame = await self.capture()
+            return await self.offload(self.match_frame, frame, elements, confidence)
 
     async def element_exists(self, element):
         logging.debug(f"查找 {element}")
-        try:
-            await asyncio.to_thread(
-                pyautogui.locateOnWindow,
-                os.path.join(self.elements_path, f"{element}.png"),
-                self.title,
-                confidence=0.9,
-            )
-            logging.debug(f"找到 {element}")
-            return True
-        except Exception:
-            logging.debug(f"没有找到 {element}")
-            return False
+        found = await self.detect([element])
+        return found[element] is not None
 
     async def find_element(self, element):
         logging.info(f"查找 {element}")
-        try:
-            element_box = await asyncio.to_thread(
-                pyautogui.locateOnWindow,
-                os.path.join(self.elements_path, f"{element}.png"),
-                self.title,
-                confidence=0.9,
-            )
-            if element_box:
-                element_center = pyautogui.center(element_box)
-                logging.info(f"找到 {element_box}")
-                return element_center
-        except Exception:
-            logging.info(f"没有找到 {element_box}")
-            return None
-
-    async def click_element(self, image_file, confidence=0.9, waitUntilSuccess=True):
-        # TODO: search from window region
+        match = (await self.detect([element]))[element]
+        if match:
+            logging.info(f"找到 {match.box}")
+            return match.center
+        logging.info(f"没有找到 {element}")
+        return None
+
+    async def click_element(
+        self, image_file, confidence=0.9, waitUntilSuccess=True, minSearchTime=3
+    ):
+        deadline = time.monotonic() + minSearchTime
         while True:
-            try:
-                logging.debug(f"查找 {image_file}")
-                element = await asyncio.to_thread(
-                    pyautogui.locateOnWindow,
-                    f"{self.elements_path}/{image_file}.png",
-                    self.title,
-                    minSearchTime=3,
-                    confidence=confidence,
-                )
-                if element:
-                    element_center = pyautogui.center(element)
-                    di.click(element_center.x, element_center.y)
-                    logging.info(f"点击 {image_file}")
-                    return True
-            except Exception:
-                logging.debug(f"没有找到 {image_file}")
-                if not waitUntilSuccess:
-                    return False
+            logging.debug(f"查找 {image_file}")
+            match = (await self.detect([image_file], confidence))[image_file]
+            if match:
+                await self.click_pixel(*match.center)
+                logging.info(f"点击 {image_file}")
+                return True
+            logging.debug(f"没有找到 {image_file}")
+            if not waitUntilSuccess and time.monotonic() >= deadline:
+                return False
             await asyncio.sleep(1)
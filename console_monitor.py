@@ -2,80 +2,191 @@
 import asyncio
 import time
 import threading
-from rich.console import Console, Group
-from rich.live import Live
-from rich.panel import Panel
-from rich.progress import Progress, BarColumn, TextColumn
+from collections import deque
 
-console = Console()
+# rich 在创建看板时才导入, 只导入本模块 (例如 shared_monitor) 不需要加载它
+
+
+class MonitorView:
+    """
+    看板中属于一个实例的分区, 接口与 ConsoleMonitor 相同,
+    由 ConsoleMonitor.view() 创建
+    """
+
+    def __init__(self, monitor, name, max_status=5, countdown_time=0):
+        self.monitor = monitor
+        self.name = name
+        self.status_history = deque(maxlen=max_status)
+        self.countdown_time = countdown_time
+        self._deadline = time.monotonic() + countdown_time
+        self._info = {}
+
+    @property
+    def remaining_time(self):
+        return max(0.0, self._deadline - time.monotonic())
+
+    def update_status(self, status_text, color="white"):
+        with self.monitor._lock:
+            self.status_history.append((status_text, color))
+            self.monitor._mark_dirty()
+
+    def set_countdown(self, remaining_time):
+        with self.monitor._lock:
+            remaining_time = min(max(remaining_time, 0), self.countdown_time)
+            self._deadline = time.monotonic() + remaining_time
+            self.monitor._mark_dirty()
+
+    def set_countdown_time(self, countdown_time):
+        with self.monitor._lock:
+            self.countdown_time = countdown_time
+            self._deadline = time.monotonic() + countdown_time
+            self.monitor._mark_dirty()
+
+    def update_info(self, key, value):
+        with self.monitor._lock:
+            if self._info.get(key) != value:
+                self._info[key] = value
+                self.monitor._mark_dirty()
+
+    def panel(self):
+        """调用方需持有 monitor._lock"""
+        lines = [f"[{color}]{text}[/{color}]" for text, color in self.status_history]
+        lines += [
+            f"[white]{k}: [yellow]{v}[/yellow][/white]" for k, v in self._info.items()
+        ]
+        lines.append(f"[white]倒计时: [yellow]{int(self.remaining_time)}s[/yellow][/white]")
+        from rich.panel import Panel
+
+        return Panel("\n".join(lines), title=self.name, border_style="cyan")
 
 
 class ConsoleMonitor:
-    def __init__(self, max_status=5, countdown_time=600):
+    """
+    控制台监控面板。
+
+    只有状态、信息或倒计时显示的秒数发生变化时才重新渲染; 状态历史使用
+    固定长度的环形缓冲区, 倒计时按单调时钟的截止时间计算。
+    可以用 start() 在单独的线程中运行, 也可以用 start_async() 作为
+    asyncio 任务运行在当前事件循环中。
+
+    同一进程中运行多个实例时, 每个实例用 view(name) 得到自己的分区,
+    显示在公共看板下方。
+    """
+
+    def __init__(self, max_status=5, countdown_time=600, console=None):
+        from rich.console import Console
+        from rich.progress import BarColumn, Progress, TextColumn
+
+        self.console = console if console is not None else Console()
         self.max_status = max_status
-        self.status_history = []
+        self.status_history = deque(maxlen=max_status)
         self.countdown_time = countdown_time
-        self.remaining_time = countdown_time
+        self._deadline = time.monotonic() + countdown_time
         self.progress = Progress(
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
             TextColumn("{task.fields[remaining_time]}s"),
-            console=console,
+            console=self.console,
             transient=True,
         )
         # 添加一个倒计时任务，总值为 countdown_time
         self.task = self.progress.add_task(
-            "倒计时", total=self.countdown_time, remaining_time=self.remaining_time
+            "倒计时", total=self.countdown_time, remaining_time=countdown_time
         )
         self._lock = threading.Lock()
         self._running = False
         self._info = {}
+        self._dirty = True
+        self._wakeup = threading.Event()
+        self._async_wakeup = None
+        self._loop = None
+        self._views = {}
+        self.renders = 0
+
+    @property
+    def remaining_time(self):
+        return max(0.0, self._deadline - time.monotonic())
+
+    def view(self, name, max_status=None):
+        """返回名为 name 的实例分区, 不存在时创建"""
+        with self._lock:
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = MonitorView(
+                    self, name, max_status or self.max_status
+                )
+                self._mark_dirty()
+            return view
+
+    def _remaining_times(self):
+        views = list(self._views.values())
+        return [self.remaining_time, *(view.remaining_time for view in views)]
+
+    def _shown_seconds(self):
+        return tuple(int(remaining) for remaining in self._remaining_times())
+
+    def _mark_dirty(self):
+        self._dirty = True
+        self._wakeup.set()
+        self._wake_async()
+
+    def _wake_async(self):
+        if self._async_wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_wakeup.set)
+            except RuntimeError:  # 事件循环已经关闭
+                self._async_wakeup = None
 
     def update_status(self, status_text, color="white"):
         with self._lock:
             self.status_history.append((status_text, color))
-            if len(self.status_history) > self.max_status:
-                self.status_history.pop(0)
+            self._mark_dirty()
 
     def set_countdown(self, remaining_time):
         with self._lock:
-            if remaining_time < 0:
-                remaining_time = 0
-            elif remaining_time > self.countdown_time:
-                remaining_time = self.countdown_time
-            self.remaining_time = remaining_time
-            completed = self.countdown_time - self.remaining_time
-            self.progress.update(
-                self.task, remaining_time=self.remaining_time, completed=completed
-            )
+            remaining_time = min(max(remaining_time, 0), self.countdown_time)
+            self._deadline = time.monotonic() + remaining_time
+            self._mark_dirty()
 
     def set_countdown_time(self, countdown_time):
         with self._lock:
             self.countdown_time = countdown_time
-            self.remaining_time = countdown_time
-            self.progress.update(
-                self.task,
-                total=self.countdown_time,
-                remaining_time=self.remaining_time,
-                completed=0,
-            )
+            self._deadline = time.monotonic() + countdown_time
+            self._mark_dirty()
 
     def update_info(self, key, value):
         """更新固定信息"""
         with self._lock:
-            self._info[key] = value
+            if self._info.get(key) != value:
+                self._info[key] = value
+                self._mark_dirty()
 
     def render(self):
+        from rich.console import Group
+        from rich.panel import Panel
+
         with self._lock:
-            # 拼接 status_history 为多行文本
-            status_lines = "\n".join(
-                f"[{color}]{text}[/{color}]" for text, color in self.status_history
-            )
-            # 拼接固定信息为多行文本
-            info_lines = "\n".join(
-                f"[white]{k}: [yellow]{v}[/yellow][/white]"
-                for k, v in self._info.items()
-            )
+            status_history = list(self.status_history)
+            info = list(self._info.items())
+            countdown_time = self.countdown_time
+            view_panels = [view.panel() for view in self._views.values()]
+            self._dirty = False
+
+        # 拼接 status_history 为多行文本
+        status_lines = "\n".join(
+            f"[{color}]{text}[/{color}]" for text, color in status_history
+        )
+        # 拼接固定信息为多行文本
+        info_lines = "\n".join(
+            f"[white]{k}: [yellow]{v}[/yellow][/white]" for k, v in info
+        )
+        remaining = self.remaining_time
+        self.progress.update(
+            self.task,
+            total=countdown_time,
+            remaining_time=int(remaining),
+            completed=countdown_time - remaining,
+        )
 
         status_panel = Panel(
             status_lines if status_lines else "无状态信息",
@@ -87,9 +198,27 @@ class ConsoleMonitor:
             title="看板",
             border_style="green",
         )
-        return Group(status_panel, info_panel, self.progress)
+        self.renders += 1
+        return Group(status_panel, info_panel, *view_panels, self.progress)
+
+    def _next_wait(self, shown_seconds, refresh_interval):
+        """距离倒计时显示的秒数变化还有多久, 没有倒计时时返回 None"""
+        waits = [
+            remaining - int(remaining)
+            for remaining, shown in zip(self._remaining_times(), shown_seconds)
+            if remaining > 0 or shown != 0
+        ]
+        if not waits:
+            return None
+        return max(refresh_interval, min(waits))
+
+    def _needs_render(self, shown_seconds):
+        return self._dirty or self._shown_seconds() != shown_seconds
 
     def start(self, refresh_interval=0.1):
+        """在单独的线程中运行, refresh_interval 为两次渲染之间的最短间隔"""
+        if self._running:
+            return
         self._running = True
 
         # Live 运行在当前线程
@@ -99,25 +228,63 @@ class ConsoleMonitor:
         thread.start()
 
     def _live_loop(self, refresh_interval):
-        with Live(self.render(), console=console, auto_refresh=False) as live:
+        from rich.live import Live
+
+        with Live(self.render(), console=self.console, auto_refresh=False) as live:
+            shown_seconds = self._shown_seconds()
             while self._running:
-                live.update(self.render())
-                live.refresh()
+                self._wakeup.wait(self._next_wait(shown_seconds, refresh_interval))
+                self._wakeup.clear()
+                if self._running and self._needs_render(shown_seconds):
+                    shown_seconds = self._shown_seconds()
+                    live.update(self.render(), refresh=True)
                 time.sleep(refresh_interval)
-                with self._lock:
-                    if self.remaining_time > 0:
-                        self.remaining_time -= refresh_interval
-                        if self.remaining_time < 0:
-                            self.remaining_time = 0
-                        completed = self.countdown_time - self.remaining_time
-                        self.progress.update(
-                            self.task,
-                            remaining_time=int(self.remaining_time),
-                            completed=completed,
-                        )
+
+    def start_async(self, refresh_interval=0.1):
+        """在当前事件循环中作为任务运行, 不需要单独的线程"""
+        self._running = True
+        return asyncio.create_task(self.run_async(refresh_interval))
+
+    async def run_async(self, refresh_interval=0.1):
+        from rich.live import Live
+
+        self._loop = asyncio.get_running_loop()
+        self._async_wakeup = asyncio.Event()
+        try:
+            with Live(self.render(), console=self.console, auto_refresh=False) as live:
+                shown_seconds = self._shown_seconds()
+                while self._running:
+                    timeout = self._next_wait(shown_seconds, refresh_interval)
+                    try:
+                        await asyncio.wait_for(self._async_wakeup.wait(), timeout)
+                    except TimeoutError:
+                        pass
+                    self._async_wakeup.clear()
+                    if self._running and self._needs_render(shown_seconds):
+                        shown_seconds = self._shown_seconds()
+                        live.update(self.render(), refresh=True)
+                    await asyncio.sleep(refresh_interval)
+        finally:
+            self._async_wakeup = None
 
     def stop(self):
         self._running = False
+        self._wakeup.set()
+        self._wake_async()
+
+
+_shared = None
+
+
+def shared_monitor():
+    """
+    进程内共用的看板, 第一次调用时创建。导入模块时不会创建或启动看板,
+    需要显示时由程序入口调用 start()
+    """
+    global _shared
+    if _shared is None:
+        _shared = ConsoleMonitor(max_status=20)
+    return _shared
 
 
 if __name__ == "__main__":
@@ -168,4 +335,4 @@ if __name__ == "__main__":
         running = False  # 设置运行状态为False
         runtime_thread.join(timeout=2)  # 等待计时线程结束，最多等待2秒
         monitor.stop()
-        console.print("ConsoleMonitor 已停止")
+        monitor.console.print("ConsoleMonitor 已停止")
@@ -0,0 +1,53 @@
+# language: python
+"""
+bot 共享的画面流。
+
+GameBot 每截一帧都会发布到自己的 FrameStream, 需要持续观察画面的任务
+(例如脚本中的 waitfor / until) 订阅同一个流, 而不是各自截图:
+
+    seq, frame = await bot.frames.next()
+    seq, frame = await bot.frames.next(seq)   # 等待比 seq 更新的一帧
+
+其他任务 (ScreenWatcher 等) 已经在频繁截图时, 订阅者直接使用它们的画面;
+超过 max_age 秒没有新画面时, 由订阅者补截一帧, 同一时间只会有一次补截。
+"""
+import asyncio
+
+
+class FrameStream:
+    """
+    capture: 截图的协程函数, 截到的画面应当通过 publish 发布
+    max_age: 等待新画面的最长时间, 超过后自己截图
+    """
+
+    def __init__(self, capture, max_age=0.5):
+        self._capture = capture
+        self.max_age = max_age
+        self.latest = None
+        # 已发布的画面数, 作为画面的序号
+        self.seq = 0
+        self._published = asyncio.Event()
+        self._capturing = None
+
+    def publish(self, frame):
+        self.latest = frame
+        self.seq += 1
+        # 唤醒所有等待者, 之后的等待者使用新的 Event
+        event, self._published = self._published, asyncio.Event()
+        event.set()
+
+    async def _refresh(self):
+        if self._capturing is None or self._capturing.done():
+            self._capturing = asyncio.ensure_future(self._capture())
+        # 一个等待者被取消时不影响其他等待者共用的截图
+        await asyncio.shield(self._capturing)
+
+    async def next(self, seq=0):
+        """返回序号大于 seq 的画面 (序号, Frame)"""
+        while self.seq <= seq:
+            event = self._published
+            try:
+                await asyncio.wait_for(event.wait(), self.max_age)
+            except asyncio.TimeoutError:
+                await self._refresh()
+        return self.seq, self.latest
@@ -0,0 +1,223 @@
+# language: python
+"""
+异步输入调度器。
+
+所有点击和按键都放进同一个有序队列, 由一个后台任务依次交给专用的
+输入线程执行, 事件循环本身不会被输入阻塞。每个事件带有一个节奏配置
+(profile), 表示执行后到下一个输入事件之前至少要间隔多久; 这段间隔只会
+推迟后面的输入, 不会阻塞检测和监控。
+
+多个任务 (例如脚本的几个并行轨道) 同时输入时, 用 exclusive() 独占输入
+通道, 一组输入 (选中塔再升级) 不会被其他任务的输入插在中间; 同时等待的
+任务按 priority 从大到小获得通道。
+
+同一桌面上的多个游戏实例共用一个调度器 (共用一套鼠标键盘和窗口焦点)。
+获取通道时给出 focus (窗口标题), 调度器会在这组输入之前确认该窗口
+拥有焦点, 没有时先激活它, 按键不会发到其他实例的窗口。
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CLICK_DELAY = 0.5
+
+# 各类输入执行后需要留给游戏的反应时间 (秒)
+PROFILES = {
+    "default": 0.0,
+    "click": CLICK_DELAY,  # 界面按钮, 需要等界面切换
+    "board": CLICK_DELAY,  # 棋盘上的点击
+    "key": 0.0,
+    "keyhold": 0.05,  # 按下后保持一小段时间再松开
+    "focus": 0.2,  # 激活窗口后等它切换到前台, 窗口本来就有焦点时不等待
+}
+
+
+class InputCommand:
+    def __init__(self, kind, args, delay, owner, future):
+        self.kind = kind
+        self.args = args
+        self.delay = delay
+        self.owner = owner
+        self.future = future
+
+    def __repr__(self):
+        return f"InputCommand({self.kind}, {self.args})"
+
+
+class InputDispatcher:
+    """
+    backend: 实际执行输入的后端
+    profiles: 节奏配置, 覆盖 PROFILES 中的同名项
+    maxsize: 队列长度上限, 队列满时 submit 会等待 (背压)
+    """
+
+    def __init__(self, backend, profiles=None, maxsize=64):
+        self.backend = backend
+        self.profiles = {**PROFILES, **(profiles or {})}
+        self.maxsize = maxsize
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="input")
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._ready_at = 0.0
+        # 独占输入通道的任务、重入次数和等待者 [(-priority, 序号, future, 任务)]
+        self._holder = None
+        self._depth = 0
+        self._waiters = []
+        self._order = itertools.count()
+        # 当前持有者已经确认过焦点的窗口
+        self._focused = None
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            # 第一次使用, 或者换了一个事件循环 (例如多次 asyncio.run)
+            self._loop = loop
+            self._queue = asyncio.Queue(self.maxsize)
+            self._task = loop.create_task(self._consume())
+
+    async def submit(self, kind, *args, profile="default", wait=True):
+        """
+        提交一个输入事件, kind 为 backend 的方法名 (click/key_down/key_up/press),
+        或 focus (确认窗口焦点, 见 acquire)。
+
+        wait 为 True 时等待事件执行完成; 等待中的调用方被取消时,
+        尚未执行的事件也会被丢弃。
+        """
+        self._ensure_running()
+        future = self._loop.create_future()
+        owner = asyncio.current_task()
+        command = InputCommand(kind, args, self.profiles[profile], owner, future)
+        await self._queue.put(command)
+        if wait:
+            await future
+        return future
+
+    async def acquire(self, priority=0, focus=None):
+        """
+        独占输入通道, 同一任务可以重复获取; 每次 acquire 对应一次 release。
+        focus 为窗口标题时, 在这组输入之前确认该窗口拥有焦点
+        """
+        task = asyncio.current_task()
+        if self._holder is task:
+            self._depth += 1
+        elif self._holder is None:
+            # 通道空闲时剩下的等待者都已经被取消
+            self._waiters.clear()
+            self._holder, self._depth = task, 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (-priority, next(self._order), future, task))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 已经轮到这个任务, 但它在恢复运行前被取消了
+                    self.release()
+                raise
+        if focus is not None and self._focused != focus:
+            self._focused = focus
+            try:
+                await self.submit("focus", focus, profile="focus")
+            except BaseException:
+                self.release()
+                raise
+
+    def release(self):
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        self._holder = None
+        # 下一个持有者可能是另一个窗口的输入, 需要重新确认焦点
+        self._focused = None
+        while self._waiters:
+            _, _, future, task = heapq.heappop(self._waiters)
+            if not future.done():
+                self._holder, self._depth = task, 1
+                future.set_result(None)
+                return
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self, priority=0, focus=None):
+        """在 with 块中独占输入通道"""
+        await self.acquire(priority, focus)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def cancel_pending(self, owner=None):
+        """丢弃队列中尚未执行的事件, 给出 owner 时只丢弃该任务提交的事件"""
+        if self._queue is None:
+            return 0
+        kept, dropped = [], 0
+        while not self._queue.empty():
+            command = self._queue.get_nowait()
+            self._queue.task_done()
+            if owner is None or command.owner is owner:
+                command.future.cancel()
+                dropped += 1
+            else:
+                kept.append(command)
+        for command in kept:
+            self._queue.put_nowait(command)
+        if dropped:
+            logging.info(f"已取消 {dropped} 个未执行的输入事件")
+        return dropped
+
+    def pending(self):
+        return 0 if self._queue is None else self._queue.qsize()
+
+    async def join(self):
+        """等待队列中的事件全部执行完"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def _focus(self, title):
+        """在输入线程中执行: 窗口没有焦点时激活它, 返回是否进行了激活"""
+        if self.backend.is_active(title):
+            return False
+        logging.info(f"激活窗口 {title}")
+        self.backend.activate(title)
+        return True
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            command = await self._queue.get()
+            try:
+                if command.future.cancelled():
+                    continue
+                wait = self._ready_at - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if command.future.cancelled():
+                    continue
+                if command.kind == "focus":
+                    method = self._focus
+                else:
+                    method = getattr(self.backend, command.kind)
+                try:
+                    result = await loop.run_in_executor(
+                        self._executor, method, *command.args
+                    )
+                except Exception as e:
+                    result = None
+                    if not command.future.done():
+                        command.future.set_exception(e)
+                else:
+                    if not command.future.done():
+                        command.future.set_result(None)
+                if command.kind != "focus" or result:
+                    self._ready_at = time.monotonic() + command.delay
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,423 @@
+# language: python
+"""
+.it2 关卡脚本编译器。
+
+脚本在运行前被一次性解析成指令列表, 参数类型在编译时检查,
+出错时报告文件名和行号, 而不是等到游戏开始后才发现。
+
+支持的命令:
+    # 注释             在监控面板上显示
+    sleep 3            暂停 3 秒 (可以是小数), 时间从上一个计划时间点算起
+    at 120 [命令]      等到脚本开始后第 120 秒, 再执行后面的命令
+    leftclick 100 200  点击窗口坐标
+    cellsize 90        设置单元格大小
+    boardcenter 1920 1010  设置棋盘中心
+    move 1 2           点击指定单元格
+    a / enter [n]      按键, 可选重复次数; 不认识的按键名在编译时报错
+    ctrl-r [n]         组合键, 可选重复次数
+    checkpoint wave5   检查点, 运行到这里时记录下来, 恢复模式下从这里继续
+    waitfor 条件 40 [else 命令]
+                       等到条件成立, 最多等 40 秒 (从上一个计划时间点算起);
+                       超时后执行 else 后面的命令 (可省略) 再继续
+    until 条件 300 [else 命令]
+                       同 waitfor, 但最多等到脚本开始后第 300 秒, 类似 at
+
+条件可以是:
+    upgrade_ready              模板出现
+    not wave_banner            模板消失
+    pixel 1504 320 #3fa34d     窗口坐标处的像素颜色 (每个通道允许 ±16 的误差)
+
+并行轨道, 块中的命令和主脚本同时运行, 块内的 sleep / at 从块开始时算起;
+块由下面缩进的行组成, 遇到第一个不缩进的行结束:
+    track 名字 [priority 5]    运行到这里时启动一个轨道, 执行一遍块中的命令
+        move 0 1
+        shift 10
+    every 30 [名字] [priority 5]
+        s                      每 30 秒执行一遍块中的命令, 直到脚本结束或被 stop
+        leftclick 958 535
+    stop 名字                  停止一个轨道
+
+所有轨道的输入按顺序经过同一个输入通道; 连续的输入命令 (中间没有 sleep 等)
+作为一组执行, 不会被其他轨道插入。多个轨道同时等待输入通道时 priority 大的
+先执行, 默认为 0。主脚本结束时等待所有 track 执行完, 并停止所有 every。
+"""
+import functools
+import hashlib
+import os
+from typing import NamedTuple
+
+MODIFIER_KEYS = ("ctrl", "alt", "shift")
+# 可以按的键名, 与 DesktopBackend 使用的 pydirectinput 键盘映射一致;
+# 不认识的命令会被当作按键, 所以拼错的命令 (slep 5) 在编译时就能发现
+KEY_NAMES = frozenset(
+    [chr(c) for c in range(ord("a"), ord("z") + 1)]
+    + [str(d) for d in range(10)]
+    + [f"f{n}" for n in range(1, 13)]
+    + [f"num{d}" for d in range(10)]
+    + list("`-=[]\\;',./")
+    + [
+        "escape", "esc", "printscreen", "prntscrn", "prtsc", "prtscr", "scrolllock",
+        "pause", "backspace", "insert", "home", "pageup", "pagedown", "end",
+        "delete", "del", "tab", "capslock", "enter", "return", "space", "apps",
+        "numlock", "divide", "multiply", "subtract", "add", "decimal", "numpadenter",
+        "shiftleft", "shiftright", "ctrlleft", "ctrlright", "altleft", "altright",
+        "win", "winleft", "winright", "up", "down", "left", "right",
+    ]
+    + list(MODIFIER_KEYS)
+)  # fmt: skip
+# 像素条件每个颜色通道允许的误差
+PIXEL_TOLERANCE = 16
+# 后面跟着一段缩进命令的块
+BLOCK_OPS = ("track", "every")
+# 不能跟在 at 或 else 后面的命令
+NOT_INLINE = ("at", "checkpoint", "waitfor", "until", "track", "every")
+
+
+class ScriptError(Exception):
+    def __init__(self, message, filename="<string>", lineno=0, text=""):
+        self.filename = filename
+        self.lineno = lineno
+        self.text = text
+        super().__init__(f"{filename}:{lineno}: {message}: {text!r}")
+
+
+class Instruction(NamedTuple):
+    op: str
+    args: tuple
+    lineno: int
+    text: str
+
+
+class Condition(NamedTuple):
+    """
+    waitfor / until 等待的条件
+    kind: "element" 时 args 为 (元素名,); "pixel" 时为 (x, y, (r, g, b), 误差)
+    negate: 为 True 时等待条件不成立, 例如模板消失
+    """
+
+    kind: str
+    args: tuple
+    negate: bool = False
+
+    def __str__(self):
+        if self.kind == "pixel":
+            x, y, (r, g, b), _ = self.args
+            text = f"pixel {x} {y} #{r:02x}{g:02x}{b:02x}"
+        else:
+            text = self.args[0]
+        return f"not {text}" if self.negate else text
+
+
+class Script:
+    """
+    checkpoints: {检查点名: (指令序号, 计划时间)}, 计划时间为按 sleep 和 at
+    推算出的、该检查点相对脚本开始的秒数
+    """
+
+    def __init__(self, filename, digest, instructions, checkpoints=None):
+        self.filename = filename
+        self.digest = digest
+        self.instructions = instructions
+        self.checkpoints = checkpoints or {}
+
+    def bind(self, handlers):
+        return bind(self.instructions, handlers)
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+    def __len__(self):
+        return len(self.instructions)
+
+
+def bind(instructions, handlers):
+    """把每条指令和对应的处理函数提前绑定好, 返回 [(指令, 无参协程函数)]"""
+    return [
+        (instruction, functools.partial(handlers[instruction.op], *instruction.args))
+        for instruction in instructions
+    ]
+
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{value!r} 不是整数") from None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{value!r} 不是有效的数字") from None
+
+
+def _expect(args, count):
+    if len(args) != count:
+        raise ValueError(f"需要 {count} 个参数, 实际为 {len(args)} 个")
+
+
+def _parse_sleep(args):
+    _expect(args, 1)
+    seconds = _number(args[0])
+    if seconds < 0:
+        raise ValueError("sleep 时间不能为负数")
+    return (seconds,)
+
+
+def _parse_point(args):
+    _expect(args, 2)
+    return _int(args[0]), _int(args[1])
+
+
+def _parse_cellsize(args):
+    _expect(args, 1)
+    size = _int(args[0])
+    if size <= 0:
+        raise ValueError("cellsize 必须大于 0")
+    return (size,)
+
+
+def _parse_name(args):
+    _expect(args, 1)
+    return (args[0],)
+
+
+def _parse_repeat(args):
+    if len(args) > 1:
+        raise ValueError(f"最多 1 个参数, 实际为 {len(args)} 个")
+    repeat = _int(args[0]) if args else 1
+    if repeat < 1:
+        raise ValueError("重复次数必须大于 0")
+    return repeat
+
+
+def _parse_color(value):
+    text = value.lstrip("#")
+    if not value.startswith("#") or len(text) != 6:
+        raise ValueError(f"{value!r} 不是 #rrggbb 格式的颜色")
+    try:
+        return tuple(int(text[i : i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise ValueError(f"{value!r} 不是 #rrggbb 格式的颜色") from None
+
+
+def _parse_condition(args):
+    negate = bool(args) and args[0] == "not"
+    if negate:
+        args = args[1:]
+    if not args:
+        raise ValueError("缺少等待的条件")
+    if args[0] == "pixel":
+        _expect(args, 4)
+        x, y = _parse_point(args[1:3])
+        return Condition("pixel", (x, y, _parse_color(args[3]), PIXEL_TOLERANCE), negate)
+    _expect(args, 1)
+    return Condition("element", (args[0],), negate)
+
+
+def _parse_priority(args):
+    """拆出末尾可选的 priority N, 返回 (其余参数, 优先级)"""
+    if len(args) >= 2 and args[-2] == "priority":
+        return args[:-2], _int(args[-1])
+    return args, 0
+
+
+def _parse_track(args):
+    args, priority = _parse_priority(args)
+    _expect(args, 1)
+    return args[0], priority
+
+
+def _parse_every(args):
+    args, priority = _parse_priority(args)
+    if len(args) not in (1, 2):
+        raise ValueError("every 需要一个间隔和可选的名字")
+    interval = _number(args[0])
+    if interval <= 0:
+        raise ValueError("every 间隔必须大于 0")
+    # 没有名字时由 compile_source 按行号命名
+    return interval, args[1] if len(args) == 2 else None, priority
+
+
+PARSERS = {
+    "sleep": _parse_sleep,
+    "leftclick": _parse_point,
+    "cellsize": _parse_cellsize,
+    "boardcenter": _parse_point,
+    "move": _parse_point,
+    "checkpoint": _parse_name,
+    "track": _parse_track,
+    "every": _parse_every,
+    "stop": _parse_name,
+}
+
+
+def parse_line(text, lineno=0, filename="<string>"):
+    """把一行脚本解析成 Instruction, 空行返回 None"""
+    text = text.strip()
+    if not text:
+        return None
+    if text.startswith("#"):  # 注释行
+        return Instruction("comment", (text[1:].lstrip(),), lineno, text)
+
+    command, *args = text.split()
+    try:
+        if command == "at":
+            return _parse_at(args, lineno, filename, text)
+        if command in ("waitfor", "until"):
+            return _parse_wait(command, args, lineno, filename, text)
+        if command in PARSERS:
+            return Instruction(command, PARSERS[command](args), lineno, text)
+
+        repeat = _parse_repeat(args)
+        if "-" in command and len(command) > 1:  # 组合键
+            keys = command.split("-")
+            _check_keys(keys)
+            modifiers = tuple(key for key in keys if key in MODIFIER_KEYS)
+            main_key = next((key for key in keys if key not in MODIFIER_KEYS), None)
+            if not main_key:
+                raise ValueError("组合键中必须包含一个主键")
+            return Instruction("hotkey", (modifiers, main_key, repeat), lineno, text)
+        _check_keys([command])
+        return Instruction("key", (command, repeat), lineno, text)
+    except ValueError as e:
+        raise ScriptError(str(e), filename, lineno, text) from None
+
+
+def _check_keys(keys):
+    for key in keys:
+        if key not in KEY_NAMES:
+            raise ValueError(f"未知的命令或按键 {key!r}")
+
+
+def _parse_at(args, lineno, filename, text):
+    """at T [命令], 命令部分会被解析成一条内嵌的指令"""
+    if not args:
+        raise ValueError("at 后必须跟一个时间")
+    seconds = _number(args[0])
+    if seconds < 0:
+        raise ValueError("at 时间不能为负数")
+    inner = None
+    if len(args) > 1:
+        if args[1] in NOT_INLINE:
+            raise ValueError(f"at 后面不能跟 {args[1]}")
+        inner = parse_line(" ".join(args[1:]), lineno, filename)
+    return Instruction("at", (seconds, inner), lineno, text)
+
+
+def _parse_wait(command, args, lineno, filename, text):
+    """waitfor/until 条件 时间 [else 命令]"""
+    fallback = None
+    if "else" in args:
+        split = args.index("else")
+        args, inner = args[:split], args[split + 1 :]
+        if not inner:
+            raise ValueError("else 后面缺少命令")
+        if inner[0] in NOT_INLINE:
+            raise ValueError(f"else 后面不能跟 {inner[0]}")
+        fallback = parse_line(" ".join(inner), lineno, filename)
+    if len(args) < 2:
+        raise ValueError(f"{command} 需要一个条件和一个时间")
+    seconds = _number(args[-1])
+    if seconds < 0:
+        raise ValueError(f"{command} 时间不能为负数")
+    return Instruction(command, (_parse_condition(args[:-1]), seconds, fallback), lineno, text)
+
+
+def _plan(planned, instruction, filename):
+    """
+    按 sleep 和 at 推算执行完 instruction 后的计划时间,
+    同时检查 at 是否早于前面的时间
+    """
+    if instruction.op == "sleep":
+        return planned + instruction.args[0]
+    if instruction.op == "waitfor":
+        # 按最坏情况 (等到超时) 推算
+        return planned + instruction.args[1]
+    if instruction.op in ("at", "until"):
+        deadline = instruction.args[0 if instruction.op == "at" else 1]
+        if deadline < planned:
+            raise ScriptError(
+                f"{instruction.op} {deadline:g} 早于前面累计的 {planned:g} 秒",
+                filename,
+                instruction.lineno,
+                instruction.text,
+            )
+        return deadline
+    return planned
+
+
+def compile_source(source, filename="<string>"):
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    instructions = []
+    checkpoints = {}
+    planned = 0.0
+    # 正在读取的块: (块的第一行, 块中的指令, 块内的计划时间)
+    block = None
+    tracks, stops = set(), []
+
+    def close_block():
+        header, body, _ = block
+        if not body:
+            raise ScriptError("块中没有命令", filename, header.lineno, header.text)
+        instructions.append(header._replace(args=header.args + (tuple(body),)))
+
+    for lineno, line in enumerate(source.splitlines(), start=1):
+        instruction = parse_line(line, lineno, filename)
+        if instruction is None:
+            continue
+        op = instruction.op
+        if block is not None:
+            if line[0].isspace():
+                if op in BLOCK_OPS or op == "checkpoint":
+                    raise ScriptError(f"块中不能使用 {op}", filename, lineno, instruction.text)
+                header, body, block_planned = block
+                body.append(instruction)
+                block = (header, body, _plan(block_planned, instruction, filename))
+                continue
+            close_block()
+            block = None
+        if op in BLOCK_OPS:
+            if op == "every" and instruction.args[1] is None:
+                args = instruction.args
+                instruction = instruction._replace(args=(args[0], f"every-{lineno}", args[2]))
+            name = instruction.args[0 if op == "track" else 1]
+            if name in tracks:
+                raise ScriptError("轨道名重复", filename, lineno, instruction.text)
+            tracks.add(name)
+            block = (instruction, [], 0.0)
+            continue
+        if op == "stop":
+            stops.append(instruction)
+        planned = _plan(planned, instruction, filename)
+        if op == "checkpoint":
+            label = instruction.args[0]
+            if label in checkpoints:
+                raise ScriptError("检查点重复", filename, lineno, instruction.text)
+            checkpoints[label] = (len(instructions), planned)
+        instructions.append(instruction)
+    if block is not None:
+        close_block()
+    for instruction in stops:
+        if instruction.args[0] not in tracks:
+            raise ScriptError("没有这个轨道", filename, instruction.lineno, instruction.text)
+    return Script(filename, digest, instructions, checkpoints)
+
+
+_compiled = {}
+
+
+def compile_script(filename):
+    """
+    编译脚本文件, 内容未变化时直接返回缓存的结果。缓存按文件和内容区分,
+    内容相同的两个文件各自编译, Script.filename (检查点按它保存) 不会混用
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+    key = (os.path.abspath(filename), hashlib.sha256(data).hexdigest())
+    script = _compiled.get(key)
+    if script is None:
+        script = compile_source(data.decode("utf-8"), filename)
+        _compiled[key] = script
+    return script
@@ -0,0 +1,155 @@
+# language: python
+"""
+异步日志管道。
+
+业务代码照常使用 logging.info / logging.debug, 记录只会被放进内存队列,
+写文件、轮转和压缩都在后台线程中完成:
+- 按大小 (max_bytes) 或时间 (when="midnight" 等) 轮转, 旧文件压缩为 .gz
+- 相同内容的消息在 dedup_interval 秒内只写一次, 之后补记重复次数
+- module_levels 按模块 (文件名) 单独设置级别, 例如 {"watcher": logging.INFO}
+"""
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class ModuleLevelFilter(logging.Filter):
+    """按 record.module 过滤, 没有单独设置的模块使用 default 级别"""
+
+    def __init__(self, module_levels, default=logging.NOTSET):
+        super().__init__()
+        self.module_levels = dict(module_levels or {})
+        self.default = default
+
+    def filter(self, record):
+        return record.levelno >= self.module_levels.get(record.module, self.default)
+
+
+class DedupFilter(logging.Filter):
+    """
+    相同模块、级别和内容的消息在 interval 秒内只放行第一条,
+    下一次放行时在消息后面注明期间被省略的次数。
+    WARNING 及以上级别的消息不做去重。
+    """
+
+    def __init__(self, interval=30.0, max_keys=1000, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self.clock = clock
+        # 过滤器在各个记录日志的线程中执行
+        self._lock = threading.Lock()
+        self._seen = {}
+
+    def filter(self, record):
+        if self.interval <= 0 or record.levelno >= logging.WARNING:
+            return True
+        now = self.clock()
+        key = (record.module, record.levelno, record.getMessage())
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.interval:
+                seen[1] += 1
+                return False
+            skipped = seen[1] if seen is not None else 0
+            self._seen[key] = [now, 0]
+            if len(self._seen) > self.max_keys:
+                self._expire(now)
+        if skipped:
+            record.msg = f"{record.getMessage()} (前 {self.interval:g} 秒内重复 {skipped} 次)"
+            record.args = None
+        return True
+
+    def _expire(self, now):
+        for key, (first, count) in list(self._seen.items()):
+            if now - first >= self.interval and not count:
+                del self._seen[key]
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def file_handler(filename, max_bytes, backup_count, when, compress):
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    if compress:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+_listener = None
+
+
+def setup_logging(
+    filename="infinitodebot.log",
+    level=logging.DEBUG,
+    max_bytes=20 * 1024 * 1024,
+    backup_count=10,
+    when=None,
+    compress=True,
+    dedup_interval=30.0,
+    module_levels=None,
+    force=False,
+):
+    """
+    配置根日志记录器。与 logging.basicConfig 一样, 根记录器已经有
+    handler 时不做任何事, 除非 force=True。返回后台的 QueueListener。
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return _listener
+    if force:
+        shutdown()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ModuleLevelFilter(module_levels, level))
+    queue_handler.addFilter(DedupFilter(dedup_interval))
+    root.addHandler(queue_handler)
+    # 根记录器放行所有级别, 由 ModuleLevelFilter 决定每个模块的级别
+    root.setLevel(min([level, *(module_levels or {}).values()]))
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler(filename, max_bytes, backup_count, when, compress)
+    )
+    _listener.start()
+    return _listener
+
+
+def shutdown():
+    """停止后台线程, 把队列中剩余的日志写完"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown)
@@ -0,0 +1,130 @@
+# language: python
+"""
+模板匹配引擎。
+
+一帧画面上要匹配的所有 (元素, 模板, 区域) 作为一批提交, 分给多个
+工作线程或工作进程同时匹配:
+- mode="thread": cv2.matchTemplate 执行时会释放 GIL, 多个线程可以
+  真正并行, 没有进程间传输的开销
+- mode="process": 画面放进共享内存, 工作进程直接读取, 不需要序列化整帧;
+  适合匹配以外的 Python 代码也成为瓶颈的场景 (例如多个实例同时运行)
+
+引擎不依赖 GameBot, 工作进程只会导入本模块和 vision。
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional
+
+from vision import Box, Frame, locate
+
+
+class MatchRequest(NamedTuple):
+    element: str
+    # 同一元素的几个尺寸的模板 (BGR), 取置信度最高的结果
+    templates: tuple
+    region: Optional[Box] = None
+    confidence: float = 0.9
+    # 金字塔查找的最大级数, 0 表示在原分辨率下完整查找
+    pyramid: int = 0
+    # 与 templates 一一对应的预先缩小的模板, 见 templates.Template.pyramid
+    template_pyramids: tuple = ()
+
+
+def best_match(frame, request):
+    pyramids = request.template_pyramids or (None,) * len(request.templates)
+    matches = [
+        locate(
+            frame, request.element, template, request.confidence, request.region,
+            request.pyramid, template_pyramid,
+        )  # fmt: skip
+        for template, template_pyramid in zip(request.templates, pyramids)
+    ]
+    return max(filter(None, matches), key=lambda m: m.confidence, default=None)
+
+
+def _init_worker():
+    import cv2
+
+    # 并行已经由进程数决定, 每个进程内 OpenCV 不再另开线程
+    cv2.setNumThreads(1)
+
+
+def _match_shared(name, shape, dtype, left, top, requests):
+    """在工作进程中执行: 从共享内存读取画面并匹配一批请求"""
+    import numpy as np
+
+    shm = shared_memory.SharedMemory(name=name, track=False)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        frame = Frame(image, left, top)
+        results = [best_match(frame, request) for request in requests]
+        del frame, image
+        return results
+    finally:
+        shm.close()
+
+
+class MatchEngine:
+    """
+    workers: 工作线程或进程数, 默认为 CPU 核数
+    mode: "thread" 或 "process"
+    """
+
+    def __init__(self, workers=None, mode="thread"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"未知的匹配模式: {mode}")
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        if mode == "thread":
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="match")
+        else:
+            # 与 Windows 上的行为一致, 也避免在多线程的进程中 fork
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+
+    def _batches(self, requests):
+        """把请求分成不超过 workers 个批次"""
+        size = math.ceil(len(requests) / self.workers)
+        return [requests[i : i + size] for i in range(0, len(requests), size)]
+
+    def match(self, frame, requests):
+        """匹配一批请求, 按请求的顺序返回 Match 或 None"""
+        requests = list(requests)
+        if not requests:
+            return []
+        if self.mode == "thread":
+            futures = [self._executor.submit(best_match, frame, r) for r in requests]
+            return [future.result() for future in futures]
+
+        import numpy as np
+
+        image = np.ascontiguousarray(frame.image)
+        shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+        try:
+            np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[:] = image
+            futures = [
+                self._executor.submit(
+                    _match_shared, shm.name, image.shape, image.dtype.str,
+                    frame.left, frame.top, batch,
+                )  # fmt: skip
+                for batch in self._batches(requests)
+            ]
+            return [match for future in futures for match in future.result()]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
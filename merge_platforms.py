@@ -1,11 +1,8 @@
-import cv2
-import numpy as np
-
-import pyautogui
+import argparse
 import time
-import keyboard
-import pydirectinput as di
+from backends import DesktopBackend
 from common import logging, activate_window
+from log_pipeline import setup_logging
 
 
 # 设置合成按钮、最大数量按钮和确定按钮的坐标
@@ -15,153 +12,256 @@ CONFIRM_BUTTON = (2210, 1832)
 CANCEL_BUTTON = (2436, 1814)
 
 PROGRESS_BAR = (1959, 1618)
-CLICK_DELAY = 0.5
+PROGRESS_BAR_COLOR = (0x22, 0x22, 0x22)
+# 合成对话框所在的区域 (x, y, w, h), 用于判断点击后界面是否有了反应
+DIALOG_REGION = (1900, 1550, 800, 350)
 
 
-# 查找界面上的所有方框
+# 查找界面上的所有方框, 返回 (n, 4) 的数组, 每行为 x, y, w, h
 def find_boxes(screenshot):
+    import cv2
+    import numpy as np
+
     # 转换为灰度图
     gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
     # 边缘检测
     edges = cv2.Canny(gray, 50, 150)
     # 查找轮廓
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    boxes = []
-    for contour in contours:
-        # 获取轮廓的边界框
-        x, y, w, h = cv2.boundingRect(contour)
-        # 过滤宽度小于100或高度小于100，或宽度大于300或高度大于300的框
-        if 100 <= w <= 300 and 100 <= h <= 300:
-            boxes.append((x, y, w, h))
-
-    # 过滤重叠的方框
-    filtered_boxes = []
-    for box in boxes:
-        x1, y1, w1, h1 = box
-        keep = True
-        for other_box in boxes:
-            if box == other_box:
-                continue
-            x2, y2, w2, h2 = other_box
-            if (
-                x1 < x2 + w2 and x1 + w1 > x2 and y1 < y2 + h2 and y1 + h1 > y2
-            ):  # 检查是否重叠
-                overlap_area = (min(x1 + w1, x2 + w2) - max(x1, x2)) * (
-                    min(y1 + h1, y2 + h2) - max(y1, y2)
-                )
-                box_area = w1 * h1
-                other_box_area = w2 * h2
-                if overlap_area / box_area > 0.5 or overlap_area / other_box_area > 0.5:
-                    if box_area < other_box_area:
-                        keep = False
-                        break
-        if keep:
-            filtered_boxes.append(box)
-
-    return filtered_boxes
+    if not contours:
+        return np.empty((0, 4), dtype=np.int32)
+    # 获取轮廓的边界框
+    boxes = np.array([cv2.boundingRect(contour) for contour in contours])
+    # 过滤宽度小于100或高度小于100，或宽度大于300或高度大于300的框
+    w, h = boxes[:, 2], boxes[:, 3]
+    boxes = boxes[(w >= 100) & (w <= 300) & (h >= 100) & (h <= 300)]
+    return suppress_overlaps(boxes)
+
+
+def suppress_overlaps(boxes, ratio=0.5):
+    """
+    过滤重叠的方框: 两个方框的重叠面积超过其中任意一个面积的 ratio 时,
+    去掉面积较小的那个。所有方框两两比较一次完成, 保持输入顺序。
+    """
+    import numpy as np
+
+    if len(boxes) < 2:
+        return boxes
+    x1, y1, w, h = boxes.T.astype(np.int64)
+    x2, y2 = x1 + w, y1 + h
+    area = w * h
+    overlap_w = np.minimum(x2[:, None], x2) - np.maximum(x1[:, None], x1)
+    overlap_h = np.minimum(y2[:, None], y2) - np.maximum(y1[:, None], y1)
+    overlapped = (overlap_w > 0) & (overlap_h > 0)  # 检查是否重叠
+    overlap_area = np.where(overlapped, overlap_w * overlap_h, 0)
+    large_overlap = (overlap_area > ratio * area[:, None]) | (overlap_area > ratio * area)
+    smaller = area[:, None] < area
+    drop = (overlapped & large_overlap & smaller).any(axis=1)
+    return boxes[~drop]
 
 
 # 按从下到上、从右到左排序方框
-def sort_boxes(boxes):
+def sort_boxes(boxes, row_tolerance=10):
+    import numpy as np
+
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    if len(boxes) == 0:
+        return boxes
     # 先按y坐标从大到小排序（从下到上）
-    boxes.sort(key=lambda box: box[1], reverse=True)
-    # 再按y坐���分组后，按x坐标从大到小排序（从右到左）
-    sorted_boxes = []
-    current_y = None
-    current_row = []
-    for box in boxes:
-        if (
-            current_y is None or abs(box[1] - current_y) < 10
-        ):  # 假设同一排的y坐标差异不超过10
-            current_row.append(box)
-            current_y = box[1]
-        else:
-            current_row.sort(key=lambda box: box[0], reverse=True)
-            sorted_boxes.extend(current_row)
-            current_row = [box]
-            current_y = box[1]
-    if current_row:
-        current_row.sort(key=lambda box: box[0], reverse=True)
-        sorted_boxes.extend(current_row)
-    return sorted_boxes
+    boxes = boxes[np.argsort(-boxes[:, 1], kind="stable")]
+    # 相邻两个方框的y坐标差异不小于 row_tolerance 时开始新的一排
+    new_row = np.abs(np.diff(boxes[:, 1])) >= row_tolerance
+    rows = np.concatenate(([0], np.cumsum(new_row)))
+    # 同一排内按x坐标从大到小排序（从右到左）
+    return boxes[np.lexsort((-boxes[:, 0], rows))]
 
 
 # 点击方框中心点
-def click_box_center(box):
+def box_center(box):
+    x, y, w, h = (int(v) for v in box)
+    return x + w // 2, y + h // 2
+
+
+def changed_region(before, after, threshold=24):
+    """两帧画面中发生变化的区域 (x, y, w, h), 没有变化时返回 None"""
+    import cv2
+    import numpy as np
+
+    diff = cv2.absdiff(before, after).max(axis=2)
+    points = cv2.findNonZero((diff > threshold).astype(np.uint8))
+    if points is None:
+        return None
+    return cv2.boundingRect(points)
+
+
+def _contains(box, point):
     x, y, w, h = box
-    center_x = x + w // 2
-    center_y = y + h // 2
-    di.click(center_x, center_y)
-    logging.info(f"点击方框中心点: ({center_x}, {center_y})")
+    return x <= point[0] < x + w and y <= point[1] < y + h
 
 
-# 主程序
-def main():
-    logging.info("程序开始")
+def _intersects(box, region):
+    x, y, w, h = box
+    rx, ry, rw, rh = region
+    return x < rx + rw and x + w > rx and y < ry + rh and y + h > ry
 
-    # 窗口标题（根据实际窗口名称修改）
-    window_title = "Infinitode 2"
-    if not activate_window(window_title):
-        return
 
-    # 检测到esc按下则退出循环
-    # 截取窗口区域
-    screenshot = np.array(pyautogui.screenshot())
-    # 查找方框
-    boxes = find_boxes(screenshot)
-    if not boxes:
-        print("未找到方框，退出程序")
-        return
+class CraftingRun:
+    """
+    合成流程, 每一步只截一次图:
+    - 所有像素检查都读取同一帧画面
+    - 点击后一旦画面有了反应就继续, 不再固定等待
+    - 合成完成后只在画面变化的区域重新查找方框
+
+    backend: 截图和点击使用的后端 (屏幕坐标)
+    ui_timeout: 等待界面反应的最长时间
+    """
+
+    def __init__(self, backend, ui_timeout=1.0, poll_interval=0.03):
+        self.backend = backend
+        self.ui_timeout = ui_timeout
+        self.poll_interval = poll_interval
+        self.frame = None
 
-    # 排序方框
-    sorted_boxes = sort_boxes(boxes)
-    # 在窗口上画出boxes并标注顺序号
-    # for i, box in enumerate(sorted_boxes):
-    #     x, y, w, h = box
-    #     cv2.rectangle(screenshot, (x, y), (x + w, y + h), (0, 255, 0), 2)
-    #     cv2.putText(
-    #         screenshot,
-    #         str(i + 1),
-    #         (x, y - 10),
-    #         cv2.FONT_HERSHEY_SIMPLEX,
-    #         0.9,
-    #         (0, 255, 0),
-    #         2,
-    #     )
-
-    # # 显示带有方框和顺序号的图像
-    # cv2.imshow("Boxes with Order", screenshot)
-    # cv2.waitKey(0)
-    # cv2.destroyAllWindows()
-
-    # 遍历方框并点击
-    for box in sorted_boxes:
-        if keyboard.is_pressed("esc"):
-            logging.info("检测到ESC按下，退出程序")
-            return
-
-        click_box_center(box)
-        # 点击合成按钮
-        logging.info("点击合成按钮")
-        di.click(*SYNTHESIS_BUTTON)
-        # 检查进度条颜色
-        progress_bar_exists = pyautogui.pixelMatchesColor(
-            *PROGRESS_BAR, (0x22, 0x22, 0x22)
-        )
-        logging.debug(f"进度条颜色: {pyautogui.pixel(*PROGRESS_BAR)}")
-        if not progress_bar_exists:
-            pyautogui.click(*CANCEL_BUTTON)
-            time.sleep(1)
+    def capture(self):
+        self.frame = self.backend.grab()
+        return self.frame
+
+    def click(self, point, name):
+        logging.info(f"点击{name}: {point}")
+        self.backend.click(*point)
+
+    def pixel_matches(self, point, rgb, tolerance=0):
+        x, y = point
+        b, g, r = (int(v) for v in self.frame[y, x])
+        logging.debug(f"{point} 颜色: {(r, g, b)}")
+        return all(abs(a - e) <= tolerance for a, e in zip((r, g, b), rgb))
+
+    def wait_pixel(self, point, rgb, tolerance=0, timeout=None):
+        """
+        在新截的画面上反复检查像素颜色, 直到颜色匹配或超时, 返回是否匹配。
+        界面有入场动画时, 画面刚开始变化的那一帧里元素可能还没画出来
+        """
+        deadline = time.monotonic() + (timeout or self.ui_timeout)
+        while not self.pixel_matches(point, rgb, tolerance):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+            self.capture()
+        return True
+
+    def click_and_wait(self, point, name, region=DIALOG_REGION, timeout=None):
+        """
+        点击后等待 region 内的画面发生变化, 返回新的画面; 超时返回最后一帧
+        """
+        before = self.frame if self.frame is not None else self.capture()
+        x, y, w, h = region
+        before_region = before[y : y + h, x : x + w]
+        self.click(point, name)
+        deadline = time.monotonic() + (timeout or self.ui_timeout)
+        while True:
+            frame = self.capture()
+            if changed_region(before_region, frame[y : y + h, x : x + w]):
+                return frame
+            if time.monotonic() >= deadline:
+                logging.debug(f"点击{name}后画面没有变化")
+                return frame
+            time.sleep(self.poll_interval)
+
+    def wait_stable(self, timeout=None):
+        """等待画面不再变化 (例如合成动画结束), 返回最后一帧"""
+        deadline = time.monotonic() + (timeout or self.ui_timeout)
+        previous = self.frame if self.frame is not None else self.capture()
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            frame = self.capture()
+            if changed_region(previous, frame) is None:
+                break
+            previous = frame
+        return self.frame
+
+    def rescan(self, before, boxes):
+        """
+        比较合成前后的画面, 只在变化的区域重新查找方框,
+        返回更新后的方框列表
+        """
+        import numpy as np
+
+        region = changed_region(before, self.frame)
+        if region is None:
+            return boxes
+        # 把和变化区域相交的方框整体包含进来, 保证能重新找到完整的方框
+        touched = [box for box in boxes if _intersects(box, region)]
+        x0 = min([region[0], *(b[0] for b in touched)]) - 20
+        y0 = min([region[1], *(b[1] for b in touched)]) - 20
+        x1 = max([region[0] + region[2], *(b[0] + b[2] for b in touched)]) + 20
+        y1 = max([region[1] + region[3], *(b[1] + b[3] for b in touched)]) + 20
+        x0, y0 = max(x0, 0), max(y0, 0)
+        found = find_boxes(self.frame[y0:y1, x0:x1])
+        found[:, :2] += (x0, y0)
+        kept = [box for box in boxes if not _intersects(box, (x0, y0, x1 - x0, y1 - y0))]
+        logging.debug(f"重新扫描区域 {(x0, y0, x1 - x0, y1 - y0)}, 找到 {len(found)} 个方框")
+        return sort_boxes(np.array([*kept, *found]).reshape(-1, 4))
+
+    def craft(self, box):
+        """合成一个方框中的物品, 返回是否进行了合成"""
+        self.click_and_wait(box_center(box), "方框中心点", region=tuple(box), timeout=0.3)
+        # 点击合成按钮, 对话框出现后等待进度条画出来
+        self.click_and_wait(SYNTHESIS_BUTTON, "合成按钮")
+        if not self.wait_pixel(PROGRESS_BAR, PROGRESS_BAR_COLOR):
             logging.info("进度条颜色不匹配，点击取消按钮")
-            continue
+            self.click_and_wait(CANCEL_BUTTON, "取消按钮")
+            return False
 
-        # 点击最大数量按钮
         logging.info("找到进度条,点击最大数量按钮")
-        di.click(*MAX_QUANTITY_BUTTON)
+        # 数量已经是最大值时界面不会变化, 不用等太久
+        self.click_and_wait(MAX_QUANTITY_BUTTON, "最大数量按钮", timeout=0.3)
+        self.click_and_wait(CONFIRM_BUTTON, "确定按钮")
+        self.wait_stable()
+        return True
+
+    def run(self, should_stop=lambda: False):
+        before = self.capture()
+        boxes = sort_boxes(find_boxes(before))
+        if len(boxes) == 0:
+            print("未找到方框，退出程序")
+            return 0
+        # 已经处理过的方框中心点; 重新扫描后方框坐标可能有几个像素的偏差,
+        # 所以按中心点是否落在方框内判断是否处理过
+        done = []
+        crafted = 0
+        while True:
+            pending = [box for box in boxes if not any(_contains(box, p) for p in done)]
+            if not pending:
+                break
+            if should_stop():
+                logging.info("检测到ESC按下，退出程序")
+                break
+            box = pending[0]
+            done.append(box_center(box))
+            before = self.frame
+            if self.craft(box):
+                crafted += 1
+                boxes = self.rescan(before, boxes)
+        logging.info(f"合成结束, 共合成 {crafted} 次")
+        return crafted
 
-        # 点击确定按钮
-        logging.info("点击确定按钮")
-        di.click(*CONFIRM_BUTTON)
+
+# 主程序
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成背包中的所有物品, 按 ESC 停止")
+    parser.add_argument("--title", default="Infinitode 2", help="游戏窗口标题")
+    args = parser.parse_args(argv)
+
+    import keyboard
+
+    setup_logging()
+    logging.info("程序开始")
+
+    if not activate_window(args.title):
+        return
+
+    # 检测到esc按下则退出循环
+    CraftingRun(DesktopBackend()).run(should_stop=lambda: keyboard.is_pressed("esc"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+# language: python
+"""
+热路径指标: 耗时直方图和计数器。
+
+    import metrics
+
+    with metrics.timer("gamebot_op_seconds", op="capture"):
+        ...
+    metrics.inc("state_transitions_total", state="RESTART_SCREEN")
+
+MetricsExporter 定期把快照追加到 JSONL 文件、写出 Prometheus 文本格式文件,
+并把摘要显示在 ConsoleMonitor 的看板上。
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图的桶上限 (秒)
+BUCKETS = (
+    0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60,
+)  # fmt: skip
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按桶估算分位数, 返回所在桶的上限"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = [*labels, *extra]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        with self._lock:
+            key = _key(name, labels)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            key = _key(name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def histogram(self, name, **labels):
+        with self._lock:
+            return self._histograms.get(_key(name, labels))
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "time": time.time(),
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **h.snapshot()}
+                    for (name, labels), h in sorted(self._histograms.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+            }
+
+    def prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip([*map(str, h.buckets), "+Inf"], h.counts):
+                    cumulative += count
+                    labelstr = _format_labels(labels, [("le", bound)])
+                    lines.append(f"{name}_bucket{labelstr} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, name, label):
+        """{标签值: "n=.. p50=..ms p95=..ms"}, 用于看板显示"""
+        with self._lock:
+            items = [
+                (dict(labels).get(label, ""), h)
+                for (metric, labels), h in sorted(self._histograms.items())
+                if metric == name
+            ]
+        return {
+            value: (
+                f"n={h.count} p50={h.quantile(0.5) * 1000:.0f}ms "
+                f"p95={h.quantile(0.95) * 1000:.0f}ms"
+            )
+            for value, h in items
+        }
+
+
+registry = Registry()
+observe = registry.observe
+inc = registry.inc
+timer = registry.timer
+
+
+class MetricsExporter:
+    """
+    定期导出指标:
+    - jsonl_path: 每次追加一行快照
+    - prom_path: 覆盖写入 Prometheus 文本格式, 可以交给 node_exporter 的 textfile 收集
+    - monitor: ConsoleMonitor, 在看板上显示摘要
+    """
+
+    # 看板上显示的指标: (指标名, 分组标签, 显示名前缀)
+    SUMMARY = (
+        ("gamebot_op_seconds", "op", "耗时"),
+        ("script_command_seconds", "command", "命令"),
+    )
+
+    def __init__(
+        self,
+        registry=registry,
+        jsonl_path="metrics.jsonl",
+        prom_path="metrics.prom",
+        monitor=None,
+        interval=10.0,
+    ):
+        self.registry = registry
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.monitor = monitor
+        self.interval = interval
+        self._task = None
+
+    def export(self):
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.registry.snapshot(), ensure_ascii=False) + "\n")
+        if self.prom_path:
+            tmp_path = self.prom_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.registry.prometheus())
+            os.replace(tmp_path, self.prom_path)
+        if self.monitor is not None:
+            for name, label, prefix in self.SUMMARY:
+                for value, text in self.registry.summary(name, label).items():
+                    self.monitor.update_info(f"{prefix} {value}", text)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.export)
+            except OSError as e:
+                logging.error(f"导出指标失败: {e}")
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        """停止定期导出, 并导出最后一次快照"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            self.export()
+        except OSError as e:
+            logging.error(f"导出指标失败: {e}")
@@ -1,19 +1,328 @@
-import time
+# language: python
+"""
+截图工具。
+
+只有画面和上一次保存的画面相比确实发生了变化时才保存, PNG 编码和写文件
+在后台线程池中进行, 不会拖慢截图。可以额外写入一个只追加的帧归档
+(缩小后的 JPEG), 并按文件数量、总大小和保存时间清理旧文件:
+
+    python screentaker.py --interval 5 --max-bytes 2000 --archive screenshot/archive
+
+也可以作为库使用, 例如 bot 出错时保存当前画面:
+
+    screentaker = Screentaker(game.backend, directory="screenshot/errors")
+    screentaker.snapshot(reason="error")
+"""
+import argparse
+import glob
+import logging
 import os
-from PIL import ImageGrab
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import DesktopBackend
+
+
+def prune_files(paths, max_files=None, max_bytes=None, max_age=None, now=None):
+    """
+    按修改时间从旧到新删除文件, 直到满足数量、总大小和保存时间 (秒) 的限制,
+    返回被删除的文件列表
+    """
+    now = time.time() if now is None else now
+    files = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    removed = []
+    for index, (mtime, size, path) in enumerate(files):
+        remaining = len(files) - index
+        if not (
+            (max_files is not None and remaining > max_files)
+            or (max_bytes is not None and total > max_bytes)
+            or (max_age is not None and now - mtime > max_age)
+        ):
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed.append(path)
+    return removed
+
+
+class FrameArchive:
+    """
+    只追加的帧归档。每一帧缩小到 scale 倍后编码为 JPEG, 和时间戳一起
+    追加到当前的分段文件中; 分段超过 segment_bytes 后开始新的分段,
+    旧分段按 max_bytes / max_age 整个删除。
+
+    每条记录为 8 字节时间戳 (double) + 4 字节长度 + JPEG 数据。
+    """
+
+    HEADER = struct.Struct("<dI")
+    PATTERN = "frames-*.bin"
+
+    def __init__(
+        self,
+        directory,
+        scale=0.25,
+        quality=80,
+        segment_bytes=64 * 1024 * 1024,
+        max_bytes=None,
+        max_age=None,
+    ):
+        self.directory = directory
+        self.scale = scale
+        self.quality = quality
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._segment = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def encode(self, image):
+        import cv2
+
+        if self.scale != 1:
+            image = cv2.resize(
+                image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+            )
+        ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("帧编码失败")
+        return data.tobytes()
+
+    def _new_segment(self, timestamp):
+        name = time.strftime("frames-%Y%m%d-%H%M%S", time.localtime(timestamp))
+        path = os.path.join(self.directory, f"{name}-{int(timestamp * 1000) % 1000:03d}.bin")
+        self._segment = path
+        return path
+
+    def append(self, image, timestamp=None):
+        """编码并追加一帧, 返回写入的分段文件"""
+        timestamp = time.time() if timestamp is None else timestamp
+        data = self.encode(image)
+        with self._lock:
+            path = self._segment
+            if path is None or not os.path.exists(path):
+                path = self._new_segment(timestamp)
+            elif os.path.getsize(path) + len(data) > self.segment_bytes:
+                path = self._new_segment(timestamp)
+            with open(path, "ab") as f:
+                f.write(self.HEADER.pack(timestamp, len(data)) + data)
+            self.prune()
+        return path
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, self.PATTERN)))
+
+    def prune(self):
+        # 当前正在写入的分段不参与清理
+        old = [path for path in self.segments() if path != self._segment]
+        current = os.path.getsize(self._segment) if self._segment else 0
+        max_bytes = None if self.max_bytes is None else max(0, self.max_bytes - current)
+        return prune_files(old, max_bytes=max_bytes, max_age=self.max_age)
+
+    @classmethod
+    def read(cls, path):
+        """按写入顺序逐帧读取一个分段, 产出 (时间戳, BGR 图像)"""
+        import cv2
+        import numpy as np
+
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(cls.HEADER.size)
+                if len(header) < cls.HEADER.size:
+                    return
+                timestamp, length = cls.HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:  # 写到一半的记录
+                    return
+                yield timestamp, cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def frames(self):
+        for path in self.segments():
+            yield from self.read(path)
+
+
+class Screentaker:
+    """
+    backend: 截图使用的后端, 默认为 DesktopBackend
+    directory: PNG 保存目录, 为 None 时不保存 PNG
+    threshold / pixel_threshold: 缩略图中灰度差超过 pixel_threshold 的像素
+        比例超过 threshold 时视为画面变化, 与 ScreenWatcher 相同
+    workers: 编码线程数
+    archive: FrameArchive, 每个保存的画面同时追加到归档中
+    max_files / max_bytes / max_age: PNG 目录的清理限制
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        directory="screenshot",
+        interval=5.0,
+        threshold=0.001,
+        pixel_threshold=10,
+        thumb_size=(320, 180),
+        workers=2,
+        archive=None,
+        max_files=None,
+        max_bytes=None,
+        max_age=None,
+    ):
+        self.backend = backend if backend is not None else DesktopBackend()
+        self.directory = directory
+        self.interval = interval
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.thumb_size = thumb_size
+        self.archive = archive
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.saved = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="screentaker")
+        self._last_thumb = None
+        self._prune_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def thumbnail(self, image):
+        import cv2
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA)
+
+    def changed(self, thumb):
+        """和上一次保存的画面比较, 返回是否发生了变化"""
+        if self._last_thumb is None or self._last_thumb.shape != thumb.shape:
+            return True
+        import cv2
+        import numpy as np
+
+        diff = cv2.absdiff(thumb, self._last_thumb)
+        ratio = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+        return ratio > self.threshold
+
+    def capture(self):
+        return self.backend.grab()
+
+    def _write(self, image, name, timestamp):
+        import cv2
+
+        path = None
+        if self.directory:
+            path = os.path.join(self.directory, name)
+            ok, data = cv2.imencode(".png", image)
+            if not ok:
+                raise ValueError(f"编码截图失败: {name}")
+            with open(path, "wb") as f:
+                f.write(data.tobytes())
+            with self._prune_lock:
+                prune_files(
+                    glob.glob(os.path.join(self.directory, "*.png")),
+                    self.max_files,
+                    self.max_bytes,
+                    self.max_age,
+                )
+        if self.archive is not None:
+            self.archive.append(image, timestamp)
+        return path
+
+    def save(self, image, reason="screenshot", thumb=None):
+        """
+        在后台保存一帧画面, 返回 Future, 结果为 PNG 文件路径
+        """
+        timestamp = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp))
+        self._last_thumb = self.thumbnail(image) if thumb is None else thumb
+        self.saved += 1
+        # 同一毫秒内可能保存多张, 加上序号避免文件名重复
+        name = f"{reason}_{stamp}-{int(timestamp * 1000) % 1000:03d}-{self.saved}.png"
+        future = self._executor.submit(self._write, image, name, timestamp)
+        future.add_done_callback(self._report)
+        return future
+
+    @staticmethod
+    def _report(future):
+        error = future.exception()
+        if error is not None:
+            logging.error(f"保存截图失败: {error}")
+
+    def poll(self):
+        """截一帧, 画面有变化时保存, 返回 Future; 没有变化时返回 None"""
+        image = self.capture()
+        thumb = self.thumbnail(image)
+        if not self.changed(thumb):
+            return None
+        return self.save(image, thumb=thumb)
+
+    def snapshot(self, image=None, reason="snapshot"):
+        """不管画面是否变化都保存, 用于出错时留下现场"""
+        if image is None:
+            image = self.capture()
+        return self.save(image, reason)
+
+    def run(self, should_stop=lambda: False):
+        while not should_stop():
+            start = time.monotonic()
+            self.poll()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+
+    def close(self):
+        """等待所有截图写完"""
+        self._executor.shutdown(wait=True)
 
 
-def take_screenshot():
-    screenshot_dir = "screenshot"
-    if not os.path.exists(screenshot_dir):
-        os.makedirs(screenshot_dir)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="画面变化时保存截图")
+    parser.add_argument("--directory", default="screenshot")
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--threshold", type=float, default=0.001)
+    parser.add_argument("--max-files", type=int)
+    parser.add_argument("--max-bytes", type=int, help="PNG 目录的总大小上限 (MB)")
+    parser.add_argument("--max-age", type=float, help="PNG 保存的小时数")
+    parser.add_argument("--archive", help="帧归档目录, 保存缩小后的画面")
+    parser.add_argument("--archive-scale", type=float, default=0.25)
+    parser.add_argument("--archive-max-bytes", type=int, help="帧归档的总大小上限 (MB)")
+    parser.add_argument("--archive-max-age", type=float, help="帧归档保存的小时数")
+    parser.add_argument("--no-png", action="store_true", help="只写帧归档")
+    args = parser.parse_args(argv)
 
-    while True:
-        screenshot = ImageGrab.grab()
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        screenshot.save(os.path.join(screenshot_dir, f"screenshot_{timestamp}.png"))
-        time.sleep(5)
+    mb = 1024 * 1024
+    archive = None
+    if args.archive:
+        archive = FrameArchive(
+            args.archive,
+            scale=args.archive_scale,
+            max_bytes=args.archive_max_bytes * mb if args.archive_max_bytes else None,
+            max_age=args.archive_max_age * 3600 if args.archive_max_age else None,
+        )
+    screentaker = Screentaker(
+        directory=None if args.no_png else args.directory,
+        interval=args.interval,
+        threshold=args.threshold,
+        archive=archive,
+        max_files=args.max_files,
+        max_bytes=args.max_bytes * mb if args.max_bytes else None,
+        max_age=args.max_age * 3600 if args.max_age else None,
+    )
+    try:
+        screentaker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        screentaker.close()
 
 
 if __name__ == "__main__":
-    take_screenshot()
+    main()
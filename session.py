@@ -0,0 +1,334 @@
+# language: python
+"""
+会话录制和离线回放。
+
+录制: 给 GameBot 传入 recorder=SessionRecorder(目录), 每次截图、每次检测的
+结果和每个输入事件都会带着时间戳写进会话目录:
+- frames.bin: 无损 PNG 编码的画面, 依次追加; 与上一帧相同的画面只记一条引用
+- index.bin:  每帧一条定长记录 (时间戳, 在 frames.bin 中的偏移, 长度)
+- events.jsonl: 检测结果和输入事件
+
+回放: SessionArchive 用内存映射读取会话, 不需要把画面全部读进内存。
+replay_backend() 把会话变成一个按 (加速后的) 时间播放的模拟后端, 可以让
+GameBot、状态机和脚本在 Linux 上以几倍速重新跑一遍; replay_detections()
+用新的参数重新检测录下的每一帧, 并和当时的结果比较:
+
+    python session.py detect sessions/run1 --confidence 0.85
+    python session.py replay sessions/run1 level/6.3.it2 --speed 10
+"""
+import argparse
+import asyncio
+import bisect
+import contextlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from backends import SimulatedBackend
+from vision import Frame
+
+FRAMES_FILE = "frames.bin"
+INDEX_FILE = "index.bin"
+EVENTS_FILE = "events.jsonl"
+# 时间戳 (double), 偏移, 长度; 长度为 0 表示与上一帧相同
+INDEX_RECORD = struct.Struct("<dQI")
+
+
+def _match_to_json(match):
+    if match is None:
+        return None
+    return {"confidence": round(match.confidence, 4), "box": list(match.box)}
+
+
+class SessionRecorder:
+    """
+    directory: 会话目录, 不存在时创建; 已有的会话会被覆盖
+    clock: 时间戳使用的时钟, 记录的是相对录制开始的秒数
+
+    max_pending: 等待写入的画面数上限。写入线程跟不上截图速度时, 多出来的
+        画面不再排队 (每帧都持有一整张截图), 记为与上一帧相同, 并计入
+        session_frames_dropped_total
+
+    与上一帧的比较、编码和写文件都在一个后台线程中按顺序完成, 不会阻塞截图和检测。
+    """
+
+    def __init__(self, directory, clock=time.monotonic, max_pending=8):
+        self.directory = directory
+        self.clock = clock
+        self.start = clock()
+        os.makedirs(directory, exist_ok=True)
+        self._frames = open(os.path.join(directory, FRAMES_FILE), "wb")
+        self._index = open(os.path.join(directory, INDEX_FILE), "wb")
+        self._events = open(os.path.join(directory, EVENTS_FILE), "w", encoding="utf-8")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        self._lock = threading.Lock()
+        self._frame_ids = weakref.WeakKeyDictionary()
+        self._last_image = None
+        self._offset = 0
+        self.max_pending = max_pending
+        self._pending = 0
+        self.frames = 0
+        self.dropped = 0
+
+    def elapsed(self):
+        return self.clock() - self.start
+
+    def record_frame(self, frame):
+        """记录一帧画面, 返回帧序号"""
+        timestamp = self.elapsed()
+        with self._lock:
+            index = self.frames
+            self.frames += 1
+            self._frame_ids[frame] = index
+            if self._pending >= self.max_pending:
+                # 写入线程积压, 这一帧只记一条指向上一帧的引用
+                image = None
+                self.dropped += 1
+                metrics.inc("session_frames_dropped_total")
+            else:
+                image = frame.image
+                self._pending += 1
+            self._writer.submit(self._write_frame, timestamp, image)
+        return index
+
+    def _write_frame(self, timestamp, image):
+        """
+        在写入线程中执行: 和上一帧比较 (4K 整帧比较较慢), 相同或被丢弃的画面
+        只记一条引用
+        """
+        if image is None:
+            self._index.write(INDEX_RECORD.pack(timestamp, self._offset, 0))
+            return
+        try:
+            self._write_image(timestamp, image)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _write_image(self, timestamp, image):
+        import cv2
+        import numpy as np
+
+        same = self._last_image is not None and np.array_equal(self._last_image, image)
+        self._last_image = image
+        if same:
+            self._index.write(INDEX_RECORD.pack(timestamp, self._offset, 0))
+            return
+        ok, data = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError("画面编码失败")
+        self._frames.write(data)
+        self._index.write(INDEX_RECORD.pack(timestamp, self._offset, len(data)))
+        self._offset += len(data)
+
+    def frame_index(self, frame):
+        """frame 对应的帧序号, 没有记录过时返回 None"""
+        with self._lock:
+            return self._frame_ids.get(frame)
+
+    def _event(self, event):
+        event["t"] = round(self.elapsed(), 4)
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        self._writer.submit(self._events.write, line)
+
+    def record_detection(self, frame, results):
+        """记录一次检测的结果 {元素名: Match 或 None}"""
+        self._event(
+            {
+                "kind": "detect",
+                "frame": self.frame_index(frame),
+                "results": {name: _match_to_json(m) for name, m in results.items()},
+            }
+        )
+
+    def record_input(self, kind, args):
+        self._event({"kind": "input", "input": kind, "args": list(args)})
+
+    def flush(self):
+        """等待已提交的记录全部写入文件"""
+        self._writer.submit(lambda: None).result()
+        for f in (self._frames, self._index, self._events):
+            f.flush()
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        for f in (self._frames, self._index, self._events):
+            f.close()
+
+
+class SessionArchive:
+    """用内存映射读取录制好的会话"""
+
+    def __init__(self, directory):
+        import numpy as np
+
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE), "rb") as f:
+            data = f.read()
+        count = len(data) // INDEX_RECORD.size
+        records = np.frombuffer(
+            data[: count * INDEX_RECORD.size],
+            dtype=np.dtype([("t", "<f8"), ("offset", "<u8"), ("length", "<u4")]),
+        )
+        self.timestamps = records["t"].tolist()
+        self._records = records
+        self._file = open(os.path.join(directory, FRAMES_FILE), "rb")
+        self._data = b""
+        if os.fstat(self._file.fileno()).st_size:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._cache = (None, None)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def duration(self):
+        return self.timestamps[-1] if self.timestamps else 0.0
+
+    def frame(self, index):
+        """第 index 帧的 BGR 画面"""
+        import cv2
+        import numpy as np
+
+        # 相同的画面只记了一条引用, 往前找到实际存储的那一帧
+        while index > 0 and self._records[index]["length"] == 0:
+            index -= 1
+        if self._cache[0] == index:
+            return self._cache[1]
+        record = self._records[index]
+        offset, length = int(record["offset"]), int(record["length"])
+        if length == 0:
+            raise ValueError(f"会话中没有画面: {self.directory}")
+        buffer = np.frombuffer(self._data, np.uint8, count=length, offset=offset)
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        self._cache = (index, image)
+        return image
+
+    def frame_at(self, t):
+        """时间 t 时屏幕上的画面, 即 t 之前最后一次截图"""
+        index = max(0, bisect.bisect_right(self.timestamps, t) - 1)
+        return self.frame(index)
+
+    def events(self, kind=None):
+        with open(os.path.join(self.directory, EVENTS_FILE), encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                if kind is None or event["kind"] == kind:
+                    yield event
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+def replay_backend(archive, speed=1.0):
+    """
+    按录制时的时间顺序播放画面的模拟后端, speed 为播放倍速。
+    输入事件记录在 backend.events 中。
+    """
+    start = time.monotonic()
+    height, width = archive.frame(0).shape[:2]
+    backend = SimulatedBackend(
+        archive.frame_at,
+        window=(0, 0, width, height),
+        clock=lambda: start + (time.monotonic() - start) * speed,
+    )
+    backend.finished = lambda: backend.elapsed() > archive.duration
+    return backend
+
+
+def replay_detections(archive, game, elements=None, confidence=0.9):
+    """
+    用 game 的模板和参数重新检测录下的每一次检测, 返回
+    [(帧序号, 元素名, 当时的结果, 这次的结果)], 只包含结果不一致的元素
+    """
+    differences = []
+    for event in archive.events("detect"):
+        if event["frame"] is None:
+            continue
+        recorded = event["results"]
+        names = elements or list(recorded)
+        index = event["frame"]
+        frame = Frame(archive.frame(index), timestamp=archive.timestamps[index])
+        replayed = game.match_frame(frame, names, confidence)
+        for name in names:
+            old, new = recorded.get(name), _match_to_json(replayed[name])
+            if (old is None) != (new is None) or (old and old["box"] != new["box"]):
+                differences.append((index, name, old, new))
+    return differences
+
+
+async def replay_session(archive, runner, speed=10.0):
+    """
+    让 runner (StageRunner) 以 speed 倍速跑完整个会话, 返回回放后端。
+    脚本时间轴和输入节奏按同样的倍速缩短。
+    """
+    backend = runner.game.backend
+    runner.speed = speed
+    runner.game.input.profiles = {
+        name: delay / speed for name, delay in runner.game.input.profiles.items()
+    }
+    task = asyncio.create_task(runner.main())
+    try:
+        while not backend.finished() and not task.done():
+            await asyncio.sleep(0.05)
+        if task.done():
+            task.result()  # 出错时抛出异常
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    return backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放录制的会话")
+    sub = parser.add_subparsers(dest="command", required=True)
+    detect = sub.add_parser("detect", help="重新检测每一帧并与录制的结果比较")
+    detect.add_argument("session")
+    detect.add_argument("--elements", default="elements")
+    detect.add_argument("--confidence", type=float, default=0.9)
+    detect.add_argument("--pyramid", type=int, default=0, help="用金字塔查找重新检测")
+    replay = sub.add_parser("replay", help="让状态机和脚本在录制的画面上重新运行")
+    replay.add_argument("session")
+    replay.add_argument("script")
+    replay.add_argument("--elements", default="elements")
+    replay.add_argument("--speed", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    from common import GameBot
+    from log_pipeline import setup_logging
+
+    setup_logging()
+
+    archive = SessionArchive(args.session)
+    if args.command == "detect":
+        game = GameBot(
+            "Infinitode 2", args.elements, backend=SimulatedBackend(), pyramid=args.pyramid
+        )
+        differences = replay_detections(archive, game, confidence=args.confidence)
+        for index, name, old, new in differences:
+            print(f"第 {index} 帧 {name}: {old} -> {new}")
+        print(f"共 {len(differences)} 处不一致")
+        return 1 if differences else 0
+
+    from stagerunner import StageRunner
+
+    backend = replay_backend(archive, args.speed)
+    game = GameBot("Infinitode 2", args.elements, backend=backend)
+    runner = StageRunner(game, args.script)
+    asyncio.run(replay_session(archive, runner, args.speed))
+    for event in backend.events:
+        print(f"{event.timestamp:10.2f} {event.kind} {event.args}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
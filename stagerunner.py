@@ -1,27 +1,33 @@
-import pydirectinput as di
 from common import (
     logging,
     GameBot,
 )
+import argparse
 import asyncio
-from console_monitor import ConsoleMonitor
-from transitions.extensions.asyncio import AsyncMachine as Machine
+import contextvars
+import functools
+import math
+import os
+from typing import NamedTuple
+from board import Board
+from checkpoints import CheckpointStore
+from console_monitor import shared_monitor
+from log_pipeline import setup_logging
+from level_script import BLOCK_OPS, ScriptError, bind, compile_script, parse_line
+from timeline import Timeline
+import metrics
+from metrics import MetricsExporter
+from screentaker import Screentaker
+from session import SessionRecorder
+from watcher import ScreenWatcher
 import time
 import threading
 
 BUY_SKILL = (454, 349)
 BUY_SKILL_YES = (1474, 724)
 ALL_SKILL_PURCHASED_OK = (1738, 701)
-# 棋盘参数
-cellsize = 0
-boardcenter = (0, 0)
-
-
-game = GameBot("Infinitode 2", elements_path="elements/1080")
-machine = None
-
-status_monitor = ConsoleMonitor(max_status=20)
-status_monitor.start(refresh_interval=0.1)
+# 触发状态机的游戏元素, 元素名即状态机的 trigger 名
+GAME_ELEMENTS = ["restart", "startgame", "prepare_towers"]
 
 
 class GameStateMachine:
@@ -34,13 +40,17 @@ class GameStateMachine:
     ]
     run_task = None
 
-    def __init__(self, script_file):
+    def __init__(self, runner):
+        # transitions 在创建状态机时才导入, 导入本模块不需要加载它
+        from transitions.extensions.asyncio import AsyncMachine as Machine
+
         # 初始化状态机
         self.machine = Machine(
             model=self,
             states=self.states,
             initial="START_GAME_SCREEN",  # 初始状态
             auto_transitions=False,  # 关闭自动状态转换
+            after_state_change="record_transition",
         )
 
         # 定义状态转换规则（从 A 状态可跳转到 B 状态）
@@ -67,9 +77,20 @@ class GameStateMachine:
             after="on_enter_run_script_finished",
         )
 
-        self.script_file = script_file
+        self.runner = runner
         self._is_game_running = False
 
+    @property
+    def game(self):
+        return self.runner.game
+
+    @property
+    def monitor(self):
+        return self.runner.monitor
+
+    def record_transition(self):
+        metrics.inc("state_transitions_total", state=self.state)
+
     def is_not_preparing_towers(self):
         return not self._is_game_running
 
@@ -78,213 +99,550 @@ class GameStateMachine:
 
     async def on_enter_restart(self):
         logging.info("游戏结束，准备重新开始")
-        status_monitor.update_status("游戏结束，准备重新开始", color="yellow")
+        self.monitor.update_status("游戏结束，准备重新开始", color="yellow")
         self.cancel_botting_task()
-        await game.click_element("restart")
+        await self.game.click_element("restart")
 
     async def on_enter_startgame(self):
         self.cancel_botting_task()
         await asyncio.sleep(2)
-        await game.click(*BUY_SKILL)
-        await game.click(*BUY_SKILL_YES)
+        await self.game.click(*BUY_SKILL)
+        await self.game.click(*BUY_SKILL_YES)
         # 如果所有技能都买了, 会弹出一个对话框，点击确定
-        if await game.element_exists("all_abi_purchased"):
-            await game.click(*ALL_SKILL_PURCHASED_OK)
-        await game.click_element("startgame")
+        if await self.game.element_exists("all_abi_purchased"):
+            await self.game.click(*ALL_SKILL_PURCHASED_OK)
+        await self.game.click_element("startgame")
 
     async def on_enter_prepare_towers(self):
         self.cancel_botting_task()
         logging.info("准备防御塔")
-        status_monitor.update_status("准备防御塔", color="yellow")
+        self.monitor.update_status("准备防御塔", color="yellow")
         # 开始游戏
         self._is_game_running = True
 
-        self.run_task = asyncio.create_task(run(self.script_file))
+        self.run_task = asyncio.create_task(self.runner.run())
         logging.info("游戏已开始")
 
     async def on_enter_quitbot(self):
         self.cancel_botting_task()
         logging.info("退出bot")
-        status_monitor.update_status("退出bot", color="yellow")
+        self.monitor.update_status("退出bot", color="yellow")
 
     def cancel_botting_task(self):
         if self.run_task:
             self.run_task.cancel()
+            # 丢弃脚本任务已经提交但还没执行的输入, 并行轨道同时停止
+            self.game.input.cancel_pending(owner=self.run_task)
+            self.runner.stop_tracks()
             self._is_game_running = False
             try:
                 self.run_task.result()
             except (asyncio.CancelledError, asyncio.InvalidStateError) as e:
                 logging.info(f"任务取消或无效状态错误: {e}")
-                status_monitor.update_status("当前任务已取消", color="yellow")
-
-
-async def process_command(command_line: str):
+                self.monitor.update_status("当前任务已取消", color="yellow")
+
+
+# 指令名到 StageRunner 处理方法的映射
+HANDLERS = {
+    "comment": "handle_comment",
+    "sleep": "handle_sleep",
+    "at": "handle_at",
+    "leftclick": "handle_leftclick",
+    "cellsize": "handle_cellsize",
+    "boardcenter": "handle_boardcenter",
+    "move": "handle_move",
+    "hotkey": "handle_hotkey",
+    "key": "handle_keypress",
+    "checkpoint": "handle_checkpoint",
+    "waitfor": "handle_waitfor",
+    "until": "handle_until",
+    "track": "handle_track",
+    "every": "handle_every",
+    "stop": "handle_stop",
+}
+# 从检查点继续时需要重新执行的指令, 它们只改变脚本状态, 不产生输入
+STATE_OPS = ("cellsize", "boardcenter")
+# 产生输入的指令, 执行时独占输入通道
+INPUT_OPS = ("leftclick", "move", "hotkey", "key")
+
+
+class Track(NamedTuple):
+    """脚本的一个并行轨道, 主脚本本身是名为 main 的轨道"""
+
+    name: str
+    timeline: Timeline
+    priority: int = 0
+
+
+# 当前任务所在的轨道; 每个轨道是一个单独的 asyncio 任务, 互不影响
+_current_track = contextvars.ContextVar("current_track", default=None)
+
+
+class StageRunner:
     """
-    解析按键字符串并执行按键输入：
-    - "ctrl-r"、"alt-f4" 形式的组合键
-    - "a"、"enter" 形式的单键ee
-    - "sleep 3" 让程序暂停 3 秒
-    - repeat 参数指定按键的重复次数
-    - "cellsize 90" 设置单元格大小
-    - "boardcenter 1920 1010" 设置棋盘中心
-    - "move 1 2" 移动到指定单元格
-
-    :param command: 按键字符串，例如 "ctrl-r", "alt-f4", "a", "enter", "sleep 3"
-    :param repeat: 按键重复次数（仅对按键有效），默认为 1
+    一个游戏实例: GameBot、状态机、棋盘参数和脚本时间轴都属于实例,
+    同一进程中可以同时运行多个, 见 supervisor.Supervisor。
+
+    game: GameBot
+    script_file: 关卡脚本
+    monitor: ConsoleMonitor, 或 ConsoleMonitor.view() 返回的实例分区
+    checkpoints: CheckpointStore, 记录每个关卡最后完成的检查点
+    resume: 为 True 时每局从最后完成的检查点继续, 而不是从第一行开始
+    speed: 脚本时间轴的倍速, 回放录制的会话时大于 1
     """
 
-    parts = command_line.split()
-    command = parts[0]
-
-    if command.startswith("#"):  # 忽略注释行
-        status_monitor.update_status(f"{command_line[1:].lstrip()}", color="green")
-        return
-    status_monitor.update_status(f"执行命令: {command_line}", color="white")
-    logging.info(f'执行命令: "{command_line}"')
-
-    command_map = {
-        "sleep": handle_sleep,
-        "leftclick": handle_leftclick,
-        "cellsize": handle_cellsize,
-        "boardcenter": handle_boardcenter,
-        "move": handle_move,
-    }
-
-    if command in command_map:
-        await command_map[command](parts)
-    else:
-        await handle_keypress(parts)
-
-
-async def handle_sleep(parts):
-    try:
-        sleep_time = float(parts[1])
-        logging.info(f"🕒 暂停 {sleep_time} 秒...")
-        status_monitor.set_countdown_time(sleep_time)
-        for i in range(int(sleep_time), 0, -1):
-            await asyncio.sleep(1)
-
-    except ValueError:
-        logging.error("⚠️ 错误: sleep 后必须跟一个有效的数字！")
-
-
-async def handle_leftclick(parts):
-    await game.click(int(parts[1]), int(parts[2]))
-
-
-async def handle_cellsize(parts):
-    global cellsize
-    cellsize = int(parts[1])
-
+    def __init__(
+        self,
+        game,
+        script_file=None,
+        monitor=None,
+        elements=GAME_ELEMENTS,
+        checkpoints=None,
+        resume=False,
+        speed=1.0,
+    ):
+        self.game = game
+        self.script_file = script_file
+        self.monitor = monitor if monitor is not None else shared_monitor()
+        self.elements = list(elements)
+        self.checkpoints = checkpoints if checkpoints is not None else CheckpointStore()
+        self.resume = resume
+        self.speed = speed
+        # 最近一次编译成功的脚本
+        self.script = None
+        # 棋盘参数
+        self.cellsize = 0
+        self.boardcenter = (0, 0)
+        self._board = None
+        # 当前脚本的时间轴, 由 run 创建
+        self.timeline = None
+        # 正在运行的并行轨道 {名字: asyncio 任务}, 以及其中的 every 轨道
+        self.tracks = {}
+        self._repeating = set()
+        self.machine = GameStateMachine(self)
+        self.handlers = {op: getattr(self, name) for op, name in HANDLERS.items()}
+
+    @property
+    def board(self):
+        """
+        当前棋盘参数对应的 Board, cellsize、boardcenter 或窗口大小变化时重新建立。
+        棋盘参数是设计坐标, 所以窗口大小也换算成设计坐标, 点击时再由 GameBot 缩放
+        """
+        window, scale = self.game.window, self.game.scale
+        size = (round(window.width / scale), round(window.height / scale))
+        board = self._board
+        if (
+            board is None
+            or board.cellsize != self.cellsize
+            or tuple(board.center) != tuple(self.boardcenter)
+            or board.window != size
+        ):
+            board = self._board = Board(self.cellsize, self.boardcenter, size)
+        return board
+
+    async def execute(self, instruction, step=None):
+        """执行一条已编译的指令, step 为预先绑定好的处理函数"""
+        if step is None:
+            step = functools.partial(self.handlers[instruction.op], *instruction.args)
+        if instruction.op != "comment":
+            self.monitor.update_status(f"执行命令: {instruction.text}", color="white")
+            logging.info(f'执行命令: "{instruction.text}"')
+            if self.timeline is not None:
+                self.monitor.update_info(
+                    "脚本时间",
+                    f"{self.timeline.now():.1f}s, 第 {instruction.lineno} 行, "
+                    f"落后计划 {self.timeline.lateness():.2f}s",
+                )
+        with metrics.timer("script_command_seconds", command=instruction.op):
+            if instruction.op in INPUT_OPS:
+                async with self.game.exclusive(self._priority()):
+                    await step()
+            else:
+                await step()
+
+    async def _run_steps(self, steps):
+        """
+        依次执行已绑定的指令。连续的输入命令作为一组独占输入通道,
+        其他轨道的输入不会插在中间 (例如选中塔和升级之间)
+        """
+        holding = False
+        try:
+            for instruction, step in steps:
+                if instruction.op in INPUT_OPS and not holding:
+                    await self.game.input.acquire(self._priority(), self.game.title)
+                    holding = True
+                elif instruction.op not in INPUT_OPS and holding:
+                    self.game.input.release()
+                    holding = False
+                await self.execute(instruction, step)
+                await asyncio.sleep(0)  # 出控制权以便其他任务运行
+        finally:
+            if holding:
+                self.game.input.release()
+
+    async def process_command(self, command_line: str):
+        """
+        解析并执行一行脚本命令, 支持的命令见 level_script
+        """
+        instruction = parse_line(command_line)
+        if instruction is not None and instruction.op in BLOCK_OPS:
+            raise ScriptError("块只能在脚本文件中使用", text=command_line)
+        if instruction is not None:
+            await self.execute(instruction)
+
+    async def handle_comment(self, text):
+        self.monitor.update_status(text, color="green")
+
+    def _timeline(self):
+        track = _current_track.get()
+        if track is not None:
+            return track.timeline
+        # 不在 run 中单独执行命令时, 用一个从现在开始的时间轴
+        return self.timeline if self.timeline is not None else Timeline(speed=self.speed)
+
+    @staticmethod
+    def _priority():
+        track = _current_track.get()
+        return track.priority if track is not None else 0
+
+    @staticmethod
+    def _report_lateness(late):
+        if late > 1:
+            logging.warning(f"⚠️ 脚本落后计划 {late:.2f} 秒")
+
+    async def handle_sleep(self, sleep_time):
+        current = self._timeline()
+        remaining = current.remaining(sleep_time)
+        logging.info(f"🕒 暂停 {sleep_time} 秒 (实际等待 {remaining:.2f} 秒)...")
+        self.monitor.set_countdown_time(remaining)
+        self._report_lateness(await current.sleep(sleep_time))
+
+    async def handle_at(self, seconds, instruction):
+        current = self._timeline()
+        self.monitor.set_countdown_time(max(0.0, seconds - current.now()))
+        self._report_lateness(await current.wait_until(seconds))
+        if instruction is not None:
+            await self.execute(instruction)
+
+    async def _condition_met(self, frame, condition):
+        if condition.kind == "pixel":
+            x, y, rgb, tolerance = condition.args
+            x, y = self.game.to_window(x, y)
+            x, y = x - frame.left, y - frame.top
+            if not (0 <= x < frame.width and 0 <= y < frame.height):
+                met = False
+            else:
+                b, g, r = (int(v) for v in frame.image[y, x])
+                met = all(abs(a - e) <= tolerance for a, e in zip((r, g, b), rgb))
+        else:
+            element = condition.args[0]
+            found = await self.game.offload(self.game.match_frame, frame, [element])
+            met = found[element] is not None
+        return met != condition.negate
+
+    async def _poll_condition(self, condition):
+        """
+        在 bot 的共享画面流上检查条件, 直到条件成立。只看开始等待之后
+        截到的画面, 之前的画面可能早于刚刚发出的输入
+        """
+        seq = self.game.frames.seq
+        while True:
+            seq, frame = await self.game.frames.next(seq)
+            if await self._condition_met(frame, condition):
+                return
+
+    async def _wait_condition(self, condition, deadline, fallback):
+        current = self._timeline()
+        start = current.now()
+        self.monitor.set_countdown_time(max(0.0, deadline - start))
+        met = await current.wait_for(self._poll_condition(condition), deadline)
+        waited = current.now() - start
+        metrics.observe(
+            "script_wait_seconds", waited, result="met" if met else "timeout"
+        )
+        if met:
+            logging.info(f"条件成立: {condition}, 等待了 {waited:.1f} 秒")
+            self.monitor.set_countdown_time(0)
+            return
+        logging.warning(f"⚠️ 等待条件超时: {condition}")
+        if fallback is not None:
+            await self.execute(fallback)
 
-async def handle_boardcenter(parts):
-    global boardcenter
-    boardcenter = (int(parts[1]), int(parts[2]))
+    async def handle_waitfor(self, condition, timeout, fallback):
+        await self._wait_condition(
+            condition, self._timeline().cursor + timeout, fallback
+        )
 
+    async def handle_until(self, condition, deadline, fallback):
+        await self._wait_condition(condition, deadline, fallback)
 
-async def handle_move(parts):
-    x = int(parts[1])
-    y = int(parts[2])
-    await game.click(boardcenter[0] + x * cellsize, boardcenter[1] + y * cellsize)
+    async def handle_leftclick(self, x, y):
+        await self.game.click(x, y)
 
+    async def handle_cellsize(self, size):
+        self.cellsize = size
+        self._board = None
 
-async def handle_keypress(parts):
-    command = parts[0]
-    repeat = int(parts[1]) if len(parts) > 1 else 1
-    if "-" in command:  # 处理组合键
-        keys = command.split("-")
-        modifier_keys = [key for key in keys if key in ["ctrl", "alt", "shift"]]
-        main_key = next((key for key in keys if key not in modifier_keys), None)
+    async def handle_boardcenter(self, x, y):
+        self.boardcenter = (x, y)
+        self._board = None
 
-        if not main_key:
-            logging.info("⚠️ 错误: 组合键中必须包含一个主键！")
+    async def handle_move(self, x, y):
+        try:
+            point = self.board.to_window(x, y)
+        except ValueError as e:
+            logging.error(f"move {x} {y} 被忽略: {e}")
             return
+        await self.game.click(point.x, point.y, profile="board")
 
+    async def handle_hotkey(self, modifier_keys, main_key, repeat):
         for _ in range(repeat):
             for mod in modifier_keys:
-                di.keyDown(mod)  # 按住修饰键
+                await self.game.key_down(mod)  # 按住修饰键
 
-            di.press(main_key)  # 按下主键
+            await self.game.press(main_key)  # 按下主键
 
             for mod in modifier_keys:
-                di.keyUp(mod)  # 释放修饰键
-    else:
+                await self.game.key_up(mod)  # 释放修饰键
+
+    async def handle_keypress(self, key, repeat):
         for _ in range(repeat):  # 处理单个按键
-            di.keyDown(command)
-            await asyncio.sleep(0.05)
-            di.keyUp(command)
-
-
-async def run(filename):
-    logging.info(f"运行脚本: {filename}")
-    start_time = time.time()
-    running = True  # 添加运行状态标志
-
-    # 创建更新运行时间的线程
-    def update_runtime():
-        while running:  # 使用运行状态标志控制线程
-            runtime = int(time.time() - start_time)
-            hours = runtime // 3600
-            minutes = (runtime % 3600) // 60
-            seconds = runtime % 60
-            status_monitor.update_info(
-                "本局运行时间", f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            )
-            time.sleep(1)
-
-    runtime_thread = threading.Thread(target=update_runtime, daemon=True)
-    runtime_thread.start()
-
-    with open(filename, "r", encoding="utf-8") as file:
-        for line in file:
-            if line.strip() == "":  # 忽略注释行和空行
-                continue
-            command = line.strip()
-
-            await process_command(command)
-            await asyncio.sleep(0)  # 出控制权以便其他任务运行
-    await machine.run_script_finished()
-    running = False
-
-
-async def find_elements(elements):
-    """
-    并发查找多个元素是否存在, 返回一个字典
-    """
-    start_time = time.time()
-    elements_found = await asyncio.gather(
-        *[game.element_exists(element) for element in elements]
+            await self.game.key_down(key, profile="keyhold")  # 保持 0.05 秒后松开
+            await self.game.key_up(key)
+
+    def _start_track(self, name, priority, play):
+        """在一个新任务中运行轨道, 同名的轨道正在运行时先停止它"""
+        self.stop_tracks(name)
+
+        async def run_track():
+            _current_track.set(Track(name, Timeline(speed=self.speed), priority))
+            logging.info(f"启动轨道 {name}")
+            await play()
+
+        task = asyncio.create_task(run_track(), name=f"{self.game.name}:{name}")
+        task.add_done_callback(functools.partial(self._track_done, name))
+        self.tracks[name] = task
+
+    def _track_done(self, name, task):
+        if self.tracks.get(name) is task:
+            del self.tracks[name]
+            self._repeating.discard(name)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"轨道 {name} 出错: {task.exception()!r}")
+
+    def stop_tracks(self, name=None):
+        """停止一个或全部并行轨道, 并丢弃它们还没执行的输入"""
+        names = list(self.tracks) if name is None else [name]
+        for track_name in names:
+            task = self.tracks.pop(track_name, None)
+            self._repeating.discard(track_name)
+            if task is not None and not task.done():
+                task.cancel()
+                self.game.input.cancel_pending(owner=task)
+                logging.info(f"停止轨道 {track_name}")
+
+    async def handle_track(self, name, priority, body):
+        steps = bind(body, self.handlers)
+        self._start_track(name, priority, functools.partial(self._run_steps, steps))
+
+    async def handle_every(self, interval, name, priority, body):
+        steps = bind(body, self.handlers)
+
+        async def repeat():
+            timeline = _current_track.get().timeline
+            next_run = 0.0
+            while True:
+                self._report_lateness(await timeline.wait_until(next_run))
+                await self._run_steps(steps)
+                next_run += interval
+                if timeline.now() > next_run:
+                    # 执行一遍超过了间隔, 跳过错过的轮次
+                    logging.warning(f"⚠️ 轨道 {name} 执行一遍超过了 {interval:g} 秒")
+                    next_run = math.ceil(timeline.now() / interval) * interval
+
+        self._start_track(name, priority, repeat)
+        self._repeating.add(name)
+
+    async def handle_stop(self, name):
+        self.stop_tracks(name)
+
+    async def handle_checkpoint(self, label):
+        script = self.script
+        if script is None or label not in script.checkpoints:
+            return
+        index, _ = script.checkpoints[label]
+        lineno = script.instructions[index].lineno
+        await asyncio.to_thread(
+            self.checkpoints.save, script.filename, label, lineno, script.digest
+        )
+        logging.info(f"到达检查点 {label} (第 {lineno} 行)")
+        self.monitor.update_info("检查点", label)
+
+    def load_script(self, filename=None):
+        """
+        从磁盘编译脚本。每局开始时都会重新加载, 修改脚本后不需要重启 bot;
+        修改后的脚本有错误时, 继续使用上一次编译成功的版本
+        """
+        filename = filename or self.script_file
+        try:
+            self.script = compile_script(filename)
+        except (ScriptError, OSError) as e:
+            if self.script is None or self.script.filename != filename:
+                raise
+            logging.error(f"脚本有错误, 继续使用上一次的版本: {e}")
+            self.monitor.update_status(f"脚本有错误: {e}", color="red")
+        return self.script
+
+    async def fast_forward(self, script):
+        """
+        恢复模式下跳到最后完成的检查点之后, 返回开始执行的指令序号。
+        检查点之前的 cellsize / boardcenter 会重新执行, every 轨道重新启动
+        (track 轨道不会), 时间轴定位到检查点的计划时间。
+        记录检查点之后脚本被修改过时从头开始运行。
+        """
+        record = self.checkpoints.load(script.filename)
+        if record is None:
+            return 0
+        label = record["label"]
+        if record.get("digest") and record["digest"] != script.digest:
+            logging.warning(f"脚本在检查点 {label} 之后被修改过, 从头开始运行")
+            return 0
+        if label not in script.checkpoints:
+            logging.warning(f"脚本中没有检查点 {label}, 从头开始运行")
+            return 0
+        index, planned = script.checkpoints[label]
+        for instruction in script.instructions[:index]:
+            if instruction.op in STATE_OPS + ("every", "stop"):
+                await self.handlers[instruction.op](*instruction.args)
+        self.timeline.seek(planned)
+        lineno = script.instructions[index].lineno
+        logging.info(f"从检查点 {label} 继续 (第 {lineno} 行, {planned:g} 秒)")
+        self.monitor.update_status(f"从检查点 {label} 继续", color="yellow")
+        return index + 1
+
+    async def run(self, filename=None, resume=None):
+        filename = filename or self.script_file
+        resume = self.resume if resume is None else resume
+        logging.info(f"运行脚本: {filename}")
+        start_time = time.time()
+        running = True  # 添加运行状态标志
+
+        # 创建更新运行时间的线程
+        def update_runtime():
+            while running:  # 使用运行状态标志控制线程
+                runtime = int(time.time() - start_time)
+                hours = runtime // 3600
+                minutes = (runtime % 3600) // 60
+                seconds = runtime % 60
+                self.monitor.update_info(
+                    "本局运行时间", f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+                )
+                time.sleep(1)
+
+        runtime_thread = threading.Thread(target=update_runtime, daemon=True)
+        runtime_thread.start()
+
+        script = self.load_script(filename)
+        self.timeline = Timeline(speed=self.speed)
+        token = _current_track.set(Track("main", self.timeline))
+        try:
+            start = await self.fast_forward(script) if resume else 0
+            await self._run_steps(script.bind(self.handlers)[start:])
+            # 等待还在运行的 track 轨道, every 轨道随主脚本结束
+            tracks = [
+                task for name, task in self.tracks.items() if name not in self._repeating
+            ]
+            await asyncio.gather(*tracks, return_exceptions=True)
+        finally:
+            running = False
+            self.stop_tracks()
+            _current_track.reset(token)
+        logging.info(f"脚本结束, 最大落后 {self.timeline.max_lateness:.2f} 秒")
+        # 整个脚本已经跑完, 下一局从头开始
+        await asyncio.to_thread(self.checkpoints.clear, script.filename)
+        await self.machine.run_script_finished()
+
+    async def find_elements(self, elements):
+        """
+        在同一帧画面中查找多个元素, 返回 {元素名: Match 或 None}
+        """
+        start_time = time.time()
+        result = await self.game.detect(elements)
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+        logging.debug(f"查找游戏元素耗时: {elapsed_time:.2f} 秒")
+
+        return result
+
+    async def main(self):
+        # 在开始之前编译脚本, 脚本有错误时立即报错
+        self.load_script()
+
+        await self.game.focus()
+        # 画面变化时才做完整检测, 检测到的元素立即作为事件推送给状态机
+        watcher = ScreenWatcher(self.game, self.elements)
+        # 出错时保存当时的画面
+        error_snapshots = Screentaker(
+            self.game.backend,
+            directory=os.path.join("screenshot", "errors", self.game.name),
+            max_files=50,
+        )
+        try:
+            async for elements_found in watcher.watch():
+                for method_name, exists in elements_found.items():
+                    if exists:
+                        logging.info(f"执行 machine.{method_name} 方法...")
+                        with metrics.timer("state_trigger_seconds", trigger=method_name):
+                            await self.machine.trigger(method_name)
+        except KeyboardInterrupt:
+            await self.machine.quitbot()
+            self.monitor.update_status("ConsoleMonitor 已停止")
+            shared_monitor().stop()
+        except Exception as e:
+            logging.exception(f"bot 出错: {e}")
+            error_snapshots.snapshot(reason=f"error_{self.machine.state}")
+            raise
+        finally:
+            error_snapshots.close()
+
+
+async def run_level(
+    script_file, resume=False, record=None, elements_path="elements", pyramid=0
+):
+    """record: 会话录制目录, 见 session.SessionRecorder"""
+    recorder = SessionRecorder(record) if record else None
+    game = GameBot(
+        "Infinitode 2", elements_path=elements_path, recorder=recorder, pyramid=pyramid
     )
-    result = dict(zip(elements, elements_found))
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    logging.debug(f"查找游戏元素耗时: {elapsed_time:.2f} 秒")
-
-    return result
-
-
-async def main(script_file):
-    game_elements = ["restart", "startgame", "prepare_towers"]
-    global machine
-    machine = GameStateMachine(script_file)
-
+    runner = StageRunner(game, script_file, resume=resume)
+    monitor = shared_monitor()
+    monitor.start(refresh_interval=0.1)
+    exporter = MetricsExporter(monitor=monitor)
+    exporter.start()
     try:
-        while True:
-            game.resize(1920, 1080)
-            game.activate()
-            elements_found = await find_elements(game_elements)
-
-            for method_name, exists in elements_found.items():
-                if exists:
-                    logging.info(f"执行 machine.{method_name} 方法...")
-                    await machine.trigger(method_name)
+        await runner.main()
+    finally:
+        exporter.stop()
+        if recorder is not None:
+            recorder.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="运行关卡脚本")
+    parser.add_argument("script", nargs="?", default="level/6.3.it2")
+    parser.add_argument("--elements", default="elements")
+    parser.add_argument("--resume", action="store_true", help="每局从最后完成的检查点继续")
+    parser.add_argument("--record", help="会话录制目录")
+    parser.add_argument(
+        "--pyramid", type=int, default=0, help="金字塔查找的级数, 0 表示完整查找"
+    )
+    args = parser.parse_args(argv)
 
-            await asyncio.sleep(5)
-    except KeyboardInterrupt:
-        await machine.quitbot()
-        status_monitor.update_status("ConsoleMonitor 已停止")
-        status_monitor.stop()
+    setup_logging()
+    asyncio.run(
+        run_level(args.script, args.resume, args.record, args.elements, args.pyramid)
+    )
 
 
 if __name__ == "__main__":
-    asyncio.run(main("level/6.3.it2"))
+    main()
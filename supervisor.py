@@ -0,0 +1,150 @@
+# language: python
+"""
+在一个进程中同时运行多个游戏实例。
+
+每个实例有自己的 GameBot、状态机和脚本状态, 所有实例共用一个
+WorkerPool 做截图和模板匹配, 看板上每个实例显示为一个分区。同一个后端
+(同一套鼠标键盘) 上的实例共用一个 InputDispatcher, 每组输入之前由它
+切换窗口焦点:
+
+    python supervisor.py "Infinitode 2 #1=level/6.3.it2" "Infinitode 2 #2=level/6.3.it2"
+"""
+import argparse
+import asyncio
+import os
+
+from backends import DesktopBackend
+from common import GameBot
+from console_monitor import shared_monitor
+from log_pipeline import setup_logging
+from input_dispatcher import InputDispatcher
+from match_engine import MatchEngine
+from metrics import MetricsExporter
+from session import SessionRecorder
+from stagerunner import StageRunner
+from worker_pool import WorkerPool
+
+
+class Supervisor:
+    """
+    monitor: 公共看板, 每个实例使用 monitor.view(name), 默认为 shared_monitor()
+    workers: 共用的截图和匹配线程数
+    engine: 所有实例共用的 MatchEngine, 为 None 时在 workers 线程中逐个匹配
+    """
+
+    def __init__(self, monitor=None, workers=2, engine=None):
+        self.monitor = monitor if monitor is not None else shared_monitor()
+        self.pool = WorkerPool(workers)
+        self.engine = engine
+        self.runners = {}
+        # 后端 -> 共用的输入调度器; 没有指定后端的实例共用同一个桌面后端
+        self.inputs = {}
+        self._desktop = None
+
+    def add(
+        self,
+        name,
+        title,
+        script_file,
+        elements_path="elements",
+        backend=None,
+        resume=False,
+        **options,
+    ):
+        """添加一个实例, options 传给 GameBot, 返回 StageRunner"""
+        if name in self.runners:
+            raise ValueError(f"实例名重复: {name}")
+        if backend is None:
+            if self._desktop is None:
+                self._desktop = DesktopBackend()
+            backend = self._desktop
+        if backend not in self.inputs:
+            self.inputs[backend] = InputDispatcher(backend)
+        game = GameBot(
+            title, elements_path, backend=backend, pool=self.pool, name=name,
+            engine=self.engine, dispatcher=self.inputs[backend], **options,
+        )  # fmt: skip
+        runner = StageRunner(
+            game, script_file, monitor=self.monitor.view(name), resume=resume
+        )
+        self.runners[name] = runner
+        return runner
+
+    async def run(self):
+        """运行所有实例, 任意一个实例出错时停止其他实例"""
+        tasks = [
+            asyncio.create_task(runner.main(), name=name)
+            for name, runner in self.runners.items()
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # 等实例的清理代码跑完再关闭它们共用的输入和线程池
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for dispatcher in self.inputs.values():
+                dispatcher.close()
+            self.pool.close()
+            if self.engine is not None:
+                self.engine.close()
+
+
+def parse_instance(spec):
+    """ "窗口标题=脚本文件" """
+    title, sep, script_file = spec.rpartition("=")
+    if not sep or not title:
+        raise argparse.ArgumentTypeError(f"格式应为 窗口标题=脚本文件: {spec!r}")
+    return title, script_file
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="同时运行多个游戏实例")
+    parser.add_argument("instances", nargs="+", type=parse_instance)
+    parser.add_argument("--elements", default="elements")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--match-mode", choices=("off", "thread", "process"), default="thread",
+        help="并行匹配引擎, off 表示在 workers 线程中逐个匹配",
+    )  # fmt: skip
+    parser.add_argument("--match-workers", type=int, help="匹配引擎的线程或进程数")
+    parser.add_argument("--resume", action="store_true", help="每局从最后完成的检查点继续")
+    parser.add_argument("--record", help="会话录制目录, 每个实例一个子目录")
+    parser.add_argument(
+        "--pyramid", type=int, default=0, help="金字塔查找的级数, 0 表示完整查找"
+    )
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    engine = None
+    if args.match_mode != "off":
+        engine = MatchEngine(args.match_workers, mode=args.match_mode)
+    supervisor = Supervisor(workers=args.workers, engine=engine)
+    recorders = []
+    for title, script_file in args.instances:
+        if args.record:
+            recorders.append(SessionRecorder(os.path.join(args.record, title)))
+        supervisor.add(
+            title, title, script_file, elements_path=args.elements, resume=args.resume,
+            recorder=recorders[-1] if args.record else None, pyramid=args.pyramid,
+        )  # fmt: skip
+    supervisor.monitor.start(refresh_interval=0.1)
+    exporter = MetricsExporter(monitor=supervisor.monitor)
+    exporter.start()
+    try:
+        await supervisor.run()
+    finally:
+        exporter.stop()
+        for recorder in recorders:
+            recorder.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# language: python
+"""
+预加载的模板库: 启动时把 elements 下的 png 一次性读入内存,
+之后所有匹配都直接使用内存中的数据, 不再读盘。
+
+elements_path 可以是单个分辨率目录 (如 elements/1080), 也可以是包含
+多个分辨率子目录的根目录 (elements)。每张模板都记录它的设计分辨率,
+匹配时按当前窗口高度缩放, 缩放结果按分辨率缓存。同名模板在多个目录中
+都存在时, 优先使用与窗口分辨率完全一致的那张, 否则用分辨率最高的那张缩放。
+"""
+import glob
+import logging
+import os
+import threading
+
+from vision import downscale
+
+# 分辨率目录名对应的设计高度
+RESOLUTION_HEIGHTS = {"720": 720, "1080": 1080, "1440": 1440, "4k": 2160}
+
+
+class Template:
+    """
+    一张解码后的模板图片, 以及金字塔查找用的缩小副本 pyramid:
+    pyramid[level] 为缩小 2**level 倍的模板 (pyramid[0] 为原图), 与画面
+    使用同一种缩小方法 (vision.downscale), 匹配时不用每次重新缩小模板
+    """
+
+    def __init__(self, name, bgr, path=None, pyramid_levels=2, base_height=1080):
+        self.name = name
+        self.path = path
+        self.bgr = bgr
+        self.base_height = base_height
+        self.height, self.width = bgr.shape[:2]
+        self.pyramid = tuple(downscale(bgr, level) for level in range(pyramid_levels + 1))
+        self._pyramid_levels = pyramid_levels
+
+    @classmethod
+    def from_file(cls, path, name=None, pyramid_levels=2, base_height=1080):
+        import cv2
+
+        bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise FileNotFoundError(f"无法读取模板: {path}")
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+        return cls(name, bgr, path, pyramid_levels, base_height)
+
+    def scaled(self, height):
+        """缩放到窗口高度为 height 时的大小"""
+        import cv2
+
+        if height == self.base_height:
+            return self
+        factor = height / self.base_height
+        size = (max(1, round(self.width * factor)), max(1, round(self.height * factor)))
+        interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC
+        bgr = cv2.resize(self.bgr, size, interpolation=interpolation)
+        return Template(self.name, bgr, self.path, self._pyramid_levels, height)
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def __repr__(self):
+        return f"Template({self.name!r}, {self.width}x{self.height}@{self.base_height})"
+
+
+class TemplateStore:
+    """
+    按名字索引的模板库。
+
+    - load(): 读取目录下所有 png
+    - get(name, height=None): 取出模板, 给出窗口高度时返回缩放后的模板;
+      不在内存中时从磁盘补读一次, 磁盘上也没有时记下来, 直到 load / reload
+      之前都直接报错, 不再读盘
+    - variants(name, height, scales): 多尺度查找用的一组缩放模板
+    - reload(name=None): 重新读取一个或全部模板
+    - evict(name=None): 从内存中移除一个或全部模板
+    """
+
+    def __init__(self, elements_path, pyramid_levels=2, base_height=None):
+        self.elements_path = elements_path
+        self.pyramid_levels = pyramid_levels
+        name = os.path.basename(os.path.normpath(elements_path))
+        self.base_height = base_height or RESOLUTION_HEIGHTS.get(name, 1080)
+        # {名字: {设计高度: Template}}
+        self._templates = {}
+        # {窗口高度: {名字: Template}}
+        self._scaled = {}
+        # 磁盘上找不到的模板, load / reload 时清除; 缺少的元素只查找一次磁盘
+        self._missing = set()
+        self._lock = threading.Lock()
+
+    def _source_dirs(self):
+        """返回 [(目录, 设计高度)], 根目录下的 png 使用 base_height"""
+        dirs = [(self.elements_path, self.base_height)]
+        for subdir, height in RESOLUTION_HEIGHTS.items():
+            path = os.path.join(self.elements_path, subdir)
+            if os.path.isdir(path):
+                dirs.append((path, height))
+        return dirs
+
+    def _read(self, name):
+        sources = {}
+        for directory, height in self._source_dirs():
+            path = os.path.join(directory, f"{name}.png")
+            if os.path.exists(path):
+                sources[height] = Template.from_file(
+                    path, name, self.pyramid_levels, height
+                )
+        if not sources:
+            raise FileNotFoundError(f"无法读取模板: {name} ({self.elements_path})")
+        return sources
+
+    def load(self):
+        templates = {}
+        for directory, height in self._source_dirs():
+            for path in sorted(glob.glob(os.path.join(directory, "*.png"))):
+                template = Template.from_file(
+                    path, pyramid_levels=self.pyramid_levels, base_height=height
+                )
+                templates.setdefault(template.name, {})[height] = template
+        with self._lock:
+            self._templates = templates
+            self._scaled.clear()
+            self._missing.clear()
+        logging.info(f"已加载 {len(templates)} 个模板: {self.elements_path}")
+        return self
+
+    def _sources(self, name):
+        sources = self._templates.get(name)
+        if sources is None:
+            if name in self._missing:
+                raise FileNotFoundError(f"无法读取模板: {name} ({self.elements_path})")
+            try:
+                sources = self._read(name)
+            except FileNotFoundError as e:
+                self._missing.add(name)
+                logging.error(e)
+                raise
+            self._templates[name] = sources
+            logging.debug(f"按需加载模板 {name}")
+        return sources
+
+    def get(self, name, height=None):
+        with self._lock:
+            sources = self._sources(name)
+            if height is None:
+                return sources[max(sources)]
+            if height in sources:
+                return sources[height]
+            scaled = self._scaled.setdefault(height, {})
+            template = scaled.get(name)
+            if template is None:
+                template = sources[max(sources)].scaled(height)
+                scaled[name] = template
+            return template
+
+    def variants(self, name, height, scales=(1.0,)):
+        """返回按 height * scale 缩放的一组模板, 用于窗口大小有偏差时的多尺度查找"""
+        return [self.get(name, round(height * scale)) for scale in scales]
+
+    def reload(self, name=None):
+        if name is None:
+            return self.load()
+        with self._lock:
+            self._missing.discard(name)
+        sources = self._read(name)
+        with self._lock:
+            self._templates[name] = sources
+            for scaled in self._scaled.values():
+                scaled.pop(name, None)
+        return self
+
+    def evict(self, name=None):
+        with self._lock:
+            if name is None:
+                self._templates.clear()
+                self._scaled.clear()
+                self._missing.clear()
+            else:
+                self._templates.pop(name, None)
+                self._missing.discard(name)
+                for scaled in self._scaled.values():
+                    scaled.pop(name, None)
+
+    def resolutions(self):
+        """已缓存的缩放分辨率"""
+        with self._lock:
+            return sorted(self._scaled)
+
+    def names(self):
+        with self._lock:
+            return list(self._templates)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._templates
+
+    def __len__(self):
+        with self._lock:
+            return len(self._templates)
@@ -0,0 +1,42 @@
+import argparse
+import unittest
+from unittest import mock
+
+import bench
+from bench import compare
+
+
+class TestCompare(unittest.TestCase):
+    def test_compare(self):
+        baseline = {
+            "tick.1080": {"value": 10.0, "unit": "ms"},
+            "dispatch.commands_per_sec": {"value": 100.0, "unit": "ops/s"},
+            "pyramid.4k.speedup": {"value": 20.0, "unit": "x"},
+        }
+        results = {
+            "pyramid.4k.speedup": {"value": 22.0, "unit": "x"},
+            "tick.1080": {"value": 12.0, "unit": "ms"},
+            "dispatch.commands_per_sec": {"value": 70.0, "unit": "ops/s"},
+            "tick.4k": {"value": 99.0, "unit": "ms"},
+        }
+        self.assertEqual(
+            compare(results, baseline, 0.25),
+            [("dispatch.commands_per_sec", 100.0, 70.0)],
+        )
+        self.assertEqual(len(compare(results, baseline, 0.1)), 2)
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_smoke(self):
+        # 只跑 1080 和一次重复, 确认基准测试还能调用它们依赖的接口
+        args = argparse.Namespace(repeat=1, frames=None, inventory=None)
+        with mock.patch.dict(bench.RESOLUTIONS, clear=True, values={"1080": (1920, 1080)}):
+            results = bench.run_benchmarks(["tick", "dispatch", "click"], args)
+        self.assertEqual(
+            sorted(results), ["click.1080", "dispatch.commands_per_sec", "tick.1080"]
+        )
+        self.assertTrue(all(r["value"] > 0 for r in results.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
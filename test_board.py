@@ -0,0 +1,24 @@
+import pytest
+
+from board import Board
+
+
+def test_to_window():
+    board = Board(90, (960, 540), (1920, 1080))
+    assert board.to_window(0, 0) == (960, 540)
+    assert board.to_window(1, 2) == (1050, 720)
+    assert board.to_window(-10, -6) == (60, 0)
+
+
+def test_outside_window():
+    board = Board(90, (960, 540), (1920, 1080))
+    assert not board.contains(11, 0)
+    assert not board.contains(0, -7)
+    assert not board.contains(1000, 0)
+    with pytest.raises(ValueError):
+        board.to_window(0, 7)
+
+
+def test_invalid_cellsize():
+    with pytest.raises(ValueError):
+        Board(0, (0, 0), (1920, 1080))
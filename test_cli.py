@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import types
+
+import cli
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_python(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def test_help_does_not_load_dependencies():
+    code = (
+        "import sys, cli\n"
+        "try:\n"
+        "    cli.main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(sorted({'cv2', 'numpy', 'rich', 'pyautogui'} & set(sys.modules)))\n"
+    )
+    assert run_python(code).endswith("[]")
+
+
+def test_import_has_no_side_effects():
+    code = (
+        "import logging, threading\n"
+        "import stagerunner, supervisor, merge_platforms, session\n"
+        "print(threading.active_count(), len(logging.getLogger().handlers))\n"
+    )
+    # 导入时不启动看板线程, 也不配置日志
+    assert run_python(code) == "1 0"
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys\n"
+        "import common, stagerunner, supervisor, bench, session, merge_platforms\n"
+        "print(sorted({'cv2', 'numpy', 'rich', 'transitions'} & set(sys.modules)))\n"
+    )
+    # 重的依赖在第一次使用时才导入
+    assert run_python(code) == "[]"
+
+
+def test_dispatch(monkeypatch):
+    calls = []
+    module = types.SimpleNamespace(main=lambda argv: calls.append(argv))
+    monkeypatch.setattr(cli.importlib, "import_module", lambda name: module)
+    assert cli.main(["run", "level/6.3.it2", "--resume"]) == 0
+    assert calls == [["level/6.3.it2", "--resume"]]
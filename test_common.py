@@ -1,12 +1,21 @@
+import asyncio
+import sys
 import unittest
 from common import resize_window
-import pygetwindow as gw
 import time
 from common import GameBot
+from backends import Scene, SimulatedBackend
+
+requires_window = unittest.skipUnless(
+    sys.platform == "win32", "需要运行中的 Infinitode 2 窗口"
+)
 
 
 class TestCommonFunctions(unittest.TestCase):
+    @requires_window
     def test_resize_window(self):
+        import pygetwindow as gw
+
         # 假设测试窗口的标题为 "Test Window"
         test_window_title = "Infinitode 2"
 
@@ -28,6 +37,7 @@ class TestCommonFunctions(unittest.TestCase):
         self.assertEqual(width, 1920)
         self.assertEqual(height, 1080)
 
+    @requires_window
     def test_click_in_window(self):
         window_title = "Infinitode 2"
 
@@ -40,9 +50,84 @@ class TestCommonFunctions(unittest.TestCase):
         points_to_click = [(100, 100), (200, 200), (300, 300)]
 
         for point in points_to_click:
-            controller.click(point[0], point[1])
+            asyncio.run(controller.click(point[0], point[1]))
             time.sleep(1)  # 等待一秒观察点击效果
 
 
+class TestGameBotSimulated(unittest.TestCase):
+    def setUp(self):
+        scene = Scene((1920, 1080))
+        scene.add("elements/1080/restart.png", 800, 500)
+        scene.add("elements/1080/startgame.png", 1200, 900)
+        self.backend = SimulatedBackend(scene, window=(100, 50, 1920, 1080))
+        self.bot = GameBot("Infinitode 2", "elements/1080", backend=self.backend)
+
+    def test_detect_single_capture(self):
+        found = asyncio.run(
+            self.bot.detect(["restart", "startgame", "prepare_towers"])
+        )
+        self.assertEqual(self.backend.captures, 1)
+        self.assertEqual(found["restart"].box[:2], (800, 500))
+        self.assertEqual(found["startgame"].box[:2], (1200, 900))
+        self.assertIsNone(found["prepare_towers"])
+
+    def test_detect_pyramid(self):
+        self.bot.pyramid = 2
+        found = asyncio.run(self.bot.detect(["restart", "startgame", "prepare_towers"]))
+        self.assertEqual(found["restart"].box[:2], (800, 500))
+        self.assertEqual(found["startgame"].box[:2], (1200, 900))
+        self.assertIsNone(found["prepare_towers"])
+
+    def test_click_element_in_window_coordinates(self):
+        self.assertTrue(asyncio.run(self.bot.click_element("restart")))
+        template = self.bot.templates.get("restart")
+        self.assertEqual(
+            self.backend.clicks(),
+            [(800 + template.width // 2, 500 + template.height // 2)],
+        )
+        # 屏幕坐标要加上窗口偏移
+        self.assertEqual(self.backend.events[0].args[0], 900 + template.width // 2)
+
+    def test_learned_region(self):
+        asyncio.run(self.bot.detect(["restart"]))
+        region, learned = self.bot.search_region("restart")
+        self.assertTrue(learned)
+        self.assertEqual(region[:2], (800 - 40, 500 - 40))
+
+    def test_keys(self):
+        asyncio.run(self.bot.press("a"))
+        asyncio.run(self.bot.key_down("ctrl"))
+        self.assertEqual(
+            [(e.kind, e.args) for e in self.backend.events],
+            [("press", ("a",)), ("keydown", ("ctrl",))],
+        )
+
+    def test_window_cached(self):
+        asyncio.run(self.bot.capture())
+        queries = self.backend.window_queries
+        for _ in range(5):
+            asyncio.run(self.bot.click(10, 10))
+        self.assertEqual(self.backend.window_queries, queries)
+        # 窗口移动后, 下一次截图时发现变化
+        self.backend.move(300, 200)
+        asyncio.run(self.bot.capture())
+        self.assertEqual(self.bot.window[:2], (300, 200))
+        asyncio.run(self.bot.click(10, 10))
+        self.assertEqual(self.backend.events[-1].args[:2], (310, 210))
+
+    def test_focus_before_input(self):
+        asyncio.run(self.bot.press("a"))
+        # 失去焦点后, 下一组输入之前先激活窗口, 一组输入只检查一次
+        self.backend.blur()
+
+        async def group():
+            async with self.bot.exclusive():
+                await self.bot.press("b")
+                await self.bot.press("c")
+
+        asyncio.run(group())
+        kinds = [e.kind for e in self.backend.events]
+        self.assertEqual(kinds, ["press", "activate", "press", "press"])
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import io
+import time
+import unittest
+
+from rich.console import Console
+
+from console_monitor import ConsoleMonitor
+
+
+class TestConsoleMonitor(unittest.TestCase):
+    def test_history_is_bounded(self):
+        monitor = ConsoleMonitor(max_status=3)
+        for i in range(10):
+            monitor.update_status(f"状态 {i}")
+        self.assertEqual([text for text, _ in monitor.status_history], ["状态 7", "状态 8", "状态 9"])
+
+    def test_countdown_from_deadline(self):
+        monitor = ConsoleMonitor(countdown_time=10)
+        monitor.set_countdown_time(0.2)
+        self.assertLessEqual(monitor.remaining_time, 0.2)
+        time.sleep(0.25)
+        self.assertEqual(monitor.remaining_time, 0)
+
+    def test_renders_only_when_dirty(self):
+        monitor = ConsoleMonitor(countdown_time=0, console=Console(file=io.StringIO()))
+
+        async def main():
+            task = monitor.start_async(refresh_interval=0.01)
+            await asyncio.sleep(0.2)
+            idle_renders = monitor.renders
+            await asyncio.sleep(0.2)
+            self.assertEqual(monitor.renders, idle_renders)
+            monitor.update_info("分数", 1)
+            monitor.update_info("分数", 1)
+            await asyncio.sleep(0.1)
+            self.assertEqual(monitor.renders, idle_renders + 1)
+            monitor.stop()
+            await asyncio.wait_for(task, 1)
+
+        asyncio.run(main())
+
+    def test_stop_after_loop_closed(self):
+        monitor = ConsoleMonitor(countdown_time=0, console=Console(file=io.StringIO()))
+        loop = asyncio.new_event_loop()
+        # 事件循环关闭时 run_async 没有机会清理
+        monitor._loop, monitor._async_wakeup = loop, asyncio.Event()
+        loop.close()
+        monitor.stop()
+        monitor.update_status("结束")
+
+    def test_views(self):
+        out = io.StringIO()
+        monitor = ConsoleMonitor(console=Console(file=out, width=80))
+        monitor.view("实例 1").update_status("准备防御塔")
+        monitor.view("实例 2").update_info("脚本时间", "3.0s")
+        self.assertIs(monitor.view("实例 1"), monitor.view("实例 1"))
+        monitor.console.print(monitor.render())
+        text = out.getvalue()
+        self.assertIn("实例 1", text)
+        self.assertIn("准备防御塔", text)
+        self.assertIn("脚本时间: 3.0s", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+from backends import SimulatedBackend
+from common import GameBot
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_captures():
+    backend = SimulatedBackend()
+    bot = GameBot("Infinitode 2", "elements/1080", backend=backend)
+    bot.frames.max_age = 0.05
+    first, second = await asyncio.gather(bot.frames.next(), bot.frames.next())
+    # 两个订阅者同时等待时只补截了一帧
+    assert backend.captures == 1
+    assert first == second
+    # 其他任务截的图直接发布给订阅者
+    waiter = asyncio.create_task(bot.frames.next(first[0]))
+    await asyncio.sleep(0)
+    frame = await bot.capture()
+    assert await waiter == (2, frame)
+    assert backend.captures == 2
@@ -0,0 +1,105 @@
+import asyncio
+import unittest
+
+from backends import SimulatedBackend
+from input_dispatcher import InputDispatcher
+
+
+class TestInputDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend()
+        self.dispatcher = InputDispatcher(
+            self.backend, profiles={"slow": 0.2, "fast": 0.0}, maxsize=2
+        )
+
+    def tearDown(self):
+        self.dispatcher.close()
+
+    def kinds(self):
+        return [(e.kind, e.args) for e in self.backend.events]
+
+    def test_order_and_pacing(self):
+        async def main():
+            await self.dispatcher.submit("click", 1, 1, profile="slow")
+            await self.dispatcher.submit("press", "a")
+
+        asyncio.run(main())
+        self.assertEqual(self.kinds(), [("click", (1, 1)), ("press", ("a",))])
+        gap = self.backend.events[1].timestamp - self.backend.events[0].timestamp
+        self.assertGreaterEqual(gap, 0.2)
+
+    def test_pacing_does_not_block_loop(self):
+        async def main():
+            await self.dispatcher.submit("click", 1, 1, profile="slow")
+            # 节奏间隔只推迟下一个输入, 其他协程照常运行
+            start = asyncio.get_running_loop().time()
+            await asyncio.sleep(0.01)
+            return asyncio.get_running_loop().time() - start
+
+        self.assertLess(asyncio.run(main()), 0.1)
+
+    def test_cancelled_caller_drops_event(self):
+        async def script():
+            await self.dispatcher.submit("click", 1, 1, profile="slow")
+            await self.dispatcher.submit("click", 2, 2)
+
+        async def main():
+            task = asyncio.create_task(script())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await self.dispatcher.submit("press", "b")
+
+        asyncio.run(main())
+        self.assertEqual(self.kinds(), [("click", (1, 1)), ("press", ("b",))])
+
+    def test_cancel_pending_by_owner(self):
+        async def main():
+            for i in range(2):
+                await self.dispatcher.submit("click", i, i, profile="slow", wait=False)
+            dropped = self.dispatcher.cancel_pending(owner=asyncio.current_task())
+            await self.dispatcher.join()
+            return dropped
+
+        dropped = asyncio.run(main())
+        self.assertGreaterEqual(dropped, 1)
+        self.assertLessEqual(len(self.backend.events), 1)
+
+    def test_backpressure(self):
+        async def main():
+            for i in range(4):
+                await self.dispatcher.submit("click", i, i, profile="slow", wait=False)
+            return self.dispatcher.pending()
+
+        # 队列长度上限为 2, 提交第 4 个事件时需要等前面的事件执行
+        self.assertLessEqual(asyncio.run(main()), 2)
+        self.assertGreaterEqual(len(self.backend.events), 1)
+
+    def test_exclusive_groups_and_priority(self):
+        async def gesture(name, priority, started):
+            async with self.dispatcher.exclusive(priority):
+                started.set()
+                await self.dispatcher.submit("key_down", name, profile="fast")
+                await asyncio.sleep(0.05)
+                await self.dispatcher.submit("key_up", name, profile="fast")
+
+        async def main():
+            started = asyncio.Event()
+            first = asyncio.create_task(gesture("a", 0, started))
+            await started.wait()
+            # 两个任务都在等待时, 优先级高的先获得通道
+            low = asyncio.create_task(gesture("b", 0, asyncio.Event()))
+            high = asyncio.create_task(gesture("c", 5, asyncio.Event()))
+            cancelled = asyncio.create_task(gesture("d", 9, asyncio.Event()))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.gather(first, low, high, cancelled, return_exceptions=True)
+
+        asyncio.run(main())
+        self.assertEqual(
+            [e.args[0] for e in self.backend.events], ["a", "a", "c", "c", "b", "b"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
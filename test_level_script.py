@@ -0,0 +1,199 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from level_script import (
+    Condition,
+    Instruction,
+    ScriptError,
+    compile_script,
+    compile_source,
+)
+
+
+class TestLevelScript(unittest.TestCase):
+    def test_compile(self):
+        script = compile_source(
+            """# 设置
+cellsize 45
+boardcenter 958 535
+
+move -2 0
+sleep 0.5
+shift 2
+ctrl-space
+] 2
+"""
+        )
+        self.assertEqual(
+            [(i.op, i.args, i.lineno) for i in script],
+            [
+                ("comment", ("设置",), 1),
+                ("cellsize", (45,), 2),
+                ("boardcenter", (958, 535), 3),
+                ("move", (-2, 0), 5),
+                ("sleep", (0.5,), 6),
+                ("key", ("shift", 2), 7),
+                ("hotkey", (("ctrl",), "space", 1), 8),
+                ("key", ("]", 2), 9),
+            ],
+        )
+
+    def test_errors_report_line(self):
+        cases = [
+            "sleep abc",
+            "sleep -1",
+            "move 1",
+            "cellsize 0",
+            "ctrl-shift",
+            "a 2 3",
+            "at",
+            "at x a",
+            "at 5 at 6 a",
+            "at 5 move 1",
+            "checkpoint",
+            "checkpoint a b",
+            "at 5 checkpoint a",
+        ]
+        for line in cases:
+            with self.subTest(line=line):
+                with self.assertRaises(ScriptError) as ctx:
+                    compile_source(f"# ok\n{line}\n", "bad.it2")
+                self.assertEqual(ctx.exception.lineno, 2)
+                self.assertIn("bad.it2:2", str(ctx.exception))
+
+    def test_at(self):
+        script = compile_source("sleep 5\nat 10 move 1 2\nat 12\n")
+        at, anchor = script.instructions[1:]
+        self.assertEqual(at.op, "at")
+        self.assertEqual(at.args[0], 10.0)
+        self.assertEqual(at.args[1].op, "move")
+        self.assertEqual(at.args[1].args, (1, 2))
+        self.assertEqual(anchor.args, (12.0, None))
+
+    def test_at_before_planned_time(self):
+        with self.assertRaises(ScriptError) as ctx:
+            compile_source("sleep 30\nat 20 a\n")
+        self.assertEqual(ctx.exception.lineno, 2)
+
+    def test_checkpoints(self):
+        script = compile_source("cellsize 45\nsleep 5\ncheckpoint a\nat 20\ncheckpoint b\n")
+        self.assertEqual(script.checkpoints, {"a": (2, 5.0), "b": (4, 20.0)})
+        self.assertEqual(script.instructions[2].args, ("a",))
+        with self.assertRaises(ScriptError) as ctx:
+            compile_source("checkpoint a\nsleep 1\ncheckpoint a\n")
+        self.assertEqual(ctx.exception.lineno, 3)
+
+    def test_wait_commands(self):
+        script = compile_source(
+            "sleep 5\n"
+            "waitfor upgrade_ready 40 else ctrl-r\n"
+            "waitfor not wave_banner 10\n"
+            "until pixel 1504 320 #3fa34d 100 else leftclick 1504 320\n"
+            "checkpoint a\n"
+        )
+        first, second, third = script.instructions[1:4]
+        self.assertEqual(first.args[:2], (Condition("element", ("upgrade_ready",)), 40.0))
+        self.assertEqual(first.args[2].op, "hotkey")
+        self.assertEqual(second.args, (Condition("element", ("wave_banner",), True), 10.0, None))
+        self.assertEqual(third.args[0].args[:3], (1504, 320, (0x3F, 0xA3, 0x4D)))
+        self.assertEqual(str(third.args[0]), "pixel 1504 320 #3fa34d")
+        self.assertEqual(third.args[2].args, (1504, 320))
+        # waitfor 按超时推算计划时间
+        self.assertEqual(script.checkpoints["a"], (4, 100.0))
+
+    def test_wait_errors(self):
+        for text in (
+            "waitfor upgrade",
+            "waitfor 10",
+            "waitfor upgrade ten",
+            "waitfor pixel 1 2 green 5",
+            "waitfor upgrade 5 else",
+            "waitfor upgrade 5 else checkpoint a",
+            "at 5 waitfor upgrade 5",
+            "sleep 60\nuntil upgrade 30",
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(ScriptError):
+                    compile_source(text)
+
+    def test_blocks(self):
+        script = compile_source(
+            "every 20 overclock priority 5\n"
+            "    s\n"
+            "\n"
+            "    leftclick 958 535\n"
+            "track build\n"
+            "    sleep 5\n"
+            "    move 1 2\n"
+            "every 5\n"
+            "\tstop build\n"
+            "sleep 10\n"
+            "checkpoint a\n"
+        )
+        every, track, unnamed, sleep, _ = script.instructions
+        self.assertEqual(every.args[:3], (20.0, "overclock", 5))
+        self.assertEqual([i.op for i in every.args[3]], ["key", "leftclick"])
+        self.assertEqual(track.args[:2], ("build", 0))
+        self.assertEqual(unnamed.args[1], "every-8")
+        self.assertEqual(sleep.lineno, 10)
+        # 块中的 sleep 不影响主脚本的计划时间
+        self.assertEqual(script.checkpoints["a"], (4, 10.0))
+
+    def test_block_errors(self):
+        for text in (
+            "track a\nsleep 1\n",
+            "track a\n    sleep 1\ntrack a\n    sleep 1\n",
+            "track a\n    checkpoint x\n",
+            "track a\n    every 5\n",
+            "every 0 a\n    t\n",
+            "stop missing\n",
+            "at 5 track a\n",
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(ScriptError):
+                    compile_source(text)
+
+    def test_misspelled_command(self):
+        for text in ("slep 5", "wiat", "ctrl-rr", "at 5 levtclick 1 1", "alt-shfit-1"):
+            with self.subTest(text=text):
+                with self.assertRaises(ScriptError) as cm:
+                    compile_source(f"sleep 1\n{text}\n")
+                self.assertEqual(cm.exception.lineno, 2)
+        # 合法的按键和组合键
+        compile_source("` 2\nctrl-space\nshift\nalt-q\n]\ndown\n")
+
+    def test_compile_level(self):
+        script = compile_script("level/6.3.it2")
+        self.assertTrue(all(isinstance(i, Instruction) for i in script))
+        self.assertIs(compile_script("level/6.3.it2"), script)
+
+    def test_cache_follows_content(self):
+        fd, path = tempfile.mkstemp(suffix=".it2")
+        os.close(fd)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("sleep 1\n")
+            first = compile_script(path)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("sleep 2\n")
+            second = compile_script(path)
+            self.assertIsNot(first, second)
+            self.assertEqual(second.instructions[0].args, (2.0,))
+        finally:
+            os.remove(path)
+
+    def test_cache_per_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = [os.path.join(directory, name) for name in ("one.it2", "two.it2")]
+        for path in paths:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("sleep 1\n")
+        # 内容相同的两个文件不能共用同一个 Script
+        self.assertEqual([compile_script(path).filename for path in paths], paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from log_pipeline import DedupFilter, ModuleLevelFilter, file_handler
+
+
+def make_record(msg, level=logging.DEBUG, module="common"):
+    record = logging.LogRecord(module, level, f"{module}.py", 1, msg, None, None)
+    return record
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLogPipeline(unittest.TestCase):
+    def test_module_levels(self):
+        f = ModuleLevelFilter({"watcher": logging.INFO}, logging.DEBUG)
+        self.assertFalse(f.filter(make_record("x", logging.DEBUG, "watcher")))
+        self.assertTrue(f.filter(make_record("x", logging.INFO, "watcher")))
+        self.assertTrue(f.filter(make_record("x", logging.DEBUG, "common")))
+
+    def test_dedup(self):
+        clock = FakeClock()
+        f = DedupFilter(interval=10, clock=clock)
+        self.assertTrue(f.filter(make_record("没有找到 restart")))
+        self.assertFalse(f.filter(make_record("没有找到 restart")))
+        self.assertFalse(f.filter(make_record("没有找到 restart")))
+        self.assertTrue(f.filter(make_record("找到 restart")))
+        self.assertTrue(f.filter(make_record("没有找到 restart", logging.WARNING)))
+        clock.now = 11
+        record = make_record("没有找到 restart")
+        self.assertTrue(f.filter(record))
+        self.assertEqual(record.getMessage(), "没有找到 restart (前 10 秒内重复 2 次)")
+
+    def test_dedup_threads(self):
+        clock = FakeClock()
+        f = DedupFilter(interval=10, clock=clock)
+        passed = []
+
+        def log():
+            for _ in range(500):
+                if f.filter(make_record("没有找到 restart")):
+                    passed.append(1)
+
+        threads = [threading.Thread(target=log) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(passed), 1)
+        clock.now = 11
+        record = make_record("没有找到 restart")
+        f.filter(record)
+        self.assertEqual(record.getMessage(), "没有找到 restart (前 10 秒内重复 3999 次)")
+
+    def test_rotation_compresses(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "bot.log")
+            handler = file_handler(path, 200, 3, None, True)
+            for i in range(20):
+                handler.emit(make_record(f"消息 {i}", logging.INFO))
+            handler.close()
+            rotated = sorted(f for f in os.listdir(tmpdir) if f.endswith(".gz"))
+            self.assertEqual(rotated, ["bot.log.1.gz", "bot.log.2.gz", "bot.log.3.gz"])
+            with gzip.open(os.path.join(tmpdir, "bot.log.1.gz"), "rt", encoding="utf-8") as f:
+                self.assertIn("消息", f.read())
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+
+from backends import Scene, SimulatedBackend
+from common import GameBot
+from match_engine import MatchEngine, MatchRequest, best_match
+from templates import TemplateStore
+from vision import Box, Frame
+
+
+class TestMatchEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        scene = Scene((1920, 1080))
+        scene.add("elements/1080/restart.png", 300, 200)
+        scene.add("elements/1080/startgame.png", 1200, 700)
+        cls.frame = Frame(scene.render(0))
+        store = TemplateStore("elements/1080").load()
+        cls.requests = [
+            MatchRequest(name, (store.get(name).bgr,), region)
+            for name, region in [
+                ("restart", None),
+                ("startgame", Box(1100, 600, 400, 300)),
+                ("prepare_towers", None),
+                ("restart", Box(1000, 0, 500, 500)),
+            ]
+        ]
+        cls.expected = [best_match(cls.frame, request) for request in cls.requests]
+
+    def test_expected(self):
+        self.assertEqual(self.expected[0].box[:2], (300, 200))
+        self.assertEqual(self.expected[1].box[:2], (1200, 700))
+        self.assertIsNone(self.expected[2])
+        self.assertIsNone(self.expected[3])
+
+    def test_modes(self):
+        for mode in ("thread", "process"):
+            with self.subTest(mode=mode), MatchEngine(workers=2, mode=mode) as engine:
+                self.assertEqual(engine.match(self.frame, self.requests), self.expected)
+                self.assertEqual(engine.match(self.frame, []), [])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            MatchEngine(mode="gpu")
+
+    def test_gamebot(self):
+        scene = Scene((1920, 1080))
+        scene.add("elements/1080/restart.png", 300, 200, end=1)
+        scene.add("elements/1080/restart.png", 1500, 800, start=1)
+        backend = SimulatedBackend([scene.render(0), scene.render(1)])
+        with MatchEngine(workers=2) as engine:
+            bot = GameBot("Infinitode 2", "elements/1080", backend=backend, engine=engine)
+
+            async def main():
+                return [(await bot.detect(["restart", "startgame"])) for _ in range(2)]
+
+            first, second = asyncio.run(main())
+        self.assertEqual(first["restart"].box[:2], (300, 200))
+        self.assertIsNone(first["startgame"])
+        # 不在上次的位置时退回到整个窗口查找
+        self.assertEqual(second["restart"].box[:2], (1500, 800))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from backends import SimulatedBackend
+from bench import inventory_screenshot
+from merge_platforms import (
+    CANCEL_BUTTON,
+    CONFIRM_BUTTON,
+    DIALOG_REGION,
+    PROGRESS_BAR,
+    SYNTHESIS_BUTTON,
+    CraftingRun,
+    box_center,
+    find_boxes,
+    sort_boxes,
+    suppress_overlaps,
+)
+
+
+# 原来的逐个比较实现, 用来验证向量化版本的结果完全一致
+def reference_filter(boxes):
+    filtered_boxes = []
+    for box in boxes:
+        x1, y1, w1, h1 = box
+        keep = True
+        for other_box in boxes:
+            if box == other_box:
+                continue
+            x2, y2, w2, h2 = other_box
+            if x1 < x2 + w2 and x1 + w1 > x2 and y1 < y2 + h2 and y1 + h1 > y2:
+                overlap_area = (min(x1 + w1, x2 + w2) - max(x1, x2)) * (
+                    min(y1 + h1, y2 + h2) - max(y1, y2)
+                )
+                box_area = w1 * h1
+                other_box_area = w2 * h2
+                if overlap_area / box_area > 0.5 or overlap_area / other_box_area > 0.5:
+                    if box_area < other_box_area:
+                        keep = False
+                        break
+        if keep:
+            filtered_boxes.append(box)
+    return filtered_boxes
+
+
+def reference_sort(boxes):
+    boxes = sorted(boxes, key=lambda box: box[1], reverse=True)
+    sorted_boxes = []
+    current_y = None
+    current_row = []
+    for box in boxes:
+        if current_y is None or abs(box[1] - current_y) < 10:
+            current_row.append(box)
+            current_y = box[1]
+        else:
+            current_row.sort(key=lambda box: box[0], reverse=True)
+            sorted_boxes.extend(current_row)
+            current_row = [box]
+            current_y = box[1]
+    if current_row:
+        current_row.sort(key=lambda box: box[0], reverse=True)
+        sorted_boxes.extend(current_row)
+    return sorted_boxes
+
+
+def as_tuples(boxes):
+    return [tuple(int(v) for v in box) for box in boxes]
+
+
+class TestMergePlatforms(unittest.TestCase):
+    def test_matches_reference_on_random_boxes(self):
+        rng = np.random.default_rng(1)
+        for _ in range(20):
+            n = rng.integers(0, 80)
+            boxes = np.column_stack(
+                [
+                    rng.integers(0, 2000, n),
+                    rng.integers(0, 1200, n) // 7 * 7,  # 制造相同和相近的 y
+                    rng.integers(100, 300, n),
+                    rng.integers(100, 300, n),
+                ]
+            )
+            expected = reference_filter(as_tuples(boxes))
+            filtered = suppress_overlaps(boxes)
+            self.assertEqual(as_tuples(filtered), expected)
+            self.assertEqual(as_tuples(sort_boxes(filtered)), reference_sort(expected))
+
+    def test_inventory_screenshot(self):
+        screenshot = inventory_screenshot(rows=3, cols=4)
+        boxes = sort_boxes(find_boxes(screenshot))
+        self.assertEqual(len(boxes), 12)
+        # 第一个是右下角的方框, 最后一个是左上角的方框
+        self.assertTrue(boxes[0][1] > boxes[-1][1] and boxes[0][0] > boxes[-1][0])
+
+    def test_empty(self):
+        self.assertEqual(len(sort_boxes(find_boxes(np.zeros((100, 100, 3), np.uint8)))), 0)
+
+
+class FakeInventory(SimulatedBackend):
+    """
+    会对点击做出反应的背包界面: 偶数编号的物品可以合成, 合成后物品消失。
+    animation: 对话框出现后, 再过几帧才画出进度条
+    """
+
+    def __init__(self, animation=0):
+        self.screen = inventory_screenshot(rows=2, cols=3)
+        self.boxes = sort_boxes(find_boxes(self.screen))
+        self.selected = None
+        self.crafted = []
+        self.animation = animation
+        self._progress_in = None
+        super().__init__(lambda t: self.screen.copy(), window=(0, 0, 3840, 2160))
+
+    def _dialog(self, visible, progress=False):
+        x, y, w, h = DIALOG_REGION
+        self.screen[y : y + h, x : x + w] = 90 if visible else 40
+        if progress:
+            self._progress_in = self.animation
+            self._draw_progress()
+
+    def _draw_progress(self):
+        if self._progress_in == 0:
+            px, py = PROGRESS_BAR
+            self.screen[py - 2 : py + 3, px - 2 : px + 3] = 0x22
+            self._progress_in = None
+
+    def grab(self, region=None):
+        frame = super().grab(region)
+        if self._progress_in is not None:
+            self._progress_in -= 1
+            self._draw_progress()
+        return frame
+
+    def click(self, x, y):
+        super().click(x, y)
+        for i, box in enumerate(self.boxes):
+            bx, by, bw, bh = box
+            if bx <= x < bx + bw and by <= y < by + bh:
+                self.selected = i
+                cv2.rectangle(self.screen, (bx, by), (bx + bw, by + bh), (0, 200, 255), 3)
+        if (x, y) == SYNTHESIS_BUTTON:
+            self._dialog(True, progress=self.selected % 2 == 0)
+        elif (x, y) == CANCEL_BUTTON:
+            self._dialog(False)
+        elif (x, y) == CONFIRM_BUTTON:
+            self._dialog(False)
+            bx, by, bw, bh = self.boxes[self.selected]
+            cx, cy = box_center(self.boxes[self.selected])
+            cv2.circle(self.screen, (cx, cy), bw // 4, (40, 40, 40), -1)
+            self.crafted.append(self.selected)
+
+
+class TestCraftingRun(unittest.TestCase):
+    def test_run(self):
+        backend = FakeInventory()
+        crafting = CraftingRun(backend, ui_timeout=0.2, poll_interval=0)
+        crafted = crafting.run()
+        self.assertEqual(crafted, 3)
+        self.assertEqual(backend.crafted, [0, 2, 4])
+        # 每个方框都只点击一次
+        box_clicks = [
+            e.args for e in backend.events if e.args in [box_center(b) for b in backend.boxes]
+        ]
+        self.assertEqual(len(box_clicks), 6)
+
+    def test_dialog_animation(self):
+        # 进度条比对话框晚几帧出现时不能误判为不能合成
+        backend = FakeInventory(animation=3)
+        crafting = CraftingRun(backend, ui_timeout=0.2, poll_interval=0)
+        self.assertEqual(crafting.run(), 3)
+        self.assertEqual(backend.crafted, [0, 2, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
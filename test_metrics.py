@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from metrics import Histogram, MetricsExporter, Registry
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram(self):
+        h = Histogram()
+        for value in [0.001, 0.003, 0.003, 0.04, 0.3]:
+            h.observe(value)
+        self.assertEqual(h.count, 5)
+        self.assertEqual(h.quantile(0.5), 0.005)
+        self.assertEqual(h.quantile(1.0), 0.3)
+
+    def test_timer_and_counter(self):
+        with self.registry.timer("gamebot_op_seconds", op="capture"):
+            pass
+        self.registry.inc("state_transitions_total", state="RESTART_SCREEN")
+        self.registry.inc("state_transitions_total", state="RESTART_SCREEN")
+        self.assertEqual(self.registry.histogram("gamebot_op_seconds", op="capture").count, 1)
+        self.assertEqual(
+            self.registry.counter("state_transitions_total", state="RESTART_SCREEN"), 2
+        )
+
+    def test_prometheus(self):
+        self.registry.observe("gamebot_op_seconds", 0.003, op="click")
+        self.registry.inc("script_commands_total", command="move")
+        text = self.registry.prometheus()
+        self.assertIn("# TYPE gamebot_op_seconds histogram", text)
+        self.assertIn('gamebot_op_seconds_bucket{op="click",le="0.002"} 0', text)
+        self.assertIn('gamebot_op_seconds_bucket{op="click",le="0.005"} 1', text)
+        self.assertIn('gamebot_op_seconds_bucket{op="click",le="+Inf"} 1', text)
+        self.assertIn('gamebot_op_seconds_count{op="click"} 1', text)
+        self.assertIn('script_commands_total{command="move"} 1', text)
+
+    def test_exporter(self):
+        tmpdir = tempfile.mkdtemp()
+        jsonl = os.path.join(tmpdir, "metrics.jsonl")
+        prom = os.path.join(tmpdir, "metrics.prom")
+        self.registry.observe("gamebot_op_seconds", 0.01, op="capture")
+        exporter = MetricsExporter(self.registry, jsonl, prom)
+        exporter.export()
+        exporter.export()
+        with open(jsonl, encoding="utf-8") as f:
+            snapshots = [json.loads(line) for line in f]
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(snapshots[0]["histograms"][0]["labels"], {"op": "capture"})
+        with open(prom, encoding="utf-8") as f:
+            self.assertIn("gamebot_op_seconds_sum", f.read())
+
+    def test_exporter_stop(self):
+        tmpdir = tempfile.mkdtemp()
+        jsonl = os.path.join(tmpdir, "metrics.jsonl")
+        exporter = MetricsExporter(self.registry, jsonl, None, interval=60)
+
+        async def run():
+            task = exporter.start()
+            await asyncio.sleep(0)
+            exporter.stop()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        # 停止时导出最后一次快照
+        with open(jsonl, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import glob
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from backends import Scene, SimulatedBackend
+from screentaker import FrameArchive, Screentaker, prune_files
+
+
+class TestScreentaker(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        scene = Scene((640, 360))
+        scene.add(np.full((100, 100, 3), 255, np.uint8), 50, 50, start=1)
+        # 第 1、2 帧相同, 第 3 帧出现白块
+        frames = [scene.render(0)] * 2 + [scene.render(1)]
+        self.backend = SimulatedBackend(frames, window=(0, 0, 640, 360))
+
+    def pngs(self):
+        return glob.glob(os.path.join(self.dir, "*.png"))
+
+    def test_saves_only_on_change(self):
+        screentaker = Screentaker(self.backend, directory=self.dir)
+        results = [screentaker.poll() for _ in range(3)]
+        screentaker.close()
+        self.assertIsNotNone(results[0])
+        self.assertIsNone(results[1])
+        self.assertIsNotNone(results[2])
+        self.assertEqual(len(self.pngs()), 2)
+
+    def test_snapshot(self):
+        screentaker = Screentaker(self.backend, directory=self.dir)
+        screentaker.poll()
+        path = screentaker.snapshot(reason="error").result()
+        screentaker.close()
+        self.assertTrue(os.path.basename(path).startswith("error_"))
+        self.assertEqual(len(self.pngs()), 2)
+
+    def test_max_files(self):
+        frames = [np.full((36, 64, 3), i * 40, np.uint8) for i in range(5)]
+        backend = SimulatedBackend(frames, window=(0, 0, 64, 36))
+        screentaker = Screentaker(backend, directory=self.dir, max_files=2, workers=1)
+        for _ in range(5):
+            screentaker.poll()
+            time.sleep(0.01)
+        screentaker.close()
+        self.assertEqual(len(self.pngs()), 2)
+
+    def test_archive(self):
+        archive = FrameArchive(os.path.join(self.dir, "archive"), scale=0.5)
+        screentaker = Screentaker(self.backend, directory=None, archive=archive)
+        for _ in range(3):
+            screentaker.poll()
+        screentaker.close()
+        frames = list(archive.frames())
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[0][1].shape, (180, 320, 3))
+        self.assertEqual(self.pngs(), [])
+
+    def test_archive_retention(self):
+        archive = FrameArchive(
+            self.dir, scale=1, segment_bytes=1, max_bytes=1, quality=50
+        )
+        image = np.zeros((36, 64, 3), np.uint8)
+        for i in range(3):
+            archive.append(image, timestamp=1000.0 + i)
+        # 每帧都开始新的分段, 旧分段超过大小限制被删除, 只保留当前分段
+        self.assertEqual(len(archive.segments()), 1)
+        self.assertEqual([t for t, _ in archive.frames()], [1002.0])
+
+
+class TestPruneFiles(unittest.TestCase):
+    def test_prune(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = []
+        for i in range(4):
+            path = os.path.join(directory, f"{i}.png")
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        self.assertEqual(prune_files(paths, max_bytes=250, now=1010), paths[:2])
+        self.assertEqual(prune_files(paths, max_age=7, now=1010), paths[2:3])
+        self.assertEqual(prune_files(paths, max_files=1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
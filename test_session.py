@@ -0,0 +1,143 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+import metrics
+from backends import Scene, SimulatedBackend
+from checkpoints import CheckpointStore
+from common import GameBot
+from session import (
+    SessionArchive,
+    SessionRecorder,
+    replay_backend,
+    replay_detections,
+    replay_session,
+)
+from stagerunner import StageRunner
+from templates import TemplateStore
+from vision import Frame
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSession(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # 用小窗口加快匹配, 模板按窗口高度缩放后贴到画面上
+        restart = TemplateStore("elements/1080").load().get("restart", 360).bgr
+        scene = Scene((640, 360)).add(restart, 200, 150, start=1)
+        cls.blank, cls.restart = scene.render(0), scene.render(1)
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def record(self, timeline):
+        """按 [(时间, 画面)] 录制一个会话, 每一帧都做一次检测"""
+        clock = FakeClock()
+        recorder = SessionRecorder(self.dir, clock=clock)
+        bot = GameBot(
+            "Infinitode 2", "elements/1080",
+            backend=SimulatedBackend(window=(0, 0, 640, 360)), recorder=recorder,
+        )  # fmt: skip
+        for t, image in timeline:
+            clock.now = t
+            frame = Frame(image)
+            recorder.record_frame(frame)
+            bot.match_frame(frame, ["restart"])
+        asyncio.run(bot.click_pixel(5, 6))
+        recorder.close()
+        bot.input.close()
+        return SessionArchive(self.dir)
+
+    def test_roundtrip(self):
+        archive = self.record([(0, self.blank), (1, self.blank), (2, self.restart)])
+        self.addCleanup(archive.close)
+        self.assertEqual(len(archive), 3)
+        self.assertEqual(archive.timestamps, [0, 1, 2])
+        np.testing.assert_array_equal(archive.frame(1), self.blank)
+        np.testing.assert_array_equal(archive.frame_at(2.5), self.restart)
+        detections = list(archive.events("detect"))
+        self.assertEqual([e["frame"] for e in detections], [0, 1, 2])
+        self.assertIsNone(detections[0]["results"]["restart"])
+        self.assertEqual(detections[2]["results"]["restart"]["box"][:2], [200, 150])
+        inputs = list(archive.events("input"))
+        self.assertEqual(inputs[0]["input"], "click")
+        self.assertEqual(inputs[0]["args"], [5, 6])
+
+    def test_same_frames_are_not_stored_twice(self):
+        archive = self.record([(0, self.blank), (1, self.blank)])
+        self.addCleanup(archive.close)
+        self.assertEqual(archive._records["length"][1], 0)
+
+    def test_backlog_is_bounded(self):
+        metrics.registry.reset()
+        recorder = SessionRecorder(self.dir, max_pending=1)
+        gate = threading.Event()
+        recorder._writer.submit(gate.wait)  # 模拟写入线程跟不上
+        for image in (self.blank, self.restart, self.restart):
+            recorder.record_frame(Frame(image))
+        gate.set()
+        recorder.close()
+        # 积压时后面的画面记为与上一帧相同, 帧序号不变
+        self.assertEqual(recorder.dropped, 2)
+        self.assertEqual(metrics.registry.counter("session_frames_dropped_total"), 2)
+        archive = SessionArchive(self.dir)
+        self.addCleanup(archive.close)
+        self.assertEqual(len(archive), 3)
+        np.testing.assert_array_equal(archive.frame(2), self.blank)
+
+    def test_replay_detections(self):
+        archive = self.record([(0, self.blank), (2, self.restart)])
+        self.addCleanup(archive.close)
+        game = GameBot("Infinitode 2", "elements/1080", backend=SimulatedBackend())
+        self.assertEqual(replay_detections(archive, game), [])
+        # 提高阈值后原来检测到的元素找不到了
+        differences = replay_detections(archive, game, confidence=1.01)
+        self.assertEqual([(d[0], d[1]) for d in differences], [(1, "restart")])
+
+    def test_replay_backend(self):
+        archive = self.record([(0, self.blank), (10, self.restart)])
+        self.addCleanup(archive.close)
+        backend = replay_backend(archive, speed=100)
+        self.assertFalse(backend.finished())
+        np.testing.assert_array_equal(backend.grab(), self.blank)
+        asyncio.run(asyncio.sleep(0.11))
+        np.testing.assert_array_equal(backend.grab(), self.restart)
+        self.assertTrue(backend.finished())
+
+    def test_replay_speed(self):
+        archive = self.record([(0, self.blank), (1000, self.blank)])
+        self.addCleanup(archive.close)
+        game = GameBot("Infinitode 2", "elements/1080", backend=replay_backend(archive, 100))
+        runner = StageRunner(game, speed=100)
+        start = game.backend.elapsed()
+        asyncio.run(runner.process_command("sleep 20"))
+        # 脚本中的 20 秒按 100 倍速只需要 0.2 秒
+        self.assertAlmostEqual(game.backend.elapsed() - start, 20, delta=5)
+
+    def test_replay_session(self):
+        archive = self.record([(0, self.blank), (2, self.restart), (30, self.restart)])
+        self.addCleanup(archive.close)
+        game = GameBot("Infinitode 2", "elements/1080", backend=replay_backend(archive, 10))
+        store = CheckpointStore(os.path.join(self.dir, "checkpoints.json"))
+        runner = StageRunner(game, "level/6.3.it2", checkpoints=store)
+        backend = asyncio.run(replay_session(archive, runner, speed=10))
+        # 画面上出现 restart 后状态机点击了它
+        self.assertEqual(runner.machine.state, "RESTART_SCREEN")
+        self.assertEqual(backend.clicks(), [(200 + 35 // 2, 150 + 29 // 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,33 @@
 import pytest
 import asyncio
 import os
-from stagerunner import run
+from checkpoints import CheckpointStore
+from stagerunner import StageRunner
+from common import GameBot
+from backends import Scene, SimulatedBackend
+
+
+@pytest.fixture
+def backend():
+    scene = Scene((1920, 1080))
+    scene.add("elements/1080/restart.png", 800, 500)
+    return SimulatedBackend(scene)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints.json"))
+
+
+@pytest.fixture
+def runner(backend, store):
+    """使用模拟后端的 StageRunner"""
+    game = GameBot("Infinitode 2", "elements/1080", backend=backend)
+    return StageRunner(game, checkpoints=store)
 
 
 @pytest.mark.asyncio
-async def test_run():
+async def test_run(backend, runner):
     """测试运行脚本文件"""
     # 使用一个实际的测试脚本
     test_script = "test_script.it2"
@@ -15,7 +37,7 @@ async def test_run():
         f.write("""# 测试脚本
 # 设置棋盘参数
 cellsize 90
-boardcenter 1920 1080
+boardcenter 960 540
 
 # 等待2秒
 sleep 2
@@ -25,17 +47,227 @@ move 1 2
 
 # 点击指定坐标
 leftclick 100 100
+
+ctrl-r
 """)
 
     try:
         # 运行脚本并等待完成
-        await run(test_script)
+        await runner.run(test_script)
 
     finally:
         # 清理测试文件
         if os.path.exists(test_script):
             os.remove(test_script)
 
+    assert backend.clicks() == [(960 + 90, 540 + 180), (100, 100)]
+    assert [(e.kind, e.args) for e in backend.events[2:]] == [
+        ("keydown", ("ctrl",)),
+        ("press", ("r",)),
+        ("keyup", ("ctrl",)),
+    ]
+    assert runner.machine.state == "GAME_RUNNING_SCREEN"
+    assert runner.cellsize == 90
+
+
+@pytest.mark.asyncio
+async def test_instances_are_isolated():
+    first = StageRunner(GameBot("a", "elements/1080", backend=SimulatedBackend()))
+    second = StageRunner(GameBot("b", "elements/1080", backend=SimulatedBackend()))
+    await first.process_command("cellsize 50")
+    await second.process_command("cellsize 70")
+    await first.process_command("move 1 0")
+    assert first.game.backend.clicks() == [(50, 0)]
+    assert second.cellsize == 70
+    assert first.machine is not second.machine
+
+
+@pytest.mark.asyncio
+async def test_move_outside_window(backend, runner):
+    await runner.process_command("cellsize 90")
+    await runner.process_command("boardcenter 960 540")
+    await runner.process_command("move 20 0")
+    await runner.process_command("move -10 -7")
+    assert backend.clicks() == []
+    await runner.process_command("move -10 -6")
+    assert backend.clicks() == [(60, 0)]
+    # 棋盘参数变化后重新建立查找表
+    await runner.process_command("cellsize 45")
+    await runner.process_command("move -10 -6")
+    assert backend.clicks()[-1] == (510, 270)
+
+
+@pytest.mark.asyncio
+async def test_coordinates_scale_with_window(store):
+    """脚本坐标按 1080p 设计, 在 4K 窗口中按比例放大"""
+    backend = SimulatedBackend(window=(0, 0, 3840, 2160))
+    runner = StageRunner(GameBot("4k", "elements", backend=backend), checkpoints=store)
+    await runner.process_command("cellsize 45")
+    await runner.process_command("boardcenter 958 535")
+    await runner.process_command("move 1 -2")
+    await runner.process_command("leftclick 100 100")
+    # 棋盘边界同样按设计坐标判断
+    await runner.process_command("move 0 13")
+    assert backend.clicks() == [((958 + 45) * 2, (535 - 90) * 2), (200, 200)]
+
+
+@pytest.mark.asyncio
+async def test_waitfor(tmp_path, store):
+    scene = Scene((1920, 1080))
+    scene.add("elements/1080/restart.png", 800, 500, start=0.3)
+    backend = SimulatedBackend(scene)
+    game = GameBot("Infinitode 2", "elements/1080", backend=backend)
+    runner = StageRunner(game, checkpoints=store)
+    b, g, r = scene.background[10, 10]
+    script = tmp_path / "level.it2"
+    script.write_text(
+        "waitfor restart 5 else leftclick 1 1\n"
+        "waitfor not restart 0.2 else leftclick 2 2\n"
+        f"waitfor pixel 10 10 #{r:02x}{g:02x}{b:02x} 5 else leftclick 3 3\n"
+        "leftclick 100 100\n",
+        encoding="utf-8",
+    )
+    await runner.run(str(script))
+    # 第一条在元素出现后立即继续, 第二条超时后执行 else
+    assert backend.clicks() == [(2, 2), (100, 100)]
+    assert runner.timeline.now() < 5
+
+
+
+@pytest.mark.asyncio
+async def test_waitfor_ignores_earlier_frames(store):
+    scene = Scene((1920, 1080))
+    scene.add("elements/1080/restart.png", 800, 500, end=0.2)
+    backend = SimulatedBackend(scene)
+    game = GameBot("Infinitode 2", "elements/1080", backend=backend)
+    game.frames.max_age = 0.1
+    runner = StageRunner(game, checkpoints=store)
+    await game.capture()
+    await asyncio.sleep(0.3)
+    # 元素已经消失, 等待开始前的那一帧不能算作条件成立
+    await runner.process_command("waitfor restart 0.5 else leftclick 1 1")
+    assert backend.captures > 1
+    assert backend.clicks() == [(1, 1)]
+
+
+TRACK_SCRIPT = """every 0.3 tick priority 5
+    t
+track side
+    sleep 0.1
+    ctrl-a
+a
+sleep 0.7
+b
+"""
+
+
+@pytest.mark.asyncio
+async def test_tracks(backend, runner, tmp_path):
+    script = tmp_path / "level.it2"
+    script.write_text(TRACK_SCRIPT, encoding="utf-8")
+    await runner.run(str(script))
+    events = [(e.kind, e.args[0]) for e in backend.events]
+    assert events.count(("keydown", "t")) == 3
+    # 组合键是一组输入, 中间不会插入其他轨道的按键
+    start = events.index(("keydown", "ctrl"))
+    assert events[start : start + 3] == [
+        ("keydown", "ctrl"),
+        ("press", "a"),
+        ("keyup", "ctrl"),
+    ]
+    assert events[-2:] == [("keydown", "b"), ("keyup", "b")]
+    # 主脚本结束后 every 轨道停止
+    assert runner.tracks == {}
+    await asyncio.sleep(0.4)
+    assert len(backend.events) == len(events)
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_tracks(backend, runner, tmp_path):
+    script = tmp_path / "level.it2"
+    script.write_text("every 0.05 tick\n    t\nsleep 30\n", encoding="utf-8")
+    runner.machine.run_task = asyncio.create_task(runner.run(str(script)))
+    await asyncio.sleep(0.2)
+    assert "tick" in runner.tracks
+    runner.machine.cancel_botting_task()
+    assert runner.tracks == {}
+    count = len(backend.events)
+    await asyncio.sleep(0.2)
+    assert len(backend.events) == count
+
+
+CHECKPOINT_SCRIPT = """cellsize 90
+boardcenter 1000 500
+move 1 0
+checkpoint towers
+sleep 30
+cellsize 45
+move 0 1
+checkpoint upgrade
+leftclick 10 20
+"""
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_resume(backend, runner, store, tmp_path):
+    script = tmp_path / "level.it2"
+    script.write_text(CHECKPOINT_SCRIPT, encoding="utf-8")
+    store.save(str(script), "upgrade")
+
+    await runner.run(str(script), resume=True)
+    # 检查点之前的命令不再执行, 但 cellsize / boardcenter 被恢复
+    assert backend.clicks() == [(10, 20)]
+    assert runner.cellsize == 45
+    assert runner.boardcenter == (1000, 500)
+    assert runner.timeline.cursor == 30
+    # 脚本跑完后清除记录
+    assert store.load(str(script)) is None
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_resume_after_edit(backend, runner, store, tmp_path):
+    script = tmp_path / "level.it2"
+    script.write_text(CHECKPOINT_SCRIPT, encoding="utf-8")
+    store.save(str(script), "upgrade", digest="stale")
+
+    runner.speed = 100
+    await runner.run(str(script), resume=True)
+    # 记录的摘要与当前脚本不一致, 从头运行
+    assert backend.clicks()[-1] == (10, 20)
+    assert len(backend.clicks()) > 1
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_recorded(backend, runner, store, tmp_path):
+    script = tmp_path / "level.it2"
+    script.write_text("cellsize 90\ncheckpoint towers\nsleep 30\n", encoding="utf-8")
+    task = asyncio.create_task(runner.run(str(script)))
+    await asyncio.sleep(0.2)
+    task.cancel()
+    record = store.load(str(script))
+    assert record["label"] == "towers"
+    assert record["lineno"] == 2
+
+
+@pytest.mark.asyncio
+async def test_reload_keeps_last_good_script(runner, tmp_path):
+    script = tmp_path / "level.it2"
+    script.write_text("cellsize 90\n", encoding="utf-8")
+    first = runner.load_script(str(script))
+    script.write_text("cellsize abc\n", encoding="utf-8")
+    assert runner.load_script(str(script)) is first
+    script.write_text("cellsize 45\n", encoding="utf-8")
+    assert runner.load_script(str(script)).instructions[0].args == (45,)
+
+
+@pytest.mark.asyncio
+async def test_find_elements(backend, runner):
+    found = await runner.find_elements(["restart", "startgame", "prepare_towers"])
+    assert backend.captures == 1
+    assert found["restart"].box[:2] == (800, 500)
+    assert found["startgame"] is None
+    assert found["prepare_towers"] is None
+
 
 if __name__ == "__main__":
     pytest.main(["-v", "test_stagerunner.py"])
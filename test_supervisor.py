@@ -0,0 +1,114 @@
+import asyncio
+import io
+import unittest
+
+from rich.console import Console
+
+import metrics
+from backends import Scene, SimulatedBackend
+from console_monitor import ConsoleMonitor
+from supervisor import Supervisor, parse_instance
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        monitor = ConsoleMonitor(console=Console(file=io.StringIO()))
+        self.supervisor = Supervisor(monitor=monitor, workers=2)
+        self.addCleanup(self.supervisor.pool.close)
+        metrics.registry.reset()
+
+    def add(self, name, x):
+        scene = Scene((1920, 1080))
+        scene.add("elements/1080/restart.png", x, 500)
+        return self.supervisor.add(
+            name, "Infinitode 2", "level/6.3.it2", "elements/1080",
+            backend=SimulatedBackend(scene),
+        )  # fmt: skip
+
+    def test_shared_pool(self):
+        first, second = self.add("a", 100), self.add("b", 900)
+
+        async def main():
+            return await asyncio.gather(
+                first.find_elements(["restart"]), second.find_elements(["restart"])
+            )
+
+        found_a, found_b = asyncio.run(main())
+        self.assertEqual(found_a["restart"].box[:2], (100, 500))
+        self.assertEqual(found_b["restart"].box[:2], (900, 500))
+        # 截图和匹配都在共用的线程池中执行
+        self.assertEqual(metrics.registry.histogram("worker_queue_seconds", owner="a").count, 2)
+        self.assertEqual(metrics.registry.histogram("worker_queue_seconds", owner="b").count, 2)
+
+    def test_per_instance_view(self):
+        first = self.add("a", 100)
+        asyncio.run(first.process_command("# 实例 a"))
+        view = self.supervisor.monitor.view("a")
+        self.assertIs(first.monitor, view)
+        self.assertEqual(list(view.status_history), [("实例 a", "green")])
+        self.assertEqual(list(self.supervisor.monitor.status_history), [])
+
+    def test_shared_input(self):
+        backend = SimulatedBackend()
+        first, second = (
+            self.supervisor.add(name, name, "level/6.3.it2", "elements/1080", backend=backend)
+            for name in ("a", "b")
+        )
+        self.assertIs(first.game.input, second.game.input)
+        self.addCleanup(first.game.input.close)
+        first.game.input.profiles["key"] = 0.01
+
+        async def main():
+            backend.blur()
+            await asyncio.gather(
+                first.process_command("ctrl-a"), second.process_command("ctrl-b")
+            )
+
+        asyncio.run(main())
+        # 每组按键之前切换到对应的窗口, 两组按键不会交错
+        self.assertEqual(
+            [(e.kind, e.args[0]) for e in backend.events],
+            [
+                ("activate", "a"), ("keydown", "ctrl"), ("press", "a"), ("keyup", "ctrl"),
+                ("activate", "b"), ("keydown", "ctrl"), ("press", "b"), ("keyup", "ctrl"),
+            ],
+        )  # fmt: skip
+
+    def test_error_waits_for_others(self):
+        first, second = self.add("a", 100), self.add("b", 900)
+        cleaned = []
+
+        async def fail():
+            await asyncio.sleep(0.05)
+            raise RuntimeError("a")
+
+        async def wait():
+            try:
+                await asyncio.sleep(30)
+            finally:
+                cleaned.append("b")
+
+        first.main, second.main = fail, wait
+
+        async def main():
+            with self.assertRaises(RuntimeError):
+                await self.supervisor.run()
+            # 返回之前其他实例已经结束
+            self.assertEqual(cleaned, ["b"])
+
+        asyncio.run(main())
+
+    def test_duplicate_name(self):
+        self.add("a", 100)
+        with self.assertRaises(ValueError):
+            self.add("a", 100)
+
+    def test_parse_instance(self):
+        self.assertEqual(
+            parse_instance("Infinitode 2 #1=level/6.3.it2"),
+            ("Infinitode 2 #1", "level/6.3.it2"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
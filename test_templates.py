@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from templates import TemplateStore
+from vision import downscale
+
+
+class TestTemplateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ["restart", "startgame"]:
+            shutil.copy(f"elements/1080/{name}.png", self.tmpdir)
+        self.store = TemplateStore(self.tmpdir).load()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_load(self):
+        self.assertEqual(sorted(self.store.names()), ["restart", "startgame"])
+        template = self.store.get("startgame")
+        self.assertEqual(template.size, (222, 72))
+        self.assertEqual(template.pyramid[1].shape[:2], (36, 111))
+        # 与画面使用同一种缩小方法
+        np.testing.assert_array_equal(template.pyramid[2], downscale(template.bgr, 2))
+
+    def test_get_does_not_touch_disk(self):
+        template = self.store.get("restart")
+        os.remove(os.path.join(self.tmpdir, "restart.png"))
+        self.assertIs(self.store.get("restart"), template)
+
+    def test_missing_is_cached(self):
+        with self.assertLogs(level="ERROR") as logs:
+            for _ in range(3):
+                with self.assertRaises(FileNotFoundError):
+                    self.store.get("upgrade_ready")
+        self.assertEqual(len(logs.records), 1)
+        # 文件补上之后 reload 可以重新读取
+        path = os.path.join(self.tmpdir, "upgrade_ready.png")
+        shutil.copy("elements/1080/restart.png", path)
+        with self.assertRaises(FileNotFoundError):
+            self.store.get("upgrade_ready")
+        self.store.reload("upgrade_ready")
+        self.assertEqual(self.store.get("upgrade_ready").size, self.store.get("restart").size)
+
+    def test_evict_and_reload(self):
+        self.store.evict("restart")
+        self.assertNotIn("restart", self.store)
+        self.store.get("restart")
+        self.assertIn("restart", self.store)
+        self.store.evict()
+        self.assertEqual(len(self.store), 0)
+        self.store.reload()
+        self.assertEqual(len(self.store), 2)
+
+    def test_missing_template(self):
+        with self.assertRaises(FileNotFoundError):
+            self.store.get("nope")
+
+
+class TestResolutionIndependent(unittest.TestCase):
+    def setUp(self):
+        self.store = TemplateStore("elements").load()
+
+    def test_union_of_resolution_dirs(self):
+        self.assertTrue(
+            {"game_running", "prepare_towers", "buy_abi_yes", "musicplayer"}
+            <= set(self.store.names())
+        )
+
+    def test_exact_resolution_preferred(self):
+        self.assertEqual(self.store.get("restart", 1080).size, (106, 88))
+        self.assertEqual(self.store.get("restart", 2160).size, (134, 141))
+
+    def test_scaled_from_highest_resolution(self):
+        self.assertEqual(self.store.get("musicplayer", 1080).size, (46, 44))
+        self.assertEqual(self.store.get("game_running", 2160).size, (176, 170))
+        scaled = self.store.get("startgame", 1440)
+        self.assertEqual(scaled.base_height, 1440)
+        self.assertEqual(scaled.size, (259, 81))
+        self.assertIs(self.store.get("startgame", 1440), scaled)
+        self.assertEqual(self.store.resolutions(), [1080, 1440, 2160])
+
+    def test_variants(self):
+        sizes = [t.height for t in self.store.variants("startgame", 2160, (0.9, 1.0))]
+        self.assertEqual(sizes, [110, 122])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import time
+import unittest
+
+from timeline import Timeline
+
+
+class TestTimeline(unittest.TestCase):
+    def test_sleep_compensates_latency(self):
+        async def main():
+            timeline = Timeline()
+            await asyncio.sleep(0.1)  # 模拟命令本身的耗时
+            late = await timeline.sleep(0.15)
+            return timeline, late
+
+        start = time.monotonic()
+        timeline, late = asyncio.run(main())
+        self.assertAlmostEqual(time.monotonic() - start, 0.15, delta=0.04)
+        self.assertLess(late, 0.04)
+        self.assertEqual(timeline.cursor, 0.15)
+
+    def test_fractional_sleep(self):
+        async def main():
+            timeline = Timeline()
+            await timeline.sleep(0.05)
+            await timeline.sleep(0.05)
+            return timeline.now()
+
+        self.assertGreaterEqual(asyncio.run(main()), 0.1)
+
+    def test_lateness_when_behind(self):
+        async def main():
+            timeline = Timeline()
+            await asyncio.sleep(0.1)
+            return await timeline.wait_until(0.02)
+
+        self.assertGreaterEqual(asyncio.run(main()), 0.07)
+
+    def test_seek(self):
+        timeline = Timeline()
+        timeline.seek(100)
+        self.assertAlmostEqual(timeline.now(), 100, delta=0.01)
+        self.assertEqual(timeline.cursor, 100)
+        self.assertAlmostEqual(timeline.remaining(0.5), 0.5, delta=0.01)
+
+    def test_wait_for(self):
+        async def main():
+            timeline = Timeline()
+            met = await timeline.wait_for(asyncio.sleep(0.05), 1)
+            cursor = timeline.cursor
+            late = await timeline.wait_for(asyncio.sleep(1), 0.1)
+            return met, cursor, late, timeline.cursor
+
+        start = time.monotonic()
+        met, cursor, late, final = asyncio.run(main())
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertTrue(met)
+        # 条件提前成立时, 计划时间定在成立的时刻
+        self.assertAlmostEqual(cursor, 0.05, delta=0.04)
+        self.assertFalse(late)
+        self.assertEqual(final, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
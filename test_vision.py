@@ -0,0 +1,100 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from vision import (
+    Box,
+    Frame,
+    downscale,
+    locate,
+    match_template,
+    match_template_pyramid,
+)
+
+ELEMENT = "elements/1080/restart.png"
+
+
+def make_scene(template, x, y, size=(1080, 1920)):
+    """把模板贴到一张随机背景上, 模拟一帧游戏画面"""
+    rng = np.random.default_rng(0)
+    scene = rng.integers(0, 255, (*size, 3), dtype=np.uint8)
+    h, w = template.shape[:2]
+    scene[y : y + h, x : x + w] = template
+    return scene
+
+
+class TestVision(unittest.TestCase):
+    def setUp(self):
+        self.template = cv2.imread(ELEMENT, cv2.IMREAD_COLOR)
+
+    def test_match_template(self):
+        scene = make_scene(self.template, 300, 200)
+        score, x, y = match_template(scene, self.template)
+        self.assertGreater(score, 0.99)
+        self.assertEqual((x, y), (300, 200))
+
+    def test_no_match(self):
+        scene = make_scene(self.template, 0, 0)
+        scene[:200, :200] = 0
+        self.assertIsNone(match_template(scene, self.template))
+
+    def test_template_larger_than_image(self):
+        self.assertIsNone(match_template(self.template[:10, :10], self.template))
+
+    def test_locate_uses_frame_offset(self):
+        scene = make_scene(self.template, 50, 40, size=(400, 400))
+        frame = Frame(scene, left=100, top=10)
+        match = locate(frame, "restart", self.template)
+        h, w = self.template.shape[:2]
+        self.assertEqual(match.element, "restart")
+        self.assertEqual(match.box, Box(150, 50, w, h))
+        self.assertEqual(match.center, (150 + w // 2, 50 + h // 2))
+
+    def test_locate_in_region(self):
+        scene = make_scene(self.template, 300, 200)
+        frame = Frame(scene)
+        h, w = self.template.shape[:2]
+        region = Box(300, 200, w, h).expand(20)
+        match = locate(frame, "restart", self.template, region=region)
+        self.assertEqual(match.box, Box(300, 200, w, h))
+        self.assertIsNone(locate(frame, "restart", self.template, region=(0, 0, 200, 200)))
+
+    def test_pyramid_matches_full_search(self):
+        for x, y in ((300, 200), (301, 203), (1802, 977)):
+            with self.subTest(x=x, y=y):
+                scene = make_scene(self.template, x, y)
+                full = match_template(scene, self.template)
+                fast = match_template_pyramid(scene, self.template)
+                self.assertEqual(fast[1:], (x, y))
+                self.assertAlmostEqual(fast[0], full[0], places=4)
+
+    def test_pyramid_precomputed_template(self):
+        scene = make_scene(self.template, 301, 203)
+        template_pyramid = [downscale(self.template, level) for level in range(3)]
+        self.assertEqual(
+            match_template_pyramid(scene, self.template, template_pyramid=template_pyramid),
+            match_template_pyramid(scene, self.template),
+        )
+
+    def test_pyramid_no_match(self):
+        scene = make_scene(self.template, 0, 0)
+        scene[:200, :200] = 0
+        self.assertIsNone(match_template_pyramid(scene, self.template))
+
+    def test_locate_pyramid_reuses_downscaled_frame(self):
+        scene = make_scene(self.template, 300, 200)
+        frame = Frame(scene, left=10, top=20)
+        match = locate(frame, "restart", self.template, pyramid=2)
+        h, w = self.template.shape[:2]
+        self.assertEqual(match.box, Box(310, 220, w, h))
+        self.assertEqual(list(frame._pyramid), [2])
+
+    def test_crop_clips_to_frame(self):
+        frame = Frame(np.zeros((100, 200, 3), dtype=np.uint8), left=10, top=10)
+        self.assertEqual(frame.crop((-50, -50, 100, 100)).box, Box(10, 10, 40, 40))
+        self.assertIsNone(frame.crop((500, 500, 10, 10)))
+
+
+if __name__ == "__main__":
+    unittest.main()
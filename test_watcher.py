@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from backends import Scene, SimulatedBackend
+from common import GameBot
+from watcher import ScreenWatcher
+
+
+class TestScreenWatcher(unittest.TestCase):
+    def setUp(self):
+        # 前三帧画面相同, 第四帧出现 restart
+        scene = Scene((1920, 1080))
+        scene.add("elements/1080/restart.png", 200, 100, start=1)
+        frames = [scene.render(0)] * 3 + [scene.render(1)]
+        self.backend = SimulatedBackend(frames, window=(0, 0, 1920, 1080))
+        self.bot = GameBot("Infinitode 2", "elements/1080", backend=self.backend)
+        self.watcher = ScreenWatcher(
+            self.bot,
+            ["restart"],
+            min_interval=0.02,
+            max_interval=0.08,
+            detect_interval=0.05,
+        )
+
+    def test_detects_only_on_change(self):
+        async def collect():
+            results = []
+            async for found in self.watcher.watch():
+                results.append(found)
+                if found["restart"]:
+                    self.watcher.stop()
+            return results
+
+        results = asyncio.run(asyncio.wait_for(collect(), 5))
+        # 第一帧做一次检测, 之后画面不变不检测, 出现 restart 时再检测一次
+        self.assertEqual(len(results), 2)
+        self.assertIsNone(results[0]["restart"])
+        self.assertEqual(results[1]["restart"].box[:2], (200, 100))
+        self.assertEqual(self.backend.captures, 4)
+
+    def test_backoff(self):
+        async def poll(n):
+            for _ in range(n):
+                await self.watcher.poll()
+
+        asyncio.run(poll(3))
+        self.assertEqual(self.watcher.interval, 0.08)
+
+    def test_detect_interval_limits_full_detection(self):
+        # 每一帧都和上一帧不同
+        black = np.zeros((1080, 1920, 3), dtype=np.uint8)
+        white = black + 255
+        self.backend.set_scene(lambda t: white if self.backend.captures % 2 else black)
+        self.watcher.detect_interval = 10
+
+        async def poll(n):
+            return [await self.watcher.poll() for _ in range(n)]
+
+        results = asyncio.run(poll(5))
+        self.assertIsNotNone(results[0])
+        self.assertEqual(results[1:], [None] * 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from worker_pool import WorkerPool
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(workers=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_run(self):
+        async def main():
+            return await self.pool.run("a", lambda x, y: x + y, 1, 2)
+
+        self.assertEqual(asyncio.run(main()), 3)
+
+    def test_exception(self):
+        async def main():
+            await self.pool.run("a", int, "x")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(main())
+
+    def test_round_robin(self):
+        order = []
+        gate = threading.Event()
+
+        def job(owner, i):
+            gate.wait(1)
+            order.append((owner, i))
+
+        async def main():
+            # a 先提交了 3 个任务, b 的任务不用等 a 的任务全部执行完
+            tasks = [asyncio.create_task(self.pool.run("a", job, "a", i)) for i in range(3)]
+            await asyncio.sleep(0)
+            tasks += [asyncio.create_task(self.pool.run("b", job, "b", i)) for i in range(2)]
+            await asyncio.sleep(0.01)
+            gate.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+        self.assertEqual(
+            order, [("a", 0), ("a", 1), ("b", 0), ("a", 2), ("b", 1)]
+        )
+
+    def test_new_event_loop(self):
+        async def main():
+            return await self.pool.run("a", time.monotonic)
+
+        asyncio.run(main())
+        self.assertIsInstance(asyncio.run(main()), float)
+
+
+if __name__ == "__main__":
+    unittest.main()
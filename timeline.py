@@ -0,0 +1,71 @@
+# language: python
+"""
+脚本时间轴。
+
+脚本中的 sleep 不再是"从现在起等 N 秒", 而是把时间轴上的计划时间
+向后推 N 秒, 然后等到这个绝对时间点。命令本身的执行耗时 (点击间隔、
+按键保持等) 会从下一次等待中扣掉, 长脚本不会越跑越慢。
+"at T" 直接把计划时间定在脚本开始后的第 T 秒。
+
+speed 用于回放: 时间轴按 speed 倍速前进, 脚本中的 30 秒在 speed=10 时
+只需要实际等待 3 秒。
+"""
+import asyncio
+import time
+
+
+class Timeline:
+    def __init__(self, clock=time.monotonic, speed=1.0):
+        self.clock = clock
+        self.speed = speed
+        self.start = clock()
+        # 时间轴上当前的计划时间 (相对脚本开始的秒数)
+        self.cursor = 0.0
+        self.max_lateness = 0.0
+
+    def now(self):
+        """脚本开始后经过的实际时间"""
+        return (self.clock() - self.start) * self.speed
+
+    def lateness(self):
+        """实际时间落后于计划时间多少秒, 提前时为 0"""
+        return max(0.0, self.now() - self.cursor)
+
+    async def wait_until(self, deadline):
+        """
+        等到时间轴上的 deadline, 返回到达时落后的秒数
+        """
+        self.cursor = deadline
+        remaining = deadline - self.now()
+        if remaining > 0:
+            await asyncio.sleep(remaining / self.speed)
+        late = self.lateness()
+        self.max_lateness = max(self.max_lateness, late)
+        return late
+
+    async def wait_for(self, awaitable, deadline):
+        """
+        等待 awaitable 完成, 最多等到时间轴上的 deadline, 返回是否按时完成。
+        按时完成时计划时间定在完成的时刻, 后面的 sleep 从这里算起;
+        超时时和 wait_until 一样定在 deadline
+        """
+        remaining = max(0.0, deadline - self.now())
+        try:
+            await asyncio.wait_for(awaitable, remaining / self.speed)
+        except asyncio.TimeoutError:
+            self.cursor = max(self.cursor, deadline)
+            return False
+        self.cursor = max(self.cursor, self.now())
+        return True
+
+    async def sleep(self, seconds):
+        return await self.wait_until(self.cursor + seconds)
+
+    def seek(self, position):
+        """把时间轴定位到 position 秒处, 用于从检查点继续运行脚本"""
+        self.start = self.clock() - position / self.speed
+        self.cursor = position
+
+    def remaining(self, seconds):
+        """sleep(seconds) 实际需要等待的时间"""
+        return max(0.0, self.cursor + seconds - self.now())
@@ -0,0 +1,244 @@
+# language: python
+"""
+模板匹配用到的基础类型和函数。
+
+所有坐标都是相对于游戏窗口左上角的坐标, 与 GameBot.click_pixel 一致。
+cv2 / numpy 在第一次匹配时才导入, 只用到 Box、Frame 等类型的模块
+(以及命令行的 --help) 不需要加载它们。
+"""
+import time
+from typing import NamedTuple
+
+# 金字塔匹配: 缩小后的画面上, 得分不低于 confidence - PYRAMID_SLACK 的位置
+# 才会在原分辨率下细查
+PYRAMID_SLACK = 0.25
+# 缩小后的模板最短边不能小于这个像素数, 否则减少缩小的级数
+PYRAMID_MIN_SIZE = 12
+# 细查的候选位置数
+PYRAMID_CANDIDATES = 5
+
+
+class Point(NamedTuple):
+    x: int
+    y: int
+
+
+class Box(NamedTuple):
+    left: int
+    top: int
+    width: int
+    height: int
+
+    @property
+    def center(self):
+        return Point(self.left + self.width // 2, self.top + self.height // 2)
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def bottom(self):
+        return self.top + self.height
+
+    def expand(self, margin):
+        return Box(
+            self.left - margin,
+            self.top - margin,
+            self.width + 2 * margin,
+            self.height + 2 * margin,
+        )
+
+    def intersect(self, other):
+        """两个区域的交集, 没有交集时返回 None"""
+        left, top = max(self.left, other.left), max(self.top, other.top)
+        right, bottom = min(self.right, other.right), min(self.bottom, other.bottom)
+        if right <= left or bottom <= top:
+            return None
+        return Box(left, top, right - left, bottom - top)
+
+
+class Match(NamedTuple):
+    """一次命中: 元素名, 匹配置信度和所在区域"""
+
+    element: str
+    confidence: float
+    box: Box
+
+    @property
+    def center(self):
+        return self.box.center
+
+
+class Frame:
+    """
+    一次截图得到的画面 (BGR)。
+
+    left/top 是画面左上角在窗口中的位置, 只截取窗口一部分时不为 0。
+    """
+
+    def __init__(self, image, left=0, top=0, timestamp=None):
+        self.image = image
+        self.left = left
+        self.top = top
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        # 缩小后的画面 {级数: 图像}, 同一帧上匹配多个元素时只缩小一次
+        self._pyramid = {}
+
+    def downscaled(self, level):
+        """缩小为 1/2**level 的画面"""
+        image = self._pyramid.get(level)
+        if image is None:
+            image = self._pyramid[level] = downscale(self.image, level)
+        return image
+
+    @classmethod
+    def from_pil(cls, pil_image, left=0, top=0):
+        import cv2
+        import numpy as np
+
+        image = cv2.cvtColor(np.array(pil_image.convert("RGB")), cv2.COLOR_RGB2BGR)
+        return cls(image, left, top)
+
+    @property
+    def width(self):
+        return self.image.shape[1]
+
+    @property
+    def height(self):
+        return self.image.shape[0]
+
+    @property
+    def box(self):
+        return Box(self.left, self.top, self.width, self.height)
+
+    def crop(self, region):
+        """截取画面中的一块区域 (窗口坐标), 超出画面的部分会被裁掉"""
+        region = self.box.intersect(Box(*region))
+        if region is None:
+            return None
+        x, y = region.left - self.left, region.top - self.top
+        image = self.image[y : y + region.height, x : x + region.width]
+        return Frame(image, region.left, region.top, self.timestamp)
+
+
+def match_template(image, template, confidence=0.9):
+    """
+    在 image 中查找 template, 返回 (置信度, x, y) 或 None。
+
+    与 pyautogui.locate 的 opencv 实现一致, 使用 TM_CCOEFF_NORMED,
+    但返回得分最高的位置而不是第一个超过阈值的位置。
+    """
+    import cv2
+
+    if image.shape[0] < template.shape[0] or image.shape[1] < template.shape[1]:
+        return None
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    if max_val < confidence:
+        return None
+    return float(max_val), max_loc[0], max_loc[1]
+
+
+def downscale(image, level):
+    """把图像缩小为 1/2**level"""
+    import cv2
+
+    if level == 0:
+        return image
+    factor = 2**level
+    height, width = image.shape[:2]
+    size = (max(1, round(width / factor)), max(1, round(height / factor)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def _peaks(result, count, threshold, suppress):
+    """
+    result 中得分最高的至多 count 个位置, 每找到一个就抹掉它周围
+    suppress (宽, 高) 范围内的得分, 避免候选挤在同一处
+    """
+    import cv2
+
+    result = result.copy()
+    width, height = suppress
+    peaks = []
+    for _ in range(count):
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score < threshold:
+            break
+        peaks.append((x, y))
+        result[max(0, y - height) : y + height + 1, max(0, x - width) : x + width + 1] = -1
+    return peaks
+
+
+def match_template_pyramid(
+    image, template, confidence=0.9, levels=2, downscaled=None, template_pyramid=None
+):
+    """
+    由粗到细的查找: 先在缩小 2**levels 倍的画面和模板上找出候选位置,
+    再在原分辨率下只匹配候选位置附近。返回值与 match_template 相同,
+    置信度是原分辨率下的得分, 阈值的含义不变。
+
+    downscaled: 返回缩小后画面的函数 level -> 图像, 用于复用同一帧的缩小结果。
+    template_pyramid: 预先缩小好的模板 (见 templates.Template.pyramid),
+    没有需要的级数时现场缩小。
+    模板太小或查找范围本身就很小时退回到 match_template。
+    """
+    import cv2
+
+    height, width = template.shape[:2]
+    while levels > 0 and min(height, width) >> levels < PYRAMID_MIN_SIZE:
+        levels -= 1
+    if levels == 0 or image.size < 4 * template.size:
+        return match_template(image, template, confidence)
+    if image.shape[0] < height or image.shape[1] < width:
+        return None
+
+    small = downscaled(levels) if downscaled else downscale(image, levels)
+    if template_pyramid is not None and levels < len(template_pyramid):
+        small_template = template_pyramid[levels]
+    else:
+        small_template = downscale(template, levels)
+    if small.shape[0] < small_template.shape[0] or small.shape[1] < small_template.shape[1]:
+        return match_template(image, template, confidence)
+    result = cv2.matchTemplate(small, small_template, cv2.TM_CCOEFF_NORMED)
+    suppress = (small_template.shape[1] // 2, small_template.shape[0] // 2)
+    peaks = _peaks(result, PYRAMID_CANDIDATES, confidence - PYRAMID_SLACK, suppress)
+
+    # 缩小时的取整误差不超过一个缩小后的像素, 细查范围向四周各扩大 factor
+    factor = 2**levels
+    best = None
+    for x, y in peaks:
+        left, top = max(0, (x - 1) * factor), max(0, (y - 1) * factor)
+        right = min(image.shape[1], (x + 1) * factor + width)
+        bottom = min(image.shape[0], (y + 1) * factor + height)
+        hit = match_template(image[top:bottom, left:right], template, confidence)
+        if hit is not None and (best is None or hit[0] > best[0]):
+            best = (hit[0], left + hit[1], top + hit[2])
+    return best
+
+
+def locate(
+    frame, element, template, confidence=0.9, region=None, pyramid=0, template_pyramid=None
+):
+    """
+    在画面中查找元素, 返回窗口坐标下的 Match 或 None。
+
+    给出 region 时只在该区域内查找。pyramid 大于 0 时使用由粗到细的
+    金字塔查找, 最多缩小 2**pyramid 倍, 见 match_template_pyramid。
+    """
+    if region is not None:
+        frame = frame.crop(region)
+        if frame is None:
+            return None
+    if pyramid:
+        hit = match_template_pyramid(
+            frame.image, template, confidence, pyramid, frame.downscaled, template_pyramid
+        )
+    else:
+        hit = match_template(frame.image, template, confidence)
+    if hit is None:
+        return None
+    score, x, y = hit
+    height, width = template.shape[:2]
+    return Match(element, score, Box(frame.left + x, frame.top + y, width, height))
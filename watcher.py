@@ -0,0 +1,110 @@
+# language: python
+"""
+画面变化驱动的元素检测。
+
+ScreenWatcher 以较高的频率截图, 先把画面缩成小灰度图和上一次比较,
+只有画面确实发生变化时才在同一帧上做完整的模板匹配。画面长时间不变时
+逐步降低检测频率, 一旦变化立即恢复到最高频率。
+"""
+import asyncio
+import logging
+import time
+
+
+class ScreenWatcher:
+    """
+    bot: GameBot
+    elements: 需要检测的元素名列表
+    min_interval / max_interval: 截图间隔的上下限 (秒), 空闲时间隔逐步翻倍
+    threshold: 缩略图中变化像素 (灰度差超过 pixel_threshold) 的比例超过该值
+        视为画面变化
+    detect_interval: 两次完整检测之间的最短间隔, 游戏画面持续变化时
+        也不会每一帧都做完整检测
+    recheck_interval: 画面一直不变时, 每隔这么久也做一次完整检测
+    """
+
+    def __init__(
+        self,
+        bot,
+        elements,
+        min_interval=0.1,
+        max_interval=1.0,
+        threshold=0.001,
+        pixel_threshold=10,
+        detect_interval=0.5,
+        recheck_interval=10.0,
+        thumb_size=(320, 180),
+    ):
+        self.bot = bot
+        self.elements = list(elements)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.detect_interval = detect_interval
+        self.recheck_interval = recheck_interval
+        self.thumb_size = thumb_size
+        self.interval = min_interval
+        self._last_thumb = None
+        self._last_detect = None
+        self._pending = False
+        self._running = False
+
+    def thumbnail(self, frame):
+        import cv2
+
+        gray = cv2.cvtColor(frame.image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA)
+
+    def changed(self, thumb):
+        """和上一张缩略图比较, 返回是否发生了变化"""
+        if self._last_thumb is None or self._last_thumb.shape != thumb.shape:
+            return True
+        import cv2
+        import numpy as np
+
+        diff = cv2.absdiff(thumb, self._last_thumb)
+        ratio = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+        return ratio > self.threshold
+
+    async def poll(self):
+        """
+        截一帧并判断是否需要检测, 需要时返回 {元素名: Match 或 None}, 否则返回 None
+        """
+        frame = await self.bot.capture()
+        thumb = self.thumbnail(frame)
+        now = time.monotonic()
+        if self.changed(thumb):
+            self._last_thumb = thumb
+            self._pending = True
+            self.interval = self.min_interval
+        elif not self._pending:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+        since_detect = (
+            float("inf") if self._last_detect is None else now - self._last_detect
+        )
+        if since_detect < self.detect_interval:
+            return None
+        if not self._pending and since_detect < self.recheck_interval:
+            return None
+        self._pending = False
+        self._last_detect = now
+        return await self.bot.offload(self.bot.match_frame, frame, self.elements)
+
+    async def watch(self):
+        """异步生成器, 每次完整检测后产出检测结果"""
+        self._running = True
+        while self._running:
+            start = time.monotonic()
+            found = await self.poll()
+            if found is not None:
+                logging.debug(
+                    f"画面变化, 检测到: {[name for name, match in found.items() if match]}"
+                )
+                yield found
+            elapsed = time.monotonic() - start
+            await asyncio.sleep(max(0, self.interval - elapsed))
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,90 @@
+# language: python
+"""
+多个 bot 共用的截图和匹配线程池。
+
+每个 bot (owner) 的任务排在自己的队列里, 空闲的工作线程按轮转顺序
+从各个队列取任务, 一个 bot 短时间内提交大量匹配也不会让其他 bot 饿死。
+同一个 bot 的任务按提交顺序执行。
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class WorkerPool:
+    """
+    workers: 工作线程数, 也是同时执行的任务数上限
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="worker")
+        self._queues = {}
+        # 有待执行任务的 owner, 按轮转顺序排列
+        self._order = deque()
+        self._wakeup = None
+        self._tasks = []
+        self._loop = None
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or not self._tasks or self._tasks[0].done():
+            # 第一次使用, 或者换了一个事件循环 (例如多次 asyncio.run)
+            self._loop = loop
+            self._queues.clear()
+            self._order.clear()
+            self._wakeup = asyncio.Event()
+            self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def run(self, owner, func, *args):
+        """在线程池中执行 func(*args), 返回结果"""
+        self._ensure_running()
+        future = self._loop.create_future()
+        queue = self._queues.setdefault(owner, deque())
+        if not queue:
+            self._order.append(owner)
+        queue.append((func, args, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future
+
+    def pending(self, owner=None):
+        if owner is not None:
+            return len(self._queues.get(owner, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next(self):
+        owner = self._order.popleft()
+        queue = self._queues[owner]
+        item = queue.popleft()
+        if queue:
+            self._order.append(owner)
+        return owner, item
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._order:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            owner, (func, args, future, submitted) = self._next()
+            if future.cancelled():
+                continue
+            metrics.observe(
+                "worker_queue_seconds", time.perf_counter() - submitted, owner=owner
+            )
+            try:
+                result = await loop.run_in_executor(self._executor, func, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False)